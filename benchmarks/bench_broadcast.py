@@ -0,0 +1,104 @@
+"""Рассылка через фейковый Bot API: лимит частоты, RetryAfter и итог.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_broadcast --recipients 500 --rate 100 --latency 0.05
+
+Сессия отвечает с задержкой latency, часть получателей "заблокировала
+бота" (TelegramForbiddenError), один раз Telegram требует паузу
+(TelegramRetryAfter), один раз - ошибка сети. Скрипт проверяет, что все
+сообщения учтены, заблокированные - и только они - не доставлены, за
+любую секунду отправлено не больше rate + burst и после ответа с RetryAfter до конца
+паузы не ушло ни одного запроса. При нарушении - код выхода 1.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+os.environ.setdefault("ADMIN_IDS", "0")
+
+
+async def run(args) -> int:
+    from aiogram.exceptions import TelegramForbiddenError, TelegramNetworkError, TelegramRetryAfter
+    from aiogram.methods import SendMessage
+    from benchmarks.fake_bot import make_bot
+    from bot.broadcast import Broadcaster
+
+    sent_at = []
+    pause = {}
+    network_failed = set()
+    blocked = {chat_id for chat_id in range(args.recipients) if chat_id % args.blocked_every == 0}
+
+    async def handler(bot, method):
+        if not isinstance(method, SendMessage):
+            return None
+        # Момент отправки запроса; задержку ответа имитируем здесь, после него
+        sent = time.monotonic()
+        await asyncio.sleep(args.latency)
+        now = time.monotonic()
+        if method.chat_id == args.recipients // 3 and "start" not in pause:
+            pause["start"] = now
+            pause["end"] = now + args.retry_after
+            raise TelegramRetryAfter(method, "Flood control exceeded", args.retry_after)
+        if method.chat_id == args.recipients // 2 and method.chat_id not in network_failed:
+            network_failed.add(method.chat_id)
+            raise TelegramNetworkError(method, "Connection reset")
+        if method.chat_id in blocked:
+            raise TelegramForbiddenError(method, "Forbidden: bot was blocked by the user")
+        sent_at.append(sent)
+        return None
+
+    bot = make_bot(handler=handler)
+    broadcaster = Broadcaster(args.rate, args.burst, args.workers, retries=3)
+    progress_calls = []
+
+    async def progress(result):
+        progress_calls.append(result.done)
+
+    result = await broadcaster.run(bot, list(range(args.recipients)), "Занятие начинается", progress,
+                                   progress_interval=0.5)
+
+    # Пик за скользящую секунду по моментам запросов
+    peak = 0
+    start = 0
+    for end, moment in enumerate(sent_at):
+        while moment - sent_at[start] >= 1:
+            start += 1
+        peak = max(peak, end - start + 1)
+    # Запросы, ушедшие до ответа с RetryAfter, паузу не нарушают
+    during_pause = sum(1 for moment in sent_at if pause.get("start", 0) < moment < pause.get("end", 0) - 0.01)
+
+    print(f"Получателей: {result.total}, доставлено {result.delivered}, не доставлено {result.failed} {result.errors}")
+    print(f"Время: {result.seconds:.2f} с, повторов: {result.retried}, обновлений прогресса: {len(progress_calls)}")
+    print(f"Пик: {peak} сообщений за секунду (лимит {args.rate:g} + запас {args.burst}), отправок во время паузы: {during_pause}")
+
+    problems = []
+    if result.done != result.total:
+        problems.append("учтены не все сообщения")
+    if result.failed != len(blocked) or result.errors != {"TelegramForbiddenError": len(blocked)}:
+        problems.append("не доставлены не только заблокированные")
+    if peak > args.rate + args.burst:
+        problems.append("превышен лимит частоты")
+    if during_pause:
+        problems.append("отправки во время RetryAfter")
+    for problem in problems:
+        print(f"ОШИБКА: {problem}")
+    return 1 if problems else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--recipients", type=int, default=500)
+    parser.add_argument("--rate", type=float, default=100, help="сообщений в секунду")
+    parser.add_argument("--burst", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.05, help="время ответа Bot API, с")
+    parser.add_argument("--blocked-every", type=int, default=25, help="каждый N-й получатель заблокировал бота")
+    parser.add_argument("--retry-after", type=int, default=1)
+    args = parser.parse_args()
+    sys.exit(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
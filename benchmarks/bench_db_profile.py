@@ -0,0 +1,104 @@
+"""Микробенчмарк пропускной способности отметок для профилей движка SQLite.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_db_profile --users 500 --concurrency 50
+
+Для каждого профиля запускается отдельный процесс (настройки движка читаются
+из окружения при импорте db.models) со свежей временной базой. Параллельно с
+отметками крутится читатель, имитирующий статистику/экспорт.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+
+async def run_profile(users: int, concurrency: int):
+    from sqlalchemy import select, func
+    from db.models import init_db, warm_user_cache, async_session, User, Attendance, AttendanceManager, MarkResult
+
+    settings = await init_db()
+    async with async_session() as session:
+        async with session.begin():
+            session.add_all(
+                User(telegram_id=100000 + i, full_name=f"Студент {i}", group=f"гр{i % 10}")
+                for i in range(users)
+            )
+    # Пользователи добавлены в обход UserManager - перечитываем кэш
+    await warm_user_cache()
+
+    manager = AttendanceManager()
+    semaphore = asyncio.Semaphore(concurrency)
+    results = []
+    done = asyncio.Event()
+    reads = 0
+
+    async def mark(telegram_id):
+        async with semaphore:
+            results.append(await manager.post(telegram_id))
+
+    async def reader():
+        nonlocal reads
+        while not done.is_set():
+            async with async_session() as session:
+                await session.scalar(select(func.count(Attendance.id)))
+            reads += 1
+            await asyncio.sleep(0)
+
+    reader_task = asyncio.create_task(reader())
+    started = time.perf_counter()
+    await asyncio.gather(*(mark(100000 + i) for i in range(users)))
+    elapsed = time.perf_counter() - started
+    done.set()
+    await reader_task
+
+    return {
+        "profile": os.environ.get("DB_PROFILE", "default"),
+        "settings": settings,
+        "users": users,
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 4),
+        "marks_per_second": round(users / elapsed, 1),
+        "inserted": sum(r is MarkResult.INSERTED for r in results),
+        "errors": sum(r is MarkResult.ERROR for r in results),
+        "reader_queries": reads,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--profiles", default="default,production")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(asyncio.run(run_profile(args.users, args.concurrency))))
+        return
+
+    for profile in args.profiles.split(","):
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ)
+            env["DB_URL"] = f"sqlite+aiosqlite:///{os.path.join(tmp, 'bench.db')}"
+            env["DB_PROFILE"] = profile
+            env.setdefault("ADMIN_IDS", "0")
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_db_profile", "--child",
+                 "--users", str(args.users), "--concurrency", str(args.concurrency)],
+                env=env, capture_output=True, text=True, check=True
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+        print(
+            f"{profile:>10}: {result['marks_per_second']:>8} отметок/с, "
+            f"{result['seconds']} с, вставлено {result['inserted']}, ошибок {result['errors']}, "
+            f"чтений {result['reader_queries']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Накладные расходы сбора метрик на поток отметки.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_metrics --users 300 --rounds 3
+
+METRICS_ENABLED читается при импорте, поэтому каждый замер - отдельный
+процесс со свежей временной базой. Студенты отмечаются последовательно
+(кнопка + код через Dispatcher), чтобы время на апдейт не зашумляла
+конкуренция за SQLite. Отдельно меряется стоимость одного observe().
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+
+async def run_flow(users: int) -> dict:
+    from db.models import init_db, warm_user_cache, async_session, engine, User
+    from bot.bot import create_dispatcher
+    from benchmarks.fake_bot import make_bot, text_update
+    from benchmarks.load_mark import FixedCodeGenerator
+
+    await init_db()
+    async with async_session() as session:
+        async with session.begin():
+            session.add_all(
+                User(telegram_id=300000 + i, full_name=f"Студент {i}", group=f"гр{i % 10}")
+                for i in range(users)
+            )
+    await warm_user_cache()
+
+    generator = FixedCodeGenerator()
+    dp = create_dispatcher(generator)
+    bot = make_bot()
+    await dp.emit_startup(bot=bot)
+
+    started = time.perf_counter()
+    for i in range(users):
+        await dp.feed_update(bot, text_update(300000 + i, "📝 Отметиться"))
+        await dp.feed_update(bot, text_update(300000 + i, str(generator.code)))
+    elapsed = time.perf_counter() - started
+
+    await dp.emit_shutdown(bot=bot)
+    await engine.dispose()
+    return {"updates": users * 2, "us_per_update": round(elapsed / (users * 2) * 1e6, 1)}
+
+
+def observe_cost(iterations: int = 200000) -> float:
+    from utils.metrics import Histogram
+
+    histogram = Histogram("bench_seconds", "", labels=("handler",))
+    started = time.perf_counter()
+    for i in range(iterations):
+        histogram.observe(0.003, "process_code")
+    return (time.perf_counter() - started) / iterations * 1e9
+
+
+def run_child(users: int, enabled: bool) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(
+            os.environ,
+            DB_URL=f"sqlite+aiosqlite:///{os.path.join(tmp, 'metrics.db')}",
+            DB_PROFILE="production",
+            METRICS_ENABLED="1" if enabled else "0",
+        )
+        env.setdefault("ADMIN_IDS", "0")
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_metrics", "--child", "--users", str(users)],
+            env=env, capture_output=True, text=True, check=True
+        ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=300)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(asyncio.run(run_flow(args.users))))
+        return
+
+    timings = {False: [], True: []}
+    for _ in range(args.rounds):
+        # Чередуем, чтобы дрейф машины влиял на оба варианта одинаково
+        for enabled in (False, True):
+            timings[enabled].append(run_child(args.users, enabled)["us_per_update"])
+
+    off = statistics.median(timings[False])
+    on = statistics.median(timings[True])
+    print(f"Без метрик:  {off:.1f} мкс/апдейт {timings[False]}")
+    print(f"С метриками: {on:.1f} мкс/апдейт {timings[True]}")
+    print(f"Накладные расходы: {on - off:+.1f} мкс/апдейт ({(on - off) / off:+.1%})")
+    print(f"Histogram.observe(): {observe_cost():.0f} нс")
+
+
+if __name__ == "__main__":
+    main()
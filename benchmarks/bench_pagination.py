@@ -0,0 +1,102 @@
+"""Цена страницы истории отметок: keyset по (date, id) против OFFSET.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_pagination --days 400 --per-day 500
+
+Во временную базу пишется история (days x per-day отметок), затем на
+разной глубине замеряется страница /attendance через fetch_attendance_page
+(продолжение с курсора) и тем же запросом с OFFSET, как было бы без курсора.
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+
+async def seed(days: int, per_day: int, users: int):
+    from sqlalchemy import insert
+    from db.models import init_db, engine, User, Attendance, day_key
+
+    await init_db()
+    random.seed(1)
+    async with engine.begin() as conn:
+        await conn.execute(insert(User), [
+            {"telegram_id": 300000 + i, "full_name": f"Студент {i}", "group": f"гр{i % 20}"} for i in range(users)
+        ])
+        start = datetime(2024, 9, 1, 9)
+        for day in range(days):
+            moment = start + timedelta(days=day)
+            rows = []
+            for user_id in random.sample(range(1, users + 1), per_day):
+                marked = moment + timedelta(seconds=random.randint(0, 5400))
+                rows.append({"date": marked, "day": day_key(marked), "user_id": user_id, "room": "main"})
+            await conn.execute(insert(Attendance), rows)
+
+
+async def measure(depth: int, limit: int, repeat: int) -> tuple:
+    from sqlalchemy import select
+    from db.models import User, Attendance, async_session
+    from db.queries import AttendanceFilter, fetch_attendance_page
+
+    filters = AttendanceFilter()
+    query = (
+        select(Attendance.id, Attendance.date, User.full_name, User.group, Attendance.room)
+        .join(User, User.id == Attendance.user_id)
+        .order_by(Attendance.date.desc(), Attendance.id.desc())
+    )
+    async with async_session() as session:
+        cursor = (await session.execute(
+            select(Attendance.date, Attendance.id)
+            .order_by(Attendance.date.desc(), Attendance.id.desc()).offset(depth - 1).limit(1)
+        )).one()
+
+    keyset = []
+    offset = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        page = await fetch_attendance_page(filters, after=tuple(cursor), limit=limit)
+        keyset.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        async with async_session() as session:
+            rows = (await session.execute(query.offset(depth).limit(limit + 1))).all()
+        offset.append(time.perf_counter() - started)
+        assert [row.id for row in page.rows] == [row.id for row in rows[:limit]]
+    return statistics.median(keyset), statistics.median(offset)
+
+
+async def run(args):
+    from db.models import engine
+
+    await seed(args.days, args.per_day, args.users)
+    total = args.days * args.per_day
+    print(f"Отметок в базе: {total}, строк на странице: {args.limit}")
+    for depth in (args.limit, total // 10, total // 2, total - args.limit * 2):
+        keyset, offset = await measure(depth, args.limit, args.repeat)
+        print(f"глубина {depth:>7}: keyset {keyset * 1000:7.2f} мс, OFFSET {offset * 1000:7.2f} мс")
+    await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--days", type=int, default=400)
+    parser.add_argument("--per-day", type=int, default=500)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    # DB_URL читается при импорте db.models - задаём временную базу до импорта
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DB_URL"] = f"sqlite+aiosqlite:///{os.path.join(tmp, 'pagination.db')}"
+        os.environ.setdefault("DB_PROFILE", "production")
+        os.environ.setdefault("ADMIN_IDS", "0")
+        asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""Импорт списка группы на 5000 строк против регистрации по одному.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_roster --rows 5000 --existing 500
+
+Список содержит заранее известное число повторов (с базой и внутри файла)
+и строк с ошибками; скрипт сверяет итог импорта с ожидаемым и завершается
+с кодом 1 при расхождении. Для сравнения те же строки записываются так,
+как это делает регистрация: check_full_name и UserManager.post на каждую.
+"""
+import argparse
+import asyncio
+import csv
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def make_roster(rows: int, existing: int) -> tuple:
+    """CSV со строками: новые, повторы из базы, повторы в файле, с ошибками"""
+    output = io.StringIO()
+    writer = csv.writer(output, delimiter=";")
+    writer.writerow(["ФИО", "Группа", "ТГ_АЙДИ"])
+    expected = {"inserted": 0, "duplicate": 0, "invalid": 0}
+    for i in range(rows):
+        if i < existing:
+            # ФИО уже зарегистрированного студента
+            writer.writerow([f"Студент {i}", f"гр{i % 20}", ""])
+            expected["duplicate"] += 1
+        elif i % 100 == 1:
+            writer.writerow([f"Новый {i - 1}", f"гр{i % 20}", ""])
+            expected["duplicate"] += 1
+        elif i % 100 == 2:
+            writer.writerow([f"Новый {i}", "", ""])
+            expected["invalid"] += 1
+        else:
+            telegram_id = 500000 + i if i % 2 else ""
+            writer.writerow([f"Новый {i}", f"гр{i % 20}", telegram_id])
+            expected["inserted"] += 1
+    return output.getvalue().encode("utf-8-sig"), expected
+
+
+async def seed(existing: int):
+    from db.models import init_db, async_session, User
+
+    await init_db()
+    async with async_session() as session:
+        async with session.begin():
+            session.add_all(
+                User(telegram_id=300000 + i, full_name=f"Студент {i}", group=f"гр{i % 20}")
+                for i in range(existing)
+            )
+
+
+async def run_import(content: bytes, batch_size: int) -> dict:
+    from db.roster import read_roster, import_roster
+
+    started = time.perf_counter()
+    rows = read_roster(content, "roster.csv")
+    parsed = time.perf_counter() - started
+    summary = await import_roster(rows, batch_size)
+    summary["parse_seconds"] = parsed
+    return summary
+
+
+async def run_sequential(content: bytes) -> float:
+    """Как при регистрации: проверка ФИО и отдельная транзакция на строку"""
+    from db.models import UserManager
+    from db.roster import read_roster, validate_roster
+
+    rows = validate_roster(read_roster(content, "roster.csv"))
+    user_manager = UserManager()
+    started = time.perf_counter()
+    for i, row in enumerate(rows):
+        if not await user_manager.check_full_name(row.full_name):
+            await user_manager.post(row.telegram_id or 900000 + i, row.full_name, row.group)
+    return time.perf_counter() - started
+
+
+async def run_flow(args) -> dict:
+    from db.models import engine
+
+    content, expected = make_roster(args.rows, args.existing)
+    await seed(args.existing)
+    if args.sequential:
+        result = {"seconds": await run_sequential(content)}
+    else:
+        result = await run_import(content, args.batch_size)
+        result["expected"] = expected
+    await engine.dispose()
+    return result
+
+
+def run_child(args, sequential: bool) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(
+            os.environ,
+            DB_URL=f"sqlite+aiosqlite:///{os.path.join(tmp, 'roster.db')}",
+            DB_PROFILE=args.profile,
+        )
+        env.setdefault("ADMIN_IDS", "0")
+        command = [
+            sys.executable, "-m", "benchmarks.bench_roster", "--child",
+            "--rows", str(args.rows), "--existing", str(args.existing), "--batch-size", str(args.batch_size),
+        ]
+        if sequential:
+            command.append("--sequential")
+        output = subprocess.run(command, env=env, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--existing", type=int, default=500, help="уже зарегистрированных студентов")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--profile", default="production")
+    parser.add_argument("--skip-sequential", action="store_true", help="не замерять запись по одному")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--sequential", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(asyncio.run(run_flow(args))))
+        return
+
+    summary = run_child(args, sequential=False)
+    expected = summary["expected"]
+    got = {status: summary[status] for status in expected}
+    print(f"Разбор CSV: {summary['parse_seconds']:.3f} с")
+    print(f"Импорт: {summary['seconds']:.3f} с ({args.rows / summary['seconds']:.0f} строк/с), пакет {args.batch_size}")
+    print(f"Итог: {got}, ожидалось {expected}")
+    if not args.skip_sequential:
+        seconds = run_child(args, sequential=True)["seconds"]
+        print(f"По одному: {seconds:.3f} с ({args.rows / seconds:.0f} строк/с), "
+              f"импорт быстрее в {seconds / summary['seconds']:.1f} раз")
+    sys.exit(0 if got == expected else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Холодный старт бота: импорт, init_db и проверка бюджета.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_startup --rounds 5 --budget 6
+
+Каждый замер - отдельный процесс (чистый кэш модулей) со свежей временной
+базой: импорт main.py и init_db, как при настоящем запуске, без сети.
+Скрипт завершается с кодом 1, если медиана превысила бюджет или при старте
+загрузился тяжёлый стек экспорта (pandas/openpyxl) - так его можно ставить
+в CI как регрессионную проверку.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+# Эти модули нужны только отчётам и не должны грузиться при старте
+HEAVY_MODULES = ("pandas", "numpy", "openpyxl")
+
+
+async def run_startup() -> dict:
+    import main
+    from utils.startup import startup
+    from db.models import engine
+
+    await main.init_db()
+    startup.mark("init_db")
+    await engine.dispose()
+    return {
+        "stages": startup.durations(),
+        "total": max(startup.stages.values()),
+        "heavy": [name for name in HEAVY_MODULES if name in sys.modules],
+    }
+
+
+def run_child() -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, DB_URL=f"sqlite+aiosqlite:///{os.path.join(tmp, 'startup.db')}")
+        env.setdefault("ADMIN_IDS", "0")
+        env.setdefault("BOT_TOKEN", "0:bench")
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_startup", "--child"],
+            env=env, capture_output=True, text=True, check=True
+        ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=6.0, help="бюджет на медиану, секунды")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(asyncio.run(run_startup())))
+        return
+
+    runs = [run_child() for _ in range(args.rounds)]
+    for stage in runs[0]["stages"]:
+        values = [run["stages"][stage] for run in runs]
+        print(f"{stage:>8}: {statistics.median(values):.3f} с (мин {min(values):.3f}, макс {max(values):.3f})")
+    total = statistics.median(run["total"] for run in runs)
+    print(f"   всего: {total:.3f} с, бюджет {args.budget:.3f} с")
+
+    failed = False
+    heavy = sorted({name for run in runs for name in run["heavy"]})
+    if heavy:
+        print(f"ОШИБКА: при старте загружены {', '.join(heavy)}")
+        failed = True
+    if total > args.budget:
+        print(f"ОШИБКА: старт дольше бюджета на {total - args.budget:.3f} с")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Бенчмарк агрегатов выгрузки посещений: прежний pandas-код против utils.stats.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_stats --sizes 10000,100000,1000000
+
+Векторная сторона повторяет подсчёт в export_attendance_to_excel: строки
+запроса приходят пачками по EXPORT_CHUNK_SIZE, по каждой считаются отметки
+по (день, группа) и по группам, а дни выделяются отрезками. Прежняя сторона -
+groupby по дням с reset_index/iterrows из исходной выгрузки. Сравнивается
+только подсчёт статистики, без записи Excel; итоги обеих сторон сверяются.
+"""
+import argparse
+import sys
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from config.config import EXPORT_CHUNK_SIZE
+from utils import stats
+
+
+def make_rows(size: int, groups: int = 30, students: int = 3000) -> list:
+    """Строки (date, day, full_name, group) в порядке запроса выгрузки"""
+    rng = np.random.default_rng(1)
+    start = datetime(2025, 9, 1, 9, 0)
+    offsets = rng.integers(0, 120 * 86400, size)
+    student_ids = rng.integers(0, students, size)
+    rows = []
+    for offset, student in zip(offsets.tolist(), student_ids.tolist()):
+        moment = start + timedelta(seconds=offset)
+        day = moment.year * 10000 + moment.month * 100 + moment.day
+        # Каждая 10-я группа пустая - как у студентов без группы
+        group = f"гр{student % groups}" if student % 10 else None
+        rows.append((moment, day, f"Студент {student}", group))
+    rows.sort(key=lambda row: (row[1], row[3] or "", row[2]))
+    return rows
+
+
+def legacy(rows: list):
+    """Исходная выгрузка: DataFrame целиком, groupby по дням и iterrows по группам"""
+    df = pd.DataFrame(
+        [{"Дата": day, "ФИО": name or "", "Группа": group or ""} for _, day, name, group in rows],
+        columns=["Дата", "ФИО", "Группа"]
+    )
+    per_day = {}
+    for date, day_data in df.groupby("Дата"):
+        per_day[date] = {
+            row["Группа"]: row["Количество"]
+            for _, row in day_data.groupby("Группа").size().reset_index(name="Количество").iterrows()
+        }
+    overall = {
+        row["Группа"]: row["Количество"]
+        for _, row in df.groupby("Группа").size().reset_index(name="Количество").iterrows()
+    }
+    return per_day, overall
+
+
+def vectorized(rows: list, chunk_size: int = EXPORT_CHUNK_SIZE):
+    """Подсчёт из export_attendance_to_excel без записи строк в лист"""
+    per_day = {}
+    current_day = None
+    day_groups = pd.Series(dtype="int64")
+    overall = pd.Series(dtype="int64")
+    for offset in range(0, len(rows), chunk_size):
+        dates, days, names, groups = stats.columns(rows[offset:offset + chunk_size], 4)
+        groups = stats.fill_groups(groups, "")
+        counts = stats.day_group_counts(days, groups)
+        overall = overall.add(stats.group_counts(groups), fill_value=0)
+        for start, _ in stats.segments(days):
+            day = days[start]
+            if day != current_day:
+                if current_day is not None:
+                    per_day[current_day] = day_groups
+                current_day = day
+                day_groups = pd.Series(dtype="int64")
+            day_groups = day_groups.add(counts.loc[day], fill_value=0)
+    if current_day is not None:
+        per_day[current_day] = day_groups
+    return per_day, overall
+
+
+def same_totals(old, new) -> bool:
+    old_days, old_overall = old
+    new_days, new_overall = new
+    if {group: int(count) for group, count in new_overall.items()} != old_overall:
+        return False
+    return all(
+        {group: int(count) for group, count in new_days[day].items()} == counts
+        for day, counts in old_days.items()
+    ) and old_days.keys() == new_days.keys()
+
+
+def measure(func, *args, repeat: int = 3):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    ok = True
+    for size in map(int, args.sizes.split(",")):
+        rows = make_rows(size)
+        old, old_result = measure(legacy, rows, repeat=args.repeat)
+        new, new_result = measure(vectorized, rows, repeat=args.repeat)
+        match = same_totals(old_result, new_result)
+        ok &= match
+        print(f"{size:>9} строк: прежний {old:8.3f} с, векторно {new:8.3f} с, ускорение x{old / new:.1f}"
+              + ("" if match else "  ОШИБКА: итоги не совпадают"))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
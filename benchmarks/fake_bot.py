@@ -0,0 +1,75 @@
+"""Бот без сети: сессия aiogram, которая отвечает на запросы локально."""
+import asyncio
+import itertools
+from datetime import datetime
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.types import Chat, Message, Update, User
+
+FAKE_TOKEN = "42:TEST"
+
+
+class FakeSession(BaseSession):
+    """Сессия, которая не ходит в Telegram.
+
+    Все запросы сохраняются в requests, на методы, возвращающие Message,
+    отвечает правдоподобным сообщением, на остальные - True. latency
+    имитирует время ответа Bot API, а handler позволяет подменить ответ
+    (например, выбросить TelegramRetryAfter).
+    """
+
+    def __init__(self, latency: float = 0.0, handler=None):
+        super().__init__()
+        self.latency = latency
+        self.handler = handler
+        self.requests = []
+        self._message_ids = itertools.count(1)
+
+    async def make_request(self, bot, method, timeout=None):
+        self.requests.append(method)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.handler is not None:
+            result = await self.handler(bot, method)
+            if result is not None:
+                return result
+        if getattr(method, "__returning__", None) is Message:
+            return Message(
+                message_id=next(self._message_ids),
+                date=datetime.now(),
+                chat=Chat(id=getattr(method, "chat_id", 0), type="private"),
+                text=getattr(method, "text", None),
+            )
+        return True
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b""
+
+    async def close(self):
+        pass
+
+    def sent_texts(self, chat_id: int):
+        return [getattr(m, "text", None) for m in self.requests if getattr(m, "chat_id", None) == chat_id]
+
+
+def make_bot(latency: float = 0.0, handler=None) -> Bot:
+    return Bot(FAKE_TOKEN, session=FakeSession(latency, handler))
+
+
+_update_ids = itertools.count(1)
+
+
+def text_update(telegram_id: int, text: str) -> Update:
+    """Update с текстовым сообщением от пользователя в личном чате"""
+    update_id = next(_update_ids)
+    return Update(
+        update_id=update_id,
+        message=Message(
+            message_id=update_id,
+            date=datetime.now(),
+            chat=Chat(id=telegram_id, type="private"),
+            from_user=User(id=telegram_id, is_bot=False, first_name="Студент"),
+            text=text,
+        ),
+    )
@@ -0,0 +1,173 @@
+"""Нагрузочный тест отметки посещения без сети Telegram.
+
+Запуск из корня репозитория:
+    python -m benchmarks.load_mark --users 200 --window 20
+
+N зарегистрированных студентов во временной базе в течение одного окна кода
+нажимают "📝 Отметиться" и вводят код. Апдейты проходят через настоящий
+bot.handlers.router и Dispatcher, ответы бота принимает FakeSession.
+Результат каждого прогона дописывается строкой JSON в --output.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+
+
+class FixedCodeGenerator:
+    """Генератор с заранее известным кодом, который не истекает"""
+
+    def __init__(self, code: int = 4242):
+        self.code = code
+
+    def get_current_code(self):
+        return self.code
+
+    def is_code_valid(self, code_to_check):
+        return code_to_check == self.code
+
+    def get_time_remaining(self):
+        return 0
+
+    def valid_codes(self):
+        return {self.code}
+
+    def seconds_until_change(self):
+        return 3600.0
+
+
+def percentile(values, percent: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(percent / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def latency_summary(values) -> dict:
+    return {
+        "count": len(values),
+        "p50_ms": round(percentile(values, 50) * 1000, 3),
+        "p95_ms": round(percentile(values, 95) * 1000, 3),
+        "p99_ms": round(percentile(values, 99) * 1000, 3),
+        "max_ms": round(max(values) * 1000, 3) if values else 0.0,
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return ""
+
+
+async def run(args) -> dict:
+    # Импорт после настройки окружения: config читает его при импорте
+    from sqlalchemy import select, func
+    from db.models import init_db, warm_user_cache, async_session, engine, User, Attendance
+    from bot.bot import create_dispatcher, create_attendance_writer
+    from benchmarks.fake_bot import make_bot, text_update
+
+    await init_db()
+    base_id = 500000
+    async with async_session() as session:
+        async with session.begin():
+            session.add_all(
+                User(telegram_id=base_id + i, full_name=f"Студент {i}", group=f"гр{i % args.groups}")
+                for i in range(args.users)
+            )
+    await warm_user_cache()
+
+    generator = FixedCodeGenerator()
+    attendance_writer = create_attendance_writer()
+    dp = create_dispatcher(generator, attendance_writer)
+    bot = make_bot(latency=args.api_latency / 1000)
+    await dp.emit_startup(bot=bot)
+
+    button_latency = []
+    code_latency = []
+    rng = random.Random(args.seed)
+
+    async def student(telegram_id: int):
+        await asyncio.sleep(rng.uniform(0, args.window))
+        started = time.perf_counter()
+        await dp.feed_update(bot, text_update(telegram_id, "📝 Отметиться"))
+        button_latency.append(time.perf_counter() - started)
+        started = time.perf_counter()
+        await dp.feed_update(bot, text_update(telegram_id, str(generator.code)))
+        code_latency.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(student(base_id + i) for i in range(args.users)))
+    elapsed = time.perf_counter() - started
+
+    await dp.emit_shutdown(bot=bot)
+    if attendance_writer:
+        await attendance_writer.stop()
+    async with async_session() as session:
+        marked = await session.scalar(select(func.count(Attendance.id)))
+    await engine.dispose()
+
+    return {
+        "seconds": round(elapsed, 4),
+        "marks": marked,
+        "marks_per_second": round(marked / elapsed, 2) if elapsed else 0.0,
+        "button": latency_summary(button_latency),
+        "code": latency_summary(code_latency),
+        "bot_requests": len(bot.session.requests),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--groups", type=int, default=10)
+    parser.add_argument("--window", type=float, default=0.0,
+                        help="за сколько секунд приходят все студенты (0 - одновременно)")
+    parser.add_argument("--api-latency", type=float, default=0.0, help="задержка ответа Bot API, мс")
+    parser.add_argument("--profile", default=None, help="DB_PROFILE для временной базы")
+    parser.add_argument("--batch", action="store_true", help="включить ATTENDANCE_BATCH_MODE")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default=os.path.join("benchmarks", "load_mark_results.jsonl"))
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DB_URL"] = f"sqlite+aiosqlite:///{os.path.join(tmp, 'load.db')}"
+        os.environ.setdefault("ADMIN_IDS", "0")
+        if args.profile:
+            os.environ["DB_PROFILE"] = args.profile
+        if args.batch:
+            os.environ["ATTENDANCE_BATCH_MODE"] = "1"
+        results = asyncio.run(run(args))
+
+    record = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "params": {
+            "users": args.users,
+            "window": args.window,
+            "api_latency_ms": args.api_latency,
+            "profile": os.environ.get("DB_PROFILE", "default"),
+            "batch": args.batch,
+        },
+        "results": results,
+    }
+    with open(args.output, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    code = results["code"]
+    print(
+        f"{results['marks']} отметок за {results['seconds']} с ({results['marks_per_second']}/с); "
+        f"код p50/p95/p99: {code['p50_ms']}/{code['p95_ms']}/{code['p99_ms']} мс -> {args.output}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""Повтор апдейтов через HTTP-вебхук и замер задержки.
+
+Запуск из корня репозитория:
+    python -m benchmarks.replay_webhook --users 200
+    python -m benchmarks.replay_webhook --updates recorded.jsonl --url http://host:8080/webhook
+
+Без --updates генерируется поток "📝 Отметиться" + код от --users студентов.
+Файл --updates - JSON-массив или JSONL с апдейтами в формате Bot API.
+Без --url поднимается локальное приложение bot.webhook.create_app с
+временной базой и FakeSession вместо Telegram.
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+from benchmarks.load_mark import FixedCodeGenerator, latency_summary
+
+
+def load_updates(path: str) -> list:
+    with open(path, encoding="utf-8") as f:
+        text = f.read().strip()
+    if text.startswith("["):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def generate_updates(users: int, code: int, base_id: int = 500000) -> list:
+    from benchmarks.fake_bot import text_update
+
+    updates = []
+    for text in ("📝 Отметиться", str(code)):
+        for i in range(users):
+            update = text_update(base_id + i, text)
+            updates.append(update.model_dump(mode="json", exclude_none=True))
+    return updates
+
+
+async def post_all(url: str, updates: list, concurrency: int, secret: str = "") -> dict:
+    import aiohttp
+
+    headers = {"X-Telegram-Bot-Api-Secret-Token": secret} if secret else {}
+    latency = []
+    statuses = {}
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with aiohttp.ClientSession() as http:
+        async def post(update):
+            async with semaphore:
+                started = time.perf_counter()
+                async with http.post(url, json=update, headers=headers) as response:
+                    await response.read()
+                latency.append(time.perf_counter() - started)
+                statuses[response.status] = statuses.get(response.status, 0) + 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(post(update) for update in updates))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "seconds": round(elapsed, 4),
+        "updates_per_second": round(len(updates) / elapsed, 2) if elapsed else 0.0,
+        "statuses": statuses,
+        "http": latency_summary(latency),
+    }
+
+
+async def run_local(args) -> dict:
+    # Импорт после настройки окружения: config читает его при импорте
+    from aiohttp import web
+    from sqlalchemy import select, func
+    from db.models import init_db, warm_user_cache, async_session, engine, User, Attendance
+    from bot.bot import create_dispatcher
+    from bot.webhook import create_app
+    from benchmarks.fake_bot import make_bot
+
+    await init_db()
+    base_id = 500000
+    async with async_session() as session:
+        async with session.begin():
+            session.add_all(
+                User(telegram_id=base_id + i, full_name=f"Студент {i}", group=f"гр{i % 10}")
+                for i in range(args.users)
+            )
+    await warm_user_cache()
+
+    generator = FixedCodeGenerator()
+    bot = make_bot(latency=args.api_latency / 1000)
+    dp = create_dispatcher(generator)
+    app = create_app(dp, bot, path="/webhook", secret="", concurrency=args.concurrency)
+    await dp.emit_startup(bot=bot)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", args.port)
+    await site.start()
+
+    updates = load_updates(args.updates) if args.updates else generate_updates(args.users, generator.code)
+    try:
+        results = await post_all(f"http://127.0.0.1:{args.port}/webhook", updates, args.concurrency)
+        started = time.perf_counter()
+        await app["webhook_handler"].drain()
+        results["drain_seconds"] = round(time.perf_counter() - started, 4)
+    finally:
+        await runner.cleanup()
+        await dp.emit_shutdown(bot=bot)
+
+    async with async_session() as session:
+        results["marks"] = await session.scalar(select(func.count(Attendance.id)))
+    results["bot_requests"] = len(bot.session.requests)
+    await engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--updates", default=None, help="JSON/JSONL с записанными апдейтами")
+    parser.add_argument("--url", default=None, help="адрес работающего вебхука")
+    parser.add_argument("--secret", default="", help="секрет вебхука для --url")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50, help="одновременных HTTP-запросов")
+    parser.add_argument("--api-latency", type=float, default=0.0, help="задержка ответа Bot API, мс")
+    parser.add_argument("--port", type=int, default=18080)
+    args = parser.parse_args()
+
+    if args.url:
+        updates = load_updates(args.updates) if args.updates else generate_updates(args.users, 0)
+        results = asyncio.run(post_all(args.url, updates, args.concurrency, args.secret))
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            os.environ["DB_URL"] = f"sqlite+aiosqlite:///{os.path.join(tmp, 'replay.db')}"
+            os.environ.setdefault("ADMIN_IDS", "0")
+            results = asyncio.run(run_local(args))
+
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
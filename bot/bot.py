@@ -1,16 +1,142 @@
+import asyncio
 from aiogram import Bot, Dispatcher
-from aiogram.fsm.storage.memory import MemoryStorage
-from config.config import BOT_TOKEN
+from config.config import (
+    BOT_TOKEN, BOT_MODE, ATTENDANCE_BATCH_MODE, ATTENDANCE_BATCH_SIZE, ATTENDANCE_FLUSH_MS, ATTENDANCE_QUEUE_DEPTH,
+    CODE_SECRET, CODE_GRACE_STEPS, DEFAULT_ROOM, WEBHOOK_WORKERS,
+    FSM_CACHE_SIZE, FSM_CODE_TTL, FSM_REGISTRATION_TTL, FSM_SWEEP_INTERVAL, FSM_FLUSH_MS,
+    THROTTLE_CODE_PER_MIN, THROTTLE_CODE_BURST, THROTTLE_MESSAGE_PER_MIN, THROTTLE_MESSAGE_BURST,
+    THROTTLE_GLOBAL_PER_SEC, THROTTLE_GLOBAL_BURST, THROTTLE_MAX_USERS, METRICS_ENABLED,
+    ADMIN_REFRESH_INTERVAL, SESSION_REFRESH_INTERVAL, USER_CACHE_REFRESH_INTERVAL
+)
+from db.ingest import AttendanceWriter
+from db.models import AdminManager, SessionManager, user_cache, refresh_user_cache_forever
+from generator.sessions import SessionRegistry
+from utils.jobs import report_jobs, report_cache
+from utils.metrics import metrics
+from utils.admins import is_admin
+from utils.startup import startup
+from .broadcast import broadcaster
 from .handlers import router
-from .middleware import GeneratorMiddleware
+from .middleware import (
+    GeneratorMiddleware, AttendanceWriterMiddleware, SessionsMiddleware, ThrottlingMiddleware, MetricsMiddleware,
+    FirstPollMiddleware
+)
+from .storage import SQLiteStorage
 
-async def main(generator):
-    bot = Bot(BOT_TOKEN)
-    dp = Dispatcher(storage=MemoryStorage())
+def create_sessions(generator) -> SessionRegistry:
+    # Основной генератор (экран из main.py) - занятие по умолчанию для всех групп
+    sessions = SessionRegistry(secret=CODE_SECRET, grace_steps=CODE_GRACE_STEPS)
+    sessions.add(DEFAULT_ROOM, generator)
+    return sessions
+
+def create_storage() -> SQLiteStorage:
+    # Незавершённые диалоги живут ограниченное время и переживают перезапуск
+    ttls = {
+        "AttendanceState:waiting_code": FSM_CODE_TTL,
+        "Registration": FSM_REGISTRATION_TTL,
+    }
+    # Несколько процессов вебхука пишут в одну таблицу - локальный кэш устареет
+    cache_size = 0 if BOT_MODE == "webhook" and WEBHOOK_WORKERS > 1 else FSM_CACHE_SIZE
+    return SQLiteStorage(ttls=ttls, default_ttl=FSM_REGISTRATION_TTL,
+                         cache_size=cache_size, sweep_interval=FSM_SWEEP_INTERVAL,
+                         flush_interval=FSM_FLUSH_MS / 1000)
+
+def create_throttling() -> ThrottlingMiddleware:
+    limits = {
+        "code": (THROTTLE_CODE_PER_MIN, THROTTLE_CODE_BURST),
+        "message": (THROTTLE_MESSAGE_PER_MIN, THROTTLE_MESSAGE_BURST),
+    }
+    return ThrottlingMiddleware(
+        limits, (THROTTLE_GLOBAL_PER_SEC, THROTTLE_GLOBAL_BURST),
+        max_users=THROTTLE_MAX_USERS, exempt=is_admin
+    )
+
+def create_dispatcher(generator, attendance_writer=None, sessions=None, storage=None, throttling=None) -> Dispatcher:
+    if storage is None:
+        storage = create_storage()
+    dp = Dispatcher(storage=storage)
+    # Загрузка кэша и фоновая очистка; закрывает хранилище сам Dispatcher
+    dp.startup.register(storage.start)
+
+    if sessions is None:
+        sessions = create_sessions(generator)
+
+    # Администраторов, занятия и пользователей могли изменить в другом
+    # процессе (воркеры вебхука) - общее состояние перечитывается из базы
+    refresh_tasks = []
+
+    async def start_refresh():
+        session_manager = SessionManager()
+        sessions.sync(await session_manager.load())
+        refresh_tasks.append(asyncio.create_task(AdminManager().refresh_forever(ADMIN_REFRESH_INTERVAL)))
+        refresh_tasks.append(asyncio.create_task(session_manager.refresh_forever(sessions, SESSION_REFRESH_INTERVAL)))
+        if not user_cache.authoritative:
+            refresh_tasks.append(asyncio.create_task(refresh_user_cache_forever(USER_CACHE_REFRESH_INTERVAL)))
+
+    async def stop_refresh():
+        while refresh_tasks:
+            refresh_tasks.pop().cancel()
 
-    # Добавляем middleware для передачи генератора
+    dp.startup.register(start_refresh)
+    dp.shutdown.register(stop_refresh)
+    # Незавершённые рассылки отменяются вместе с ботом
+    dp.shutdown.register(broadcaster.stop)
+
+    # Ограничение частоты - до фильтров и обработчиков, одно на сообщения и кнопки
+    if throttling is None:
+        throttling = create_throttling()
+    dp.message.outer_middleware(throttling)
+    dp.callback_query.outer_middleware(throttling)
+
+    # Добавляем middleware для передачи генератора и реестра занятий
     dp.message.middleware(GeneratorMiddleware(generator))
     dp.callback_query.middleware(GeneratorMiddleware(generator))
-    
+    dp.message.middleware(SessionsMiddleware(sessions))
+
+    if attendance_writer:
+        dp.message.middleware(AttendanceWriterMiddleware(attendance_writer))
+
+    # Время обработчиков - в лог всегда, в метрики - если они включены
+    metrics_middleware = MetricsMiddleware(metrics if METRICS_ENABLED else None)
+    dp.message.middleware(metrics_middleware)
+    dp.callback_query.middleware(metrics_middleware)
+    if METRICS_ENABLED:
+        metrics.add_stats("bot_throttle", throttling.stats)
+        metrics.add_stats("fsm_storage", storage.stats)
+        metrics.add_stats("report_jobs", report_jobs.stats)
+        metrics.add_stats("report_cache", report_cache.stats)
+        metrics.add_stats("broadcast", broadcaster.stats)
+        if attendance_writer:
+            metrics.add_stats("attendance_writer", lambda: {
+                "queue_depth": attendance_writer.queue_depth,
+                "batches": attendance_writer.batches,
+                "rows": attendance_writer.rows,
+            })
+
     dp.include_router(router)
-    await dp.start_polling(bot, handle_signals=False)
+    return dp
+
+def create_attendance_writer():
+    # Пакетная запись отметок - только если включена в конфиге
+    if not ATTENDANCE_BATCH_MODE:
+        return None
+    attendance_writer = AttendanceWriter(
+        batch_size=ATTENDANCE_BATCH_SIZE,
+        flush_interval=ATTENDANCE_FLUSH_MS / 1000,
+        max_queue=ATTENDANCE_QUEUE_DEPTH
+    )
+    attendance_writer.start()
+    return attendance_writer
+
+async def main(generator, sessions=None):
+    bot = Bot(BOT_TOKEN)
+    attendance_writer = create_attendance_writer()
+    dp = create_dispatcher(generator, attendance_writer, sessions)
+    bot.session.middleware(FirstPollMiddleware(startup))
+    try:
+        await dp.start_polling(bot, handle_signals=False)
+    finally:
+        # Дописываем всё, что осталось в очереди
+        if attendance_writer:
+            await attendance_writer.stop()
+        report_jobs.shutdown()
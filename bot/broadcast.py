@@ -0,0 +1,176 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from aiogram.exceptions import TelegramAPIError, TelegramNetworkError, TelegramRetryAfter, TelegramServerError
+
+from config.config import (
+    BROADCAST_RATE, BROADCAST_BURST, BROADCAST_WORKERS, BROADCAST_RETRIES, BROADCAST_PROGRESS_INTERVAL
+)
+from .middleware import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class BroadcastResult:
+    total: int
+    delivered: int = 0
+    failed: int = 0
+    # Повторные попытки после RetryAfter и ошибок сети
+    retried: int = 0
+    # Тип ошибки -> число недоставленных
+    errors: dict = field(default_factory=dict)
+    started: float = field(default_factory=time.monotonic)
+    finished: float = None
+    # Почему рассылка прервана до конца; None - дошла до конца
+    error: str = None
+
+    @property
+    def done(self) -> int:
+        return self.delivered + self.failed
+
+    @property
+    def seconds(self) -> float:
+        return (self.finished or time.monotonic()) - self.started
+
+
+class Broadcaster:
+    """Рассылка сообщений с ограничением частоты на весь бот.
+
+    Получатели кладутся в asyncio.Queue, её разбирают не больше workers
+    задач. Перед каждой отправкой берётся токен из общего ведра (rate
+    сообщений в секунду): ведро одно на все одновременные рассылки, так что
+    вместе они не превышают лимит Telegram. TelegramRetryAfter
+    приостанавливает все отправки на указанное время, а сообщение
+    повторяется; ошибки сети повторяются до retries раз.
+    """
+
+    def __init__(self, rate: float, burst: int, workers: int, retries: int = 3):
+        self.workers = workers
+        self.retries = retries
+        self.bucket = TokenBucket(rate, burst, time.monotonic())
+        self._resume_at = 0.0
+        self._tasks = set()
+        self.counters = {"broadcasts": 0, "delivered": 0, "failed": 0, "retry_after": 0}
+
+    async def _acquire(self):
+        while True:
+            now = time.monotonic()
+            if now < self._resume_at:
+                await asyncio.sleep(self._resume_at - now)
+                continue
+            if self.bucket.consume(now):
+                return
+            await asyncio.sleep(self.bucket.delay(now))
+
+    async def _send(self, bot, chat_id: int, text: str, result: BroadcastResult):
+        attempts = 0
+        while True:
+            await self._acquire()
+            try:
+                await bot.send_message(chat_id, text)
+                result.delivered += 1
+                self.counters["delivered"] += 1
+                return
+            except TelegramRetryAfter as e:
+                # Флуд-лимит: пауза для всех отправок, это сообщение повторяем
+                self.counters["retry_after"] += 1
+                self._resume_at = max(self._resume_at, time.monotonic() + e.retry_after)
+                logger.warning("Рассылка приостановлена на %s с", e.retry_after, extra={"user_id": chat_id})
+                error = e
+            except (TelegramNetworkError, TelegramServerError) as e:
+                error = e
+                await asyncio.sleep(min(attempts + 1, 5))
+            except TelegramAPIError as e:
+                # Бот заблокирован, чат не найден и т.п. - повтор не поможет
+                error = e
+                break
+            attempts += 1
+            if attempts > self.retries:
+                break
+            result.retried += 1
+
+        name = type(error).__name__
+        result.failed += 1
+        result.errors[name] = result.errors.get(name, 0) + 1
+        self.counters["failed"] += 1
+        logger.info("Сообщение рассылки не доставлено", extra={"user_id": chat_id, "outcome": "failed", "error": name})
+
+    async def run(self, bot, chat_ids, text: str, progress=None,
+                  progress_interval: float = BROADCAST_PROGRESS_INTERVAL, result: BroadcastResult = None) -> BroadcastResult:
+        """Отправляет text всем chat_ids; progress(result) вызывается раз в progress_interval"""
+        if result is None:
+            result = BroadcastResult(total=len(chat_ids))
+        self.counters["broadcasts"] += 1
+        queue = asyncio.Queue()
+        for chat_id in chat_ids:
+            queue.put_nowait(chat_id)
+
+        async def worker():
+            while not queue.empty():
+                await self._send(bot, queue.get_nowait(), text, result)
+
+        async def report():
+            while True:
+                await asyncio.sleep(progress_interval)
+                try:
+                    await progress(result)
+                except Exception:
+                    # Прогресс необязателен: ошибка (в том числе RetryAfter) не останавливает рассылку
+                    logger.warning("Не удалось обновить прогресс рассылки", exc_info=True)
+
+        workers = [asyncio.create_task(worker()) for _ in range(min(self.workers, len(chat_ids)))]
+        reporter = asyncio.create_task(report()) if progress else None
+        tasks = workers + ([reporter] if reporter else [])
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            result.finished = time.monotonic()
+        logger.info("Рассылка завершена: доставлено %s из %s за %.1f с",
+                    result.delivered, result.total, result.seconds, extra={"rows": result.total})
+        return result
+
+    def start(self, bot, chat_ids, text: str, progress=None, done=None) -> asyncio.Task:
+        """Запускает рассылку в фоне, чтобы не держать обработчик.
+
+        done(result) вызывается всегда, в том числе после ошибки или отмены:
+        тогда в result частичные счётчики и error.
+        """
+        result = BroadcastResult(total=len(chat_ids))
+
+        async def run():
+            try:
+                await self.run(bot, chat_ids, text, progress, result=result)
+            except asyncio.CancelledError:
+                result.error = "рассылка отменена"
+                raise
+            except Exception as e:
+                result.error = type(e).__name__
+                logger.exception("Рассылка прервана", extra={"rows": result.total})
+            finally:
+                if done:
+                    try:
+                        await done(result)
+                    except Exception:
+                        logger.exception("Не удалось отправить итог рассылки")
+
+        task = asyncio.create_task(run())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def stop(self):
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {**self.counters, "running": len(self._tasks)}
+
+
+# Общий для всех рассылок процесса: одно ведро токенов на бота
+broadcaster = Broadcaster(BROADCAST_RATE, BROADCAST_BURST, BROADCAST_WORKERS, BROADCAST_RETRIES)
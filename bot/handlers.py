@@ -1,14 +1,25 @@
 from aiogram import Router, F
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from aiogram.filters import CommandStart, Command
-from aiogram.types import Message, CallbackQuery, FSInputFile
+from aiogram.filters import CommandStart, Command, CommandObject
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import Message, CallbackQuery, FSInputFile, BufferedInputFile
+import asyncio
 import os
 from datetime import datetime
-from utils.utils import export_attendance_to_excel, is_admin, get_attendance_stats, add_admin, remove_admin, get_admin_ids, export_users_to_excel
+from utils.admins import is_admin, add_admin, remove_admin, get_admin_ids
+from utils.summary import get_attendance_stats
 from . import keyboards as kb
-from config.config import MOSCOW_TZ
-from db.models import UserManager, AttendanceManager, async_session
+from .broadcast import broadcaster
+from config.config import MOSCOW_TZ, CODE_INTERVAL, ATTENDANCE_PAGE_SIZE
+from db.models import UserManager, AttendanceManager, DailyStatsManager, SessionManager, MarkResult, async_session
+from db.roster import RosterError, read_roster, import_roster, report_csv
+from db.queries import (
+    AttendanceFilter, fetch_attendance_page, get_student_history, get_group_history, attendance_version, users_version,
+    broadcast_recipients
+)
+from utils.jobs import report_jobs, report_cache, JobQueueFull
+from utils.metrics import metrics
 
 router = Router()
 
@@ -21,6 +32,9 @@ class Registration(StatesGroup):
 class AttendanceState(StatesGroup):
     waiting_code = State()
 
+class RosterImport(StatesGroup):
+    waiting_file = State()
+
 @router.message(CommandStart())
 async def start_registration(message: Message, state: FSMContext):
     await state.clear()
@@ -37,7 +51,13 @@ async def enter_full_name(message: Message, state: FSMContext):
     await state.update_data(full_name=message.text)
     user_manager = UserManager()
     if await user_manager.check_full_name(message.text):
-        await message.answer("❌ Пользователь с таким ФИО уже зарегистрирован. Обратитесь к администратору")
+        roster_user = await user_manager.get_roster_entry(message.text)
+        if roster_user is None:
+            await message.answer("❌ Пользователь с таким ФИО уже зарегистрирован. Обратитесь к администратору")
+            return
+        # Студент есть в загруженном списке группы - группа уже известна
+        await state.update_data(full_name=roster_user.full_name, group=roster_user.group)
+        await ask_confirmation(message, state)
     else:
         await message.answer("📚 Теперь введите номер вашей группы в формате: 5132704/50001")
         await state.set_state(Registration.group)
@@ -45,6 +65,9 @@ async def enter_full_name(message: Message, state: FSMContext):
 @router.message(Registration.group)
 async def enter_group(message: Message, state: FSMContext):
     await state.update_data(group=message.text)
+    await ask_confirmation(message, state)
+
+async def ask_confirmation(message: Message, state: FSMContext):
     data = await state.get_data()
     await message.answer(
         "📋 **Подтвердите ваши данные:**\n\n"
@@ -89,46 +112,86 @@ async def start_mark_attendance(message: Message, state: FSMContext):
         return
 
 @router.message(AttendanceState.waiting_code)
-async def process_code(message: Message, state: FSMContext, generator):
+async def process_code(message: Message, state: FSMContext, sessions, attendance_writer=None):
     attendance_manager = AttendanceManager()
     code_str = message.text.strip()
     try:
         code = int(code_str)
-        if generator.is_code_valid(code):
-            success = await attendance_manager.post(message.from_user.id)
-            if success:
+        # Код сам указывает на занятие (аудиторию), на котором отмечается студент
+        user = await UserManager().get(message.from_user.id)
+        session = sessions.resolve(code, user.group if user else None)
+        if session:
+            if attendance_writer:
+                result = await attendance_writer.submit(message.from_user.id, session.room)
+            else:
+                result = await attendance_manager.post(message.from_user.id, session.room)
+            if result is MarkResult.INSERTED:
                 await message.answer("✅ Посещение успешно отмечено!")
                 await state.clear()
-            else:
+            elif result is MarkResult.ALREADY_MARKED:
                 await message.answer("⚠️ Вы уже отмечались сегодня!")
                 await state.clear()
+            elif result is MarkResult.UNKNOWN_USER:
+                await message.answer("❌ Вы не зарегистрированы. Используйте /start для регистрации")
+                await state.clear()
+            else:
+                await message.answer("❌ Ошибка при отметке посещения. Попробуйте еще раз.")
         else:
             await message.answer("❌ Неверный код или срок действия истёк! Попробуйте еще раз.")
     except ValueError:
         await message.answer("⚠️ Код должен быть числом! Введите только цифры.")
 
+async def send_report(message: Message, key, export_func, filename: str, version=None):
+    """Ставит отчёт в очередь и отправляет файл, когда он готов.
+
+    export_func - путь "модуль:функция": стек экспорта грузится при первом отчёте.
+    Если данные не менялись с прошлой отправки (та же version), файл
+    пересылается по сохранённому file_id без построения и загрузки.
+    """
+    cache_key = (key, filename)
+    if version is not None:
+        file_id = report_cache.get(cache_key, version)
+        if file_id is not None:
+            try:
+                await message.answer_document(file_id)
+                return
+            except TelegramBadRequest:
+                # file_id больше не принимается - строим заново
+                report_cache.discard(cache_key)
+
+    try:
+        job = report_jobs.submit(key, export_func, filename)
+    except JobQueueFull:
+        await message.answer("⚠️ Сейчас готовится слишком много отчётов. Попробуйте чуть позже.")
+        return
+
+    try:
+        await message.answer("⏳ Отчёт готовится, файл придёт сюда, как только он будет готов")
+        output_file = await job.wait()
+
+        # Проверяем, что файл создался
+        if os.path.exists(output_file):
+            sent = await message.answer_document(FSInputFile(output_file))
+            if version is not None and sent.document is not None:
+                report_cache.put(cache_key, version, sent.document.file_id)
+        else:
+            await message.answer("❌ Ошибка: файл не был создан")
+
+    except Exception as e:
+        await message.answer(f"❌ Ошибка при экспорте данных: {str(e)}")
+    finally:
+        # Временный файл удаляется, когда его отправят всем ожидающим
+        report_jobs.release(job)
+
 @router.message(F.text.in_(["📁 Экспорт", "Экспорт"]))
 async def export_attendance(message: Message):
     if not is_admin(message.from_user.id):
         await message.answer("Эта команда доступна только администраторам!")
         return
-    
-    try:
-        # Создаем новую сессию для экспорта
-        async with async_session() as session:
-            # Вызываем функцию экспорта напрямую (она уже асинхронная)
-            output_file = await export_attendance_to_excel(session)
-            
-            # Проверяем, что файл создался
-            if os.path.exists(output_file):
-                await message.answer_document(FSInputFile(output_file))
-                # Удаляем временный файл после отправки
-                os.remove(output_file)
-            else:
-                await message.answer("❌ Ошибка: файл не был создан")
-                
-    except Exception as e:
-        await message.answer(f"❌ Ошибка при экспорте данных: {str(e)}")
+
+    timestamp = datetime.now(MOSCOW_TZ).strftime("%d-%m-%Y")
+    await send_report(message, "attendance", "utils.utils:export_attendance_to_excel", f"attendance_{timestamp}.xlsx",
+                      version=await attendance_version())
 
 @router.message(F.text.in_(["📊 Статистика", "Статистика"]))
 async def get_stats(message: Message):
@@ -204,7 +267,7 @@ async def add_admin_command(message: Message):
             return
         
         # Добавляем администратора
-        if add_admin(new_admin_id):
+        if await add_admin(new_admin_id):
             await message.answer(f"✅ Пользователь `{new_admin_id}` добавлен в администраторы!", parse_mode="Markdown")
         else:
             await message.answer(f"⚠️ Пользователь `{new_admin_id}` уже является администратором!", parse_mode="Markdown")
@@ -235,7 +298,7 @@ async def remove_admin_command(message: Message):
             return
         
         # Удаляем администратора
-        if remove_admin(admin_id_to_remove):
+        if await remove_admin(admin_id_to_remove):
             await message.answer(f"✅ Пользователь `{admin_id_to_remove}` удален из администраторов!", parse_mode="Markdown")
         else:
             await message.answer(f"⚠️ Пользователь `{admin_id_to_remove}` не является администратором!", parse_mode="Markdown")
@@ -255,6 +318,7 @@ async def help_command(message: Message):
 /help - Показать эту справку
 /status - Показать ваш профиль
 /myid - Показать ваш ID
+/history - Ваша посещаемость и серия посещений
 
 **Для студентов:**
 📝 Отметиться - Отметить посещение
@@ -262,7 +326,19 @@ async def help_command(message: Message):
 **Для администраторов:**
 📊 Статистика - Показать статистику за день
 📁 Экспорт - Экспортировать данные в Excel
+/jobs - Очередь построения отчётов
+/rebuild_stats - Пересобрать агрегаты статистики
+/states - Незавершённые диалоги (FSM)
+/throttle - Счётчики ограничения частоты
+/metrics - Время обработчиков и запросов к БД
+/sessions - Открытые занятия и их коды
+/open_session <аудитория> [интервал] [группы] - Открыть занятие
+/close_session <ID> - Закрыть занятие
 /reset_user <tg_id> - Удаление пользователя
+/import_roster - Загрузить список группы (CSV/XLSX)
+/broadcast <группы через запятую|all> <текст> - Рассылка студентам
+/history <группа> - Посещаемость группы
+/attendance [from=ДД.ММ.ГГГГ] [to=ДД.ММ.ГГГГ] [group=...] [student=...] - История отметок
 
 **Как пользоваться:**
 1. Нажмите /start для регистрации
@@ -293,6 +369,48 @@ async def status_command(message: Message):
     else:
         await message.answer("❌ Вы не зарегистрированы. Используйте /start для регистрации")
 
+@router.message(Command("history"))
+async def history_command(message: Message, command: CommandObject):
+    group = (command.args or "").strip()
+    if group:
+        if not is_admin(message.from_user.id):
+            await message.answer("❌ Посещаемость группы доступна только администраторам!")
+            return
+        history = await get_group_history(group)
+        if not history.students:
+            await message.answer(f"❌ В группе {group} нет студентов")
+            return
+        lines = [
+            f"📈 Группа {group}: {history.class_days} учебных дней до сегодня, средняя посещаемость {history.rate:.0%}",
+            "",
+        ]
+        for student in history.students:
+            registered = "" if student.telegram_id is not None else " (не зарегистрирован)"
+            lines.append(
+                f"• {student.full_name}{registered}: {student.attended}/{student.class_days} "
+                f"({student.rate:.0%}), серия {student.streak}"
+            )
+        text = "\n".join(lines)
+        # Ограничение Telegram на длину сообщения
+        if len(text) > 4000:
+            text = text[:4000].rsplit("\n", 1)[0] + "\n…"
+        await message.answer(text)
+        return
+
+    user = await UserManager().get(message.from_user.id)
+    if user is None:
+        await message.answer("❌ Вы не зарегистрированы. Используйте /start для регистрации")
+        return
+    history = await get_student_history(user)
+    recent = ", ".join(moment.strftime("%d.%m.%Y") for moment in history.recent) or "—"
+    await message.answer(
+        "📈 Ваша посещаемость\n\n"
+        f"👤 {history.full_name} ({user.group or 'без группы'})\n"
+        f"✅ Посещено: {history.attended} из {history.class_days} учебных дней до сегодня ({history.rate:.0%})\n"
+        f"🔥 Серия: {history.streak} подряд (лучшая: {history.best_streak})\n"
+        f"📅 Последние отметки: {recent}"
+    )
+
 @router.message(Command("myid"))
 async def get_my_id(message: Message):
     await message.answer(f"**Ваш ID:** `{message.from_user.id}`\n\nИспользуйте этот ID для решения проблем с регистрацией", parse_mode="Markdown")
@@ -328,15 +446,16 @@ async def force_mark(message: Message):
         await message.answer("❌ Использование: `/force_mark <ID>`\nПример: `/force_mark 123456789`")
         return
     else:
-        user_manager = UserManager()
-        if await user_manager.check_tg_id(int(command_parts[1])):
-            attendance_manager = AttendanceManager()
-            success = await attendance_manager.post(int(command_parts[1]))
-            if success:
-                await message.answer(f"✅ Пользователь `{command_parts[1]}` отмечен!")
-            await message.answer(f"❌ Ошибка!")
-        else:
+        attendance_manager = AttendanceManager()
+        result = await attendance_manager.post(int(command_parts[1]))
+        if result is MarkResult.INSERTED:
+            await message.answer(f"✅ Пользователь `{command_parts[1]}` отмечен!")
+        elif result is MarkResult.ALREADY_MARKED:
+            await message.answer(f"⚠️ Пользователь `{command_parts[1]}` уже отмечался сегодня!")
+        elif result is MarkResult.UNKNOWN_USER:
             await message.answer(f"❌ Пользователь с таким ID не зарегистрирован!")
+        else:
+            await message.answer(f"❌ Ошибка!")
 
 @router.message(F.text.in_(["👥 Пользователи","Пользователи"]))
 async def get_users(message: Message):
@@ -344,22 +463,395 @@ async def get_users(message: Message):
         await message.answer("Эта команда доступна только администраторам!")
         return
 
+    await send_report(message, "users", "utils.utils:export_users_to_excel", "users.xlsx",
+                      version=await users_version())
+
+@router.message(Command("import_roster"))
+async def import_roster_command(message: Message, state: FSMContext):
+    if not is_admin(message.from_user.id):
+        await message.answer("❌ У вас нет прав для выполнения этой команды!")
+        return
+
+    await state.set_state(RosterImport.waiting_file)
+    await message.answer(
+        "📄 Пришлите файл .csv или .xlsx со столбцами: ФИО, группа и (необязательно) telegram_id.\n"
+        "Первая строка может быть заголовком. Любое другое сообщение отменит импорт."
+    )
+
+@router.message(RosterImport.waiting_file, F.document)
+async def import_roster_file(message: Message, state: FSMContext):
+    await state.clear()
+    if not is_admin(message.from_user.id):
+        return
+
+    filename = message.document.file_name or ""
+    if not filename.lower().endswith((".csv", ".xlsx")):
+        await message.answer("❌ Нужен файл .csv или .xlsx")
+        return
+
     try:
-        # Создаем новую сессию для экспорта
-        async with async_session() as session:
-            # Вызываем функцию экспорта напрямую (она уже асинхронная)
-            output_file = await export_users_to_excel(session)
-
-            # Проверяем, что файл создался
-            if os.path.exists(output_file):
-                await message.answer_document(FSInputFile(output_file))
-                # Удаляем временный файл после отправки
-                os.remove(output_file)
-            else:
-                await message.answer("❌ Ошибка: файл не был создан")
+        content = (await message.bot.download(message.document)).read()
+        # Разбор большого файла - в потоке, чтобы не держать цикл событий
+        rows = await asyncio.to_thread(read_roster, content, filename)
+        summary = await import_roster(rows)
+    except RosterError as e:
+        await message.answer(f"❌ {e}")
+        return
+    except Exception as e:
+        await message.answer(f"❌ Ошибка при импорте списка: {str(e)}")
+        return
+
+    await message.answer(
+        "✅ Список загружен\n\n"
+        f"• Добавлено: {summary['inserted']}\n"
+        f"• Уже были: {summary['duplicate']}\n"
+        f"• С ошибками: {summary['invalid']}\n"
+        f"• Время: {summary['seconds']:.2f} с"
+    )
+    await message.answer_document(BufferedInputFile(report_csv(rows), filename="roster_report.csv"))
+
+@router.message(RosterImport.waiting_file)
+async def import_roster_cancel(message: Message, state: FSMContext):
+    await state.clear()
+    await message.answer("Импорт списка отменён")
+
+ATTENDANCE_USAGE = (
+    "❌ Использование: `/attendance [from=ДД.ММ.ГГГГ] [to=ДД.ММ.ГГГГ] [date=ДД.ММ.ГГГГ] "
+    "[group=<группа>] [student=<tg_id или часть ФИО>]`\n"
+    "Пример: `/attendance date=16.09.2025 group=5132704/50001`"
+)
+
+def parse_attendance_filters(args: str) -> AttendanceFilter:
+    # key=value; слова без "=" продолжают предыдущее значение (ФИО с пробелами)
+    values = {}
+    key = None
+    for word in args.split():
+        if "=" in word:
+            key, value = word.split("=", 1)
+            key = key.lower()
+            if key not in ("from", "to", "date", "group", "student"):
+                raise ValueError(f"Неизвестный фильтр: {key}")
+            values[key] = value
+        elif key is not None:
+            values[key] += " " + word
+        else:
+            raise ValueError(f"Ожидался фильтр вида ключ=значение: {word}")
+
+    def parse_date(text):
+        return datetime.strptime(text, "%d.%m.%Y").date()
+
+    date_from = parse_date(values["from"]) if "from" in values else None
+    date_to = parse_date(values["to"]) if "to" in values else None
+    if "date" in values:
+        date_from = date_to = parse_date(values["date"])
+    return AttendanceFilter(date_from=date_from, date_to=date_to,
+                            group=values.get("group") or None, student=values.get("student") or None)
+
+def format_attendance_page(filters: AttendanceFilter, page) -> str:
+    conditions = []
+    if filters.date_from == filters.date_to and filters.date_from:
+        conditions.append(filters.date_from.strftime("%d.%m.%Y"))
+    else:
+        if filters.date_from:
+            conditions.append(f"с {filters.date_from.strftime('%d.%m.%Y')}")
+        if filters.date_to:
+            conditions.append(f"по {filters.date_to.strftime('%d.%m.%Y')}")
+    if filters.group:
+        conditions.append(f"группа {filters.group}")
+    if filters.student:
+        conditions.append(f"студент {filters.student}")
+    title = "📋 История отметок" + (f" ({', '.join(conditions)})" if conditions else "")
+    if not page.rows:
+        return f"{title}\n\nОтметок не найдено"
+    lines = [
+        f"{row.date.strftime('%d.%m.%Y %H:%M')} — {row.full_name} ({row.group or 'без группы'})"
+        + (f", ауд. {row.room}" if row.room else "")
+        for row in page.rows
+    ]
+    return f"{title}\n\n" + "\n".join(lines)
+
+@router.message(Command("attendance"))
+async def attendance_command(message: Message, state: FSMContext, command: CommandObject):
+    if not is_admin(message.from_user.id):
+        await message.answer("❌ У вас нет прав для выполнения этой команды!")
+        return
+
+    try:
+        filters = parse_attendance_filters(command.args or "")
+    except ValueError:
+        await message.answer(ATTENDANCE_USAGE, parse_mode="Markdown")
+        return
+
+    # Фильтры живут в данных FSM: в callback_data помещается только курсор
+    query = {"id": message.message_id, **filters.to_dict()}
+    await state.update_data(attendance_query=query)
+    page = await fetch_attendance_page(filters, limit=ATTENDANCE_PAGE_SIZE)
+    await message.answer(
+        format_attendance_page(filters, page),
+        reply_markup=kb.attendance_page_keyboard(query["id"], page)
+    )
+
+@router.callback_query(kb.AttendancePage.filter())
+async def attendance_page(callback: CallbackQuery, callback_data: kb.AttendancePage, state: FSMContext):
+    if not is_admin(callback.from_user.id):
+        await callback.answer("❌ У вас нет прав для выполнения этой команды!")
+        return
+
+    query = (await state.get_data()).get("attendance_query")
+    if not query or query["id"] != callback_data.query:
+        await callback.answer("Запрос устарел, повторите /attendance", show_alert=True)
+        return
 
+    filters = AttendanceFilter.from_dict(query)
+    if callback_data.direction == "newer":
+        page = await fetch_attendance_page(filters, before=callback_data.cursor, limit=ATTENDANCE_PAGE_SIZE)
+    else:
+        page = await fetch_attendance_page(filters, after=callback_data.cursor, limit=ATTENDANCE_PAGE_SIZE)
+    # Продлеваем срок жизни фильтров, пока админ листает
+    await state.update_data(attendance_query=query)
+    await callback.message.edit_text(
+        format_attendance_page(filters, page),
+        reply_markup=kb.attendance_page_keyboard(query["id"], page)
+    )
+    await callback.answer()
+
+@router.message(Command("broadcast"))
+async def broadcast_command(message: Message, command: CommandObject):
+    if not is_admin(message.from_user.id):
+        await message.answer("❌ У вас нет прав для выполнения этой команды!")
+        return
+
+    parts = (command.args or "").split(maxsplit=1)
+    if len(parts) < 2:
+        await message.answer(
+            "❌ Использование: `/broadcast <группы через запятую|all> <текст>`\n"
+            "Пример: `/broadcast 5132704/50001,5132704/50002 Занятие начинается, код на экране`",
+            parse_mode="Markdown"
+        )
+        return
+    target, text = parts
+    groups = None if target.lower() in ("all", "все") else [group.strip() for group in target.split(",") if group.strip()]
+    recipients = await broadcast_recipients(groups)
+    if not recipients:
+        await message.answer("❌ Нет зарегистрированных студентов в указанных группах")
+        return
+
+    target_text = "всем студентам" if groups is None else f"группам {', '.join(groups)}"
+    status = await message.answer(f"📣 Рассылка {target_text}: 0 из {len(recipients)}")
+
+    async def progress(result):
+        try:
+            await status.edit_text(
+                f"📣 Рассылка {target_text}: {result.done} из {result.total}, "
+                f"доставлено {result.delivered}, ошибок {result.failed}"
+            )
+        except TelegramBadRequest:
+            # Текст не изменился с прошлого обновления
+            pass
+
+    async def done(result):
+        errors = ", ".join(f"{name}: {count}" for name, count in result.errors.items())
+        if result.error:
+            title = f"⚠️ Рассылка {target_text} прервана через {result.seconds:.1f} с ({result.error})"
+        else:
+            title = f"✅ Рассылка {target_text} завершена за {result.seconds:.1f} с"
+        await message.answer(
+            f"{title}\n\n"
+            f"• Доставлено: {result.delivered} из {result.total}\n"
+            f"• Не доставлено: {result.failed}" + (f" ({errors})" if errors else "") + "\n"
+            f"• Повторных попыток: {result.retried}"
+        )
+
+    # Рассылка идёт в фоне: обработчик не держит апдейт, пока она идёт
+    broadcaster.start(message.bot, recipients, text, progress, done)
+
+@router.message(Command("jobs"))
+async def jobs_command(message: Message):
+    if not is_admin(message.from_user.id):
+        await message.answer("❌ У вас нет прав для выполнения этой команды!")
+        return
+
+    job_stats = report_jobs.stats()
+    cache_stats = report_cache.stats()
+
+    def format_seconds(value):
+        return f"{value:.2f} с" if value is not None else "—"
+
+    await message.answer(
+        "🗂 **Очередь отчётов:**\n\n"
+        f"• В очереди: {job_stats['queue_depth']} из {job_stats['max_pending']}\n"
+        f"• Воркеров: {job_stats['workers']}\n"
+        f"• Готово: {job_stats['completed']}, ошибок: {job_stats['failed']}, объединено: {job_stats['merged']}\n"
+        f"• Длительность: последняя {format_seconds(job_stats['last_duration'])}, "
+        f"средняя {format_seconds(job_stats['avg_duration'])}, "
+        f"максимальная {format_seconds(job_stats['max_duration'])}\n"
+        f"• Повторно без построения: {cache_stats['hits']} из {cache_stats['hits'] + cache_stats['misses']} "
+        f"({cache_stats['hit_rate']:.0%}), записей {cache_stats['size']}/{cache_stats['maxsize']}, "
+        f"устарело {cache_stats['stale']}, истекло {cache_stats['expired']}",
+        parse_mode="Markdown"
+    )
+
+@router.message(Command("rebuild_stats"))
+async def rebuild_stats(message: Message):
+    if not is_admin(message.from_user.id):
+        await message.answer("❌ У вас нет прав для выполнения этой команды!")
+        return
+
+    try:
+        report = await DailyStatsManager().rebuild()
+        await message.answer(
+            "✅ Агрегаты статистики пересобраны\n\n"
+            f"• Строк (день, группа): {report['rows']}\n"
+            f"• Было сохранено: {report['stored']}\n"
+            f"• Расхождений найдено: {report['mismatched']}"
+        )
     except Exception as e:
-        await message.answer(f"❌ Ошибка при экспорте данных: {str(e)}")
+        await message.answer(f"❌ Ошибка при пересборке статистики: {str(e)}")
+
+@router.message(Command("states"))
+async def states_command(message: Message, state: FSMContext):
+    if not is_admin(message.from_user.id):
+        await message.answer("❌ У вас нет прав для выполнения этой команды!")
+        return
+
+    storage = state.storage
+    if not hasattr(storage, "live_states"):
+        await message.answer("ℹ️ Хранилище состояний не ведёт статистику")
+        return
+
+    live = await storage.live_states()
+    storage_stats = storage.stats()
+    lines = [f"• {name}: {count}" for name, count in sorted(live.items())] or ["• нет"]
+    await message.answer(
+        "🧭 Активные состояния:\n\n" + "\n".join(lines) + "\n\n"
+        f"Кэш: {storage_stats['cached']}, попаданий {storage_stats['hit_rate']:.0%}, "
+        f"просрочено и удалено: {storage_stats['expired']}"
+    )
+
+@router.message(Command("throttle"))
+async def throttle_command(message: Message, throttling=None):
+    if not is_admin(message.from_user.id):
+        await message.answer("❌ У вас нет прав для выполнения этой команды!")
+        return
+
+    if throttling is None:
+        await message.answer("ℹ️ Ограничение частоты отключено")
+        return
+
+    counters = throttling.stats()
+    await message.answer(
+        "🚦 Ограничение частоты:\n\n"
+        f"• Пропущено: {counters['allowed']}\n"
+        f"• Отклонено вводов кода: {counters['throttled_code']}\n"
+        f"• Отклонено сообщений: {counters['throttled_message']}\n"
+        f"• Отклонено общим лимитом: {counters['throttled_global']}\n"
+        f"• Пользователей в памяти: {counters['tracked_users']}, вытеснено: {counters['evicted']}"
+    )
+
+@router.message(Command("metrics"))
+async def metrics_command(message: Message):
+    if not is_admin(message.from_user.id):
+        await message.answer("❌ У вас нет прав для выполнения этой команды!")
+        return
+
+    def ms(value):
+        return f"{value * 1000:.1f}" if value is not None else "—"
+
+    lines = ["📈 Метрики с запуска (p50/p95 в мс):", "", "Обработчики:"]
+    handlers = metrics.get("bot_handler_seconds")
+    errors = metrics.get("bot_handler_errors_total")
+    if handlers is None or not handlers.values:
+        lines.append("• нет данных")
+    else:
+        error_counts = {}
+        for (name, _), count in (errors.values.items() if errors else ()):
+            error_counts[name] = error_counts.get(name, 0) + count
+        for (name,) in sorted(handlers.values, key=lambda labels: -handlers.count(*labels)):
+            lines.append(
+                f"• {name}: {handlers.count(name)} шт., "
+                f"{ms(handlers.quantile(0.5, name))}/{ms(handlers.quantile(0.95, name))}"
+                + (f", ошибок {error_counts[name]}" if error_counts.get(name) else "")
+            )
+
+    lines += ["", "Запросы к БД:"]
+    queries = metrics.get("db_query_seconds")
+    if queries is None or not queries.values:
+        lines.append("• нет данных")
+    else:
+        for (kind,) in sorted(queries.values, key=lambda labels: -queries.count(*labels)):
+            lines.append(
+                f"• {kind}: {queries.count(kind)} шт., всего {queries.total(kind):.2f} с, "
+                f"{ms(queries.quantile(0.5, kind))}/{ms(queries.quantile(0.95, kind))}"
+            )
+    await message.answer("\n".join(lines))
+
+@router.message(Command("open_session"))
+async def open_session(message: Message, sessions):
+    if not is_admin(message.from_user.id):
+        await message.answer("❌ У вас нет прав для выполнения этой команды!")
+        return
+
+    # /open_session <аудитория> [интервал] [группы через запятую]
+    command_parts = message.text.split(maxsplit=3)
+    if len(command_parts) < 2:
+        await message.answer("❌ Использование: `/open_session <аудитория> [интервал] [группы]`\nПример: `/open_session 101 20 5132704/50001,5132704/50002`", parse_mode="Markdown")
+        return
+
+    try:
+        interval = int(command_parts[2]) if len(command_parts) > 2 else CODE_INTERVAL
+    except ValueError:
+        await message.answer("❌ Интервал должен быть числом секунд!")
+        return
+    groups = [group.strip() for group in command_parts[3].split(",") if group.strip()] if len(command_parts) > 3 else []
+
+    # Занятие пишется в базу, остальные процессы подхватят его при сверке
+    session_id = await SessionManager().open(command_parts[1], interval, groups)
+    session = sessions.open(session_id, command_parts[1], interval, groups)
+    await message.answer(
+        f"✅ Занятие `{session.id}` открыто в аудитории {session.room}\n"
+        f"🎓 Группы: {', '.join(sorted(session.groups)) if session.groups else 'все'}\n"
+        f"⏱ Код меняется каждые {interval} с, сейчас: `{session.generator.get_current_code():04d}`",
+        parse_mode="Markdown"
+    )
+
+@router.message(Command("close_session"))
+async def close_session(message: Message, sessions):
+    if not is_admin(message.from_user.id):
+        await message.answer("❌ У вас нет прав для выполнения этой команды!")
+        return
+
+    command_parts = message.text.split()
+    if len(command_parts) != 2:
+        await message.answer("❌ Использование: `/close_session <ID>`", parse_mode="Markdown")
+        return
+
+    if sessions.is_local(command_parts[1]):
+        # Код этого занятия показывает экран: без него в аудитории не отметиться
+        await message.answer(f"❌ Занятие `{command_parts[1]}` привязано к экрану и не закрывается", parse_mode="Markdown")
+        return
+
+    closed = await SessionManager().close(command_parts[1])
+    if sessions.close(command_parts[1]) or closed:
+        await message.answer(f"✅ Занятие `{command_parts[1]}` закрыто", parse_mode="Markdown")
+    else:
+        await message.answer(f"❌ Занятие `{command_parts[1]}` не найдено", parse_mode="Markdown")
+
+@router.message(Command("sessions"))
+async def list_sessions(message: Message, sessions):
+    if not is_admin(message.from_user.id):
+        await message.answer("❌ У вас нет прав для выполнения этой команды!")
+        return
+
+    sessions_text = "🏫 **Открытые занятия:**\n\n"
+    for session in sessions:
+        groups = ", ".join(sorted(session.groups)) if session.groups else "все группы"
+        sessions_text += (
+            f"`{session.id}` • {session.room} • {groups} • "
+            f"код `{session.generator.get_current_code():04d}` ({session.generator.get_time_remaining()} с)\n"
+        )
+    if not len(sessions):
+        sessions_text += "Открытых занятий нет"
+    await message.answer(sessions_text, parse_mode="Markdown")
 
 @router.message(Command("bio"))
 async def bio(message: Message):
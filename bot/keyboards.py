@@ -1,5 +1,10 @@
+from datetime import datetime
+from aiogram.filters.callback_data import CallbackData
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, ReplyKeyboardMarkup, KeyboardButton
 
+# Формат даты курсора: в callback_data нельзя двоеточие (разделитель полей)
+CURSOR_DATE_FORMAT = "%Y%m%d%H%M%S%f"
+
 # Клавиатура подтверждения регистрации
 confirm_keyboard = InlineKeyboardMarkup(
     inline_keyboard=[
@@ -27,4 +32,31 @@ admin_keyboard = ReplyKeyboardMarkup(
     ],
     resize_keyboard=True,
     one_time_keyboard=False
-)
\ No newline at end of file
+)
+
+
+class AttendancePage(CallbackData, prefix="att"):
+    """Кнопка листания /attendance: номер запроса и курсор крайней строки страницы"""
+    query: int
+    direction: str  # "older" или "newer"
+    date: str
+    id: int
+
+    @property
+    def cursor(self) -> tuple:
+        return datetime.strptime(self.date, CURSOR_DATE_FORMAT), self.id
+
+
+def attendance_page_keyboard(query_id: int, page) -> InlineKeyboardMarkup | None:
+    buttons = []
+    if page.has_newer and page.rows:
+        date, row_id = page.rows[0].cursor
+        buttons.append(InlineKeyboardButton(text="⬅️ Новее", callback_data=AttendancePage(
+            query=query_id, direction="newer", date=date.strftime(CURSOR_DATE_FORMAT), id=row_id
+        ).pack()))
+    if page.has_older and page.rows:
+        date, row_id = page.rows[-1].cursor
+        buttons.append(InlineKeyboardButton(text="Старее ➡️", callback_data=AttendancePage(
+            query=query_id, direction="older", date=date.strftime(CURSOR_DATE_FORMAT), id=row_id
+        ).pack()))
+    return InlineKeyboardMarkup(inline_keyboard=[buttons]) if buttons else None
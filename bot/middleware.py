@@ -1,7 +1,14 @@
+import logging
+import time
+from collections import OrderedDict
 from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.methods import GetUpdates
 from aiogram.types import Message, CallbackQuery
 from typing import Callable, Dict, Any, Awaitable
 
+logger = logging.getLogger(__name__)
+
 class GeneratorMiddleware(BaseMiddleware):
     def __init__(self, generator):
         self.generator = generator
@@ -14,3 +21,205 @@ class GeneratorMiddleware(BaseMiddleware):
     ) -> Any:
         data["generator"] = self.generator
         return await handler(event, data)
+
+
+class AttendanceWriterMiddleware(BaseMiddleware):
+    def __init__(self, attendance_writer):
+        self.attendance_writer = attendance_writer
+
+    async def __call__(
+        self,
+        handler: Callable[[Message, Dict[str, Any]], Awaitable[Any]],
+        event: Message | CallbackQuery,
+        data: Dict[str, Any]
+    ) -> Any:
+        data["attendance_writer"] = self.attendance_writer
+        return await handler(event, data)
+
+
+class SessionsMiddleware(BaseMiddleware):
+    def __init__(self, sessions):
+        self.sessions = sessions
+
+    async def __call__(
+        self,
+        handler: Callable[[Message, Dict[str, Any]], Awaitable[Any]],
+        event: Message | CallbackQuery,
+        data: Dict[str, Any]
+    ) -> Any:
+        data["sessions"] = self.sessions
+        return await handler(event, data)
+
+
+class TokenBucket:
+    """Ведро токенов: rate токенов в секунду, не больше capacity"""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def consume(self, now: float) -> bool:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def delay(self, now: float) -> float:
+        """Через сколько секунд появится следующий токен"""
+        tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        return max(0.0, (1 - tokens) / self.rate)
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """Ограничивает частоту сообщений до фильтров, обработчиков и БД.
+
+    Регистрируется как outer middleware: к этому моменту FSM уже положил
+    состояние в data["raw_state"], поэтому ввод кода отличается от прочих
+    сообщений без обращения к базе. limits - {вид: (в минуту, запас)} на
+    пользователя, global_limit - (в секунду, запас) на всех сразу.
+    Состояние хранится для max_users последних пользователей.
+    """
+
+    CODE_STATE = "AttendanceState:waiting_code"
+
+    def __init__(self, limits: dict, global_limit: tuple, max_users: int = 10000, exempt=None):
+        self.limits = limits
+        self.max_users = max_users
+        # Проверка "не ограничивать" (например, для администраторов)
+        self.exempt = exempt
+        self._global = TokenBucket(global_limit[0], global_limit[1], time.monotonic())
+        # user_id -> {вид: TokenBucket, "warned": bool}
+        self._users = OrderedDict()
+        self.counters = {"allowed": 0, "throttled_global": 0, "evicted": 0}
+        for kind in limits:
+            self.counters[f"throttled_{kind}"] = 0
+
+    def kind_of(self, event, data: Dict[str, Any]) -> str:
+        if isinstance(event, Message) and data.get("raw_state") == self.CODE_STATE:
+            return "code"
+        return "message"
+
+    def _user_state(self, user_id: int, now: float) -> dict:
+        state = self._users.get(user_id)
+        if state is None:
+            state = {"warned": False}
+            for kind, (per_minute, burst) in self.limits.items():
+                state[kind] = TokenBucket(per_minute / 60, burst, now)
+            self._users[user_id] = state
+            if len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+                self.counters["evicted"] += 1
+        else:
+            self._users.move_to_end(user_id)
+        return state
+
+    async def __call__(
+        self,
+        handler: Callable[[Message, Dict[str, Any]], Awaitable[Any]],
+        event: Message | CallbackQuery,
+        data: Dict[str, Any]
+    ) -> Any:
+        data["throttling"] = self
+        user = data.get("event_from_user")
+        if user is None or (self.exempt and self.exempt(user.id)):
+            return await handler(event, data)
+
+        now = time.monotonic()
+        kind = self.kind_of(event, data)
+        state = self._user_state(user.id, now)
+        if not state[kind].consume(now):
+            self.counters[f"throttled_{kind}"] += 1
+            return await self._reject(event, state, kind)
+        if not self._global.consume(now):
+            self.counters["throttled_global"] += 1
+            return await self._reject(event, state, "global")
+
+        state["warned"] = False
+        self.counters["allowed"] += 1
+        return await handler(event, data)
+
+    async def _reject(self, event, state: dict, kind: str):
+        # Предупреждаем один раз за серию отклонённых сообщений
+        if state["warned"]:
+            return None
+        state["warned"] = True
+        text = (
+            "⏳ Слишком много попыток ввода кода. Подождите немного и попробуйте снова."
+            if kind == "code" else "⏳ Слишком много сообщений. Подождите немного."
+        )
+        await event.answer(text)
+        return None
+
+    def stats(self) -> dict:
+        return {**self.counters, "tracked_users": len(self._users)}
+
+
+class MetricsMiddleware(BaseMiddleware):
+    """Время и ошибки каждого обработчика (вызывается уже после фильтров).
+
+    Пишет структурированную запись в лог и, если передан registry, в метрики.
+    """
+
+    def __init__(self, registry=None):
+        self.latency = self.errors = None
+        if registry is not None:
+            self.latency = registry.histogram(
+                "bot_handler_seconds", "Время выполнения обработчика", labels=("handler",)
+            )
+            self.errors = registry.counter(
+                "bot_handler_errors_total", "Исключения в обработчиках", labels=("handler", "error")
+            )
+
+    async def __call__(
+        self,
+        handler: Callable[[Message, Dict[str, Any]], Awaitable[Any]],
+        event: Message | CallbackQuery,
+        data: Dict[str, Any]
+    ) -> Any:
+        handler_object = data.get("handler")
+        name = handler_object.callback.__name__ if handler_object is not None else "unknown"
+        user = data.get("event_from_user")
+        started = time.perf_counter()
+        try:
+            result = await handler(event, data)
+        except Exception as e:
+            latency = time.perf_counter() - started
+            if self.errors is not None:
+                self.errors.inc(name, type(e).__name__)
+                self.latency.observe(latency, name)
+            # Трассировку пишет сам aiogram, здесь - только поля для поиска
+            logger.warning("Ошибка в обработчике", extra={
+                "user_id": user.id if user else None, "handler": name,
+                "latency_ms": round(latency * 1000, 2), "outcome": "error", "error": type(e).__name__,
+            })
+            raise
+        latency = time.perf_counter() - started
+        if self.latency is not None:
+            self.latency.observe(latency, name)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Апдейт обработан", extra={
+                "user_id": user.id if user else None, "handler": name,
+                "latency_ms": round(latency * 1000, 2), "outcome": "ok",
+            })
+        return result
+
+
+class FirstPollMiddleware(BaseRequestMiddleware):
+    """Отмечает момент первого getUpdates - бот начал принимать апдейты"""
+
+    def __init__(self, timer):
+        self.timer = timer
+        self.done = False
+
+    async def __call__(self, make_request, bot, method):
+        if not self.done and isinstance(method, GetUpdates):
+            self.done = True
+            self.timer.mark("first_poll")
+            self.timer.report()
+        return await make_request(bot, method)
@@ -0,0 +1,264 @@
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, StorageKey
+from sqlalchemy import select, delete, func, or_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from db.models import FsmRecord, async_session
+
+logger = logging.getLogger(__name__)
+
+
+class SQLiteStorage(BaseStorage):
+    """Хранилище FSM в таблице fsm_states с кэшем записи насквозь.
+
+    Каждое состояние живёт ограниченное время: ttls задаёт срок по имени
+    состояния ("AttendanceState:waiting_code") или группы ("Registration").
+    Просроченное состояние читается как пустое, а фоновая очистка удаляет
+    такие строки из базы.
+
+    Кэш - LRU на cache_size ключей. Как и у кэша пользователей, пока в него
+    загружены все живые состояния и ничего не вытеснено, промах означает
+    "состояния нет" и в базу идти не нужно. cache_size=0 отключает кэш
+    (нужно, когда в одну базу пишут несколько процессов).
+
+    По умолчанию (flush_interval=0) запись сквозная: изменение сохраняется в
+    базу прямо в обработчике, и подтверждённое состояние переживает падение.
+    flush_interval > 0 включает отложенную запись: изменения копятся в кэше и
+    сбрасываются пачкой раз в flush_interval секунд (изменения одного ключа
+    схлопываются, на пачку - одна транзакция). При падении процесса так
+    теряется до flush_interval секунд изменений FSM.
+    """
+
+    def __init__(self, session_maker=async_session, ttls: dict = None, default_ttl: float = None,
+                 cache_size: int = 10000, sweep_interval: float = 60, flush_interval: float = 0):
+        self.session_maker = session_maker
+        self.ttls = ttls or {}
+        self.default_ttl = default_ttl
+        self.cache_size = cache_size
+        self.sweep_interval = sweep_interval
+        self.flush_interval = flush_interval if cache_size else 0
+        self.key_builder = DefaultKeyBuilder()
+        # ключ -> (state, data, expires_at)
+        self._cache = OrderedDict()
+        self._complete = False
+        # Несохранённые изменения: ключ -> (state, data, expires_at) или None для удаления
+        self._dirty = {}
+        self._sweeper = None
+        self._flusher = None
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.flushes = 0
+
+    # --- жизненный цикл ---
+
+    async def start(self):
+        """Загружает живые состояния в кэш и запускает фоновую очистку"""
+        await self.sweep()
+        if self.cache_size:
+            async with self.session_maker() as session:
+                result = await session.execute(select(FsmRecord).limit(self.cache_size + 1))
+                records = result.scalars().all()
+            self._cache.clear()
+            for record in records[:self.cache_size]:
+                self._cache[record.key] = (record.state, json.loads(record.data), record.expires_at)
+            self._complete = len(records) <= self.cache_size
+        if self._sweeper is None:
+            self._sweeper = asyncio.create_task(self._sweep_loop())
+        if self._flusher is None and self.flush_interval:
+            self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def close(self):
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            self._sweeper = None
+        if self._flusher is not None:
+            self._flusher.cancel()
+            self._flusher = None
+        # Дописываем то, что не успел сбросить фоновый цикл
+        await self.flush()
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Ошибка сохранения состояний FSM")
+
+    async def flush(self):
+        """Сохраняет накопленные изменения одной транзакцией"""
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, {}
+        try:
+            await self._persist(dirty)
+        except Exception:
+            # Возвращаем в очередь всё, что не перезаписано за время попытки
+            for db_key, entry in dirty.items():
+                self._dirty.setdefault(db_key, entry)
+            raise
+        self.flushes += 1
+
+    async def _persist(self, changes: dict):
+        deleted = [db_key for db_key, entry in changes.items() if entry is None]
+        rows = [
+            {"key": db_key, "state": entry[0], "data": json.dumps(entry[1], ensure_ascii=False), "expires_at": entry[2]}
+            for db_key, entry in changes.items() if entry is not None
+        ]
+        async with self.session_maker() as session:
+            async with session.begin():
+                if deleted:
+                    await session.execute(delete(FsmRecord).where(FsmRecord.key.in_(deleted)))
+                if rows:
+                    stmt = sqlite_insert(FsmRecord).values(rows)
+                    stmt = stmt.on_conflict_do_update(
+                        index_elements=[FsmRecord.key],
+                        set_={"state": stmt.excluded.state, "data": stmt.excluded.data,
+                              "expires_at": stmt.excluded.expires_at}
+                    )
+                    await session.execute(stmt)
+
+    async def _save(self, db_key: str, entry):
+        if self._flusher is not None:
+            self._dirty[db_key] = entry
+        else:
+            await self._persist({db_key: entry})
+
+    async def _sweep_loop(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                await self.sweep()
+            except Exception:
+                logger.exception("Ошибка очистки состояний FSM")
+
+    async def sweep(self) -> int:
+        """Удаляет просроченные состояния из базы и кэша"""
+        now = time.time()
+        for key in [key for key, entry in self._cache.items() if self._is_expired(entry, now)]:
+            del self._cache[key]
+        async with self.session_maker() as session:
+            async with session.begin():
+                result = await session.execute(delete(FsmRecord).where(FsmRecord.expires_at <= now))
+        self.expired += result.rowcount
+        return result.rowcount
+
+    # --- BaseStorage ---
+
+    async def set_state(self, key: StorageKey, state=None) -> None:
+        state = state.state if isinstance(state, State) else state
+        _, data = await self._read(key)
+        await self._write(key, state, data)
+
+    async def get_state(self, key: StorageKey):
+        state, _ = await self._read(key)
+        return state
+
+    async def set_data(self, key: StorageKey, data: dict) -> None:
+        state, _ = await self._read(key)
+        await self._write(key, state, dict(data))
+
+    async def get_data(self, key: StorageKey) -> dict:
+        _, data = await self._read(key)
+        return dict(data)
+
+    # --- внутреннее ---
+
+    def ttl_for(self, state):
+        if state is None:
+            return self.default_ttl
+        if state in self.ttls:
+            return self.ttls[state]
+        return self.ttls.get(state.split(":", 1)[0], self.default_ttl)
+
+    @staticmethod
+    def _is_expired(entry, now: float) -> bool:
+        expires_at = entry[2]
+        return expires_at is not None and expires_at <= now
+
+    async def _read(self, key: StorageKey):
+        db_key = self.key_builder.build(key)
+        now = time.time()
+        entry = self._cache.get(db_key)
+        if entry is not None:
+            self._cache.move_to_end(db_key)
+            self.hits += 1
+        elif self.cache_size and self._complete:
+            self.hits += 1
+            return None, {}
+        elif db_key in self._dirty:
+            # Вытеснено из кэша, но ещё не сохранено
+            self.hits += 1
+            entry = self._dirty[db_key]
+            if entry is None:
+                return None, {}
+        else:
+            self.misses += 1
+            async with self.session_maker() as session:
+                record = await session.get(FsmRecord, db_key)
+            if record is None:
+                return None, {}
+            entry = (record.state, json.loads(record.data), record.expires_at)
+            self._remember(db_key, entry)
+        if self._is_expired(entry, now):
+            return None, {}
+        return entry[0], entry[1]
+
+    async def _write(self, key: StorageKey, state, data: dict):
+        db_key = self.key_builder.build(key)
+        if state is None and not data:
+            # Пустое состояние не храним. При полном кэше отсутствие ключа
+            # означает, что и строки в базе нет
+            cached = self._cache.pop(db_key, None)
+            if cached is not None or db_key in self._dirty or not (self.cache_size and self._complete):
+                await self._save(db_key, None)
+            return
+
+        ttl = self.ttl_for(state)
+        expires_at = time.time() + ttl if ttl else None
+        entry = (state, dict(data), expires_at)
+        await self._save(db_key, entry)
+        self._remember(db_key, entry)
+
+    def _remember(self, db_key: str, entry):
+        if not self.cache_size:
+            return
+        self._cache[db_key] = entry
+        self._cache.move_to_end(db_key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+            self._complete = False
+
+    # --- статистика ---
+
+    async def live_states(self) -> dict:
+        """Количество непросроченных состояний по именам"""
+        await self.flush()
+        now = time.time()
+        async with self.session_maker() as session:
+            result = await session.execute(
+                select(FsmRecord.state, func.count())
+                .where(or_(FsmRecord.expires_at.is_(None), FsmRecord.expires_at > now))
+                .group_by(FsmRecord.state)
+            )
+            return {state or "-": count for state, count in result.all()}
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "cached": len(self._cache),
+            "complete": self._complete,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "expired": self.expired,
+            "pending": len(self._dirty),
+            "flushes": self.flushes,
+        }
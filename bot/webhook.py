@@ -0,0 +1,160 @@
+import asyncio
+import logging
+import multiprocessing
+
+from aiogram import Bot
+from aiogram.types import Update
+from aiohttp import web
+
+from config.config import (
+    BOT_TOKEN, CODE_INTERVAL, CODE_MODE, CODE_SECRET, CODE_GRACE_STEPS,
+    WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_URL, WEBHOOK_SECRET,
+    WEBHOOK_CONCURRENCY, WEBHOOK_MAX_PENDING, WEBHOOK_WORKERS, WEBHOOK_MAX_CONNECTIONS,
+    LOG_LEVEL, LOG_FORMAT, LOG_LEVELS
+)
+from db.models import warm_user_cache, user_cache, AdminManager
+from generator.code_generator import TotpCodeGenerator
+from utils.jobs import report_jobs
+from utils.log import setup_logging
+from utils.startup import startup
+from .bot import create_dispatcher, create_attendance_writer
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebhookHandler:
+    """Принимает апдейты по HTTP и передаёт их в тот же Dispatcher.
+
+    Telegram сразу получает 200, а апдейт обрабатывается в фоне. Одновременно
+    обрабатывается не больше concurrency апдейтов; если в работе больше
+    max_pending, отвечаем 503 и Telegram повторит доставку позже.
+    """
+
+    def __init__(self, dp, bot: Bot, secret: str = None, concurrency: int = 100, max_pending: int = 1000):
+        self.dp = dp
+        self.bot = bot
+        self.secret = secret
+        self.max_pending = max_pending
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._tasks = set()
+        self.received = 0
+        self.rejected = 0
+
+    @property
+    def pending(self) -> int:
+        return len(self._tasks)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if self.secret and request.headers.get(SECRET_HEADER) != self.secret:
+            return web.Response(status=401)
+        if len(self._tasks) >= self.max_pending:
+            self.rejected += 1
+            return web.Response(status=503)
+
+        update = Update.model_validate(await request.json(), context={"bot": self.bot})
+        self.received += 1
+        task = asyncio.create_task(self._process(update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return web.Response()
+
+    async def _process(self, update: Update):
+        async with self._semaphore:
+            await self.dp.feed_update(self.bot, update)
+
+    async def drain(self):
+        """Дожидается обработки уже принятых апдейтов"""
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+def create_app(dp, bot: Bot, path: str = WEBHOOK_PATH, secret: str = WEBHOOK_SECRET,
+               concurrency: int = WEBHOOK_CONCURRENCY, max_pending: int = WEBHOOK_MAX_PENDING) -> web.Application:
+    handler = WebhookHandler(dp, bot, secret, concurrency, max_pending)
+    app = web.Application()
+    app["webhook_handler"] = handler
+    app.router.add_post(path, handler.handle)
+    return app
+
+
+async def serve(generator, set_webhook: bool = True, sessions=None):
+    """Запускает один HTTP-воркер и работает до отмены"""
+    bot = Bot(BOT_TOKEN)
+    attendance_writer = create_attendance_writer()
+    dp = create_dispatcher(generator, attendance_writer, sessions)
+    app = create_app(dp, bot)
+
+    await dp.emit_startup(bot=bot)
+    if set_webhook and WEBHOOK_URL:
+        await bot.set_webhook(
+            WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH,
+            secret_token=WEBHOOK_SECRET or None,
+            max_connections=WEBHOOK_MAX_CONNECTIONS
+        )
+        logger.info("Вебхук установлен: %s", WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    # reuse_port: несколько процессов слушают один порт, ядро делит соединения
+    site = web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT, reuse_port=WEBHOOK_WORKERS > 1)
+    await site.start()
+    logger.info("Вебхук слушает %s:%s%s", WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_PATH)
+    startup.mark("webhook_ready")
+    startup.report()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+        await app["webhook_handler"].drain()
+        if attendance_writer:
+            await attendance_writer.stop()
+        await dp.emit_shutdown(bot=bot)
+        await bot.session.close()
+        report_jobs.shutdown()
+
+
+def _worker():
+    """Точка входа дополнительного процесса-воркера"""
+    setup_logging(LOG_LEVEL, LOG_FORMAT, LOG_LEVELS)
+
+    async def run():
+        user_cache.authoritative = False
+        await warm_user_cache()
+        await AdminManager().load()
+        generator = TotpCodeGenerator(CODE_INTERVAL, secret=CODE_SECRET, grace_steps=CODE_GRACE_STEPS)
+        await serve(generator, set_webhook=False)
+
+    asyncio.run(run())
+
+
+async def main(generator, sessions=None):
+    """Запускает вебхук в WEBHOOK_WORKERS процессах.
+
+    Общее для процессов хранится в базе: пользователи, отметки, FSM,
+    администраторы (перечитываются раз в ADMIN_REFRESH_INTERVAL) и занятия
+    /open_session (раз в SESSION_REFRESH_INTERVAL, до этого код нового
+    занятия принимает только процесс, открывший его). У каждого процесса свои:
+    лимиты THROTTLE_* и BROADCAST_RATE (действуют на процесс, а не на бота),
+    кэши истории и отчётов, очередь пакетной записи и кэш пользователей -
+    он перечитывается раз в USER_CACHE_REFRESH_INTERVAL, а id для отметки
+    всегда берётся из базы.
+    """
+    workers = []
+    if WEBHOOK_WORKERS > 1:
+        # Коды должны совпадать во всех процессах - это возможно только в режиме totp с общим секретом
+        if CODE_MODE != "totp" or not CODE_SECRET:
+            logger.error("Для WEBHOOK_WORKERS > 1 нужны CODE_MODE=totp и CODE_SECRET, запускаем один воркер")
+        else:
+            user_cache.authoritative = False
+            context = multiprocessing.get_context("spawn")
+            for _ in range(WEBHOOK_WORKERS - 1):
+                process = context.Process(target=_worker, daemon=True)
+                process.start()
+                workers.append(process)
+    try:
+        await serve(generator, sessions=sessions)
+    finally:
+        for process in workers:
+            process.terminate()
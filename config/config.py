@@ -5,9 +5,120 @@ from datetime import timezone, timedelta
 load_dotenv()
 
 BOT_TOKEN = os.getenv("BOT_TOKEN")
+# Получение апдейтов: polling или webhook
+BOT_MODE = os.getenv("BOT_MODE", "polling")
 DB_URL = os.getenv("DB_URL", "sqlite+aiosqlite:///bot.db")
+# Профиль движка SQLite: default или production (WAL, busy_timeout, пул подключений)
+DB_PROFILE = os.getenv("DB_PROFILE", "default")
+DB_JOURNAL_MODE = os.getenv("DB_JOURNAL_MODE", "WAL")
+DB_SYNCHRONOUS = os.getenv("DB_SYNCHRONOUS", "NORMAL")
+DB_BUSY_TIMEOUT = int(os.getenv("DB_BUSY_TIMEOUT", 5000))  # мс
+DB_CACHE_SIZE = int(os.getenv("DB_CACHE_SIZE", -20000))  # отрицательное значение - в КиБ
+DB_MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", 268435456))  # байт
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", 30))
 CODE_INTERVAL = int(os.getenv("TOTP_INTERVAL", 20))
-ADMIN_IDS = [int(id) for id in os.getenv("ADMIN_IDS", []).split(",")]
+# Режим кодов: random (случайный код) или totp (код из секрета и номера шага)
+CODE_MODE = os.getenv("CODE_MODE", "random")
+# Общий секрет для totp; без него секрет случайный для каждого процесса
+CODE_SECRET = os.getenv("CODE_SECRET") or None
+# Сколько предыдущих шагов ещё принимать (запас на ввод кода)
+CODE_GRACE_STEPS = int(os.getenv("CODE_GRACE_STEPS", 0))
+# Название аудитории для основного экрана с кодом
+DEFAULT_ROOM = os.getenv("DEFAULT_ROOM", "main")
+# Максимальное число пользователей в кэше UserManager
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", 10000))
+# Кэш истории посещаемости /history: записей и срок жизни в секундах
+HISTORY_CACHE_SIZE = int(os.getenv("HISTORY_CACHE_SIZE", 1000))
+HISTORY_CACHE_TTL = int(os.getenv("HISTORY_CACHE_TTL", 300))
+
+# Сколько строк за раз читать из БД при потоковом экспорте
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", 1000))
+# Построение отчётов вне цикла бота: thread или process, число воркеров и очередь
+EXPORT_EXECUTOR = os.getenv("EXPORT_EXECUTOR", "thread")
+EXPORT_WORKERS = int(os.getenv("EXPORT_WORKERS", 2))
+EXPORT_QUEUE_DEPTH = int(os.getenv("EXPORT_QUEUE_DEPTH", 4))
+# Повторная отправка неизменившихся отчётов по file_id: число записей и возраст в секундах
+REPORT_CACHE_SIZE = int(os.getenv("REPORT_CACHE_SIZE", 32))
+REPORT_CACHE_TTL = int(os.getenv("REPORT_CACHE_TTL", 86400))
+# Импорт списков групп: строк в одной транзакции и предел строк в файле
+ROSTER_BATCH_SIZE = int(os.getenv("ROSTER_BATCH_SIZE", 500))
+ROSTER_MAX_ROWS = int(os.getenv("ROSTER_MAX_ROWS", 20000))
+# Рассылка /broadcast: сообщений в секунду на весь бот, запас, параллельных отправок,
+# повторов после ошибок сети и период обновления прогресса в секундах
+BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", 25))
+BROADCAST_BURST = int(os.getenv("BROADCAST_BURST", 5))
+BROADCAST_WORKERS = int(os.getenv("BROADCAST_WORKERS", 8))
+BROADCAST_RETRIES = int(os.getenv("BROADCAST_RETRIES", 3))
+BROADCAST_PROGRESS_INTERVAL = float(os.getenv("BROADCAST_PROGRESS_INTERVAL", 3))
+# Строк на странице истории отметок /attendance
+ATTENDANCE_PAGE_SIZE = int(os.getenv("ATTENDANCE_PAGE_SIZE", 20))
+
+# Пакетная запись отметок (write-behind очередь)
+ATTENDANCE_BATCH_MODE = os.getenv("ATTENDANCE_BATCH_MODE", "0") == "1"
+ATTENDANCE_BATCH_SIZE = int(os.getenv("ATTENDANCE_BATCH_SIZE", 100))
+ATTENDANCE_FLUSH_MS = int(os.getenv("ATTENDANCE_FLUSH_MS", 5))
+ATTENDANCE_QUEUE_DEPTH = int(os.getenv("ATTENDANCE_QUEUE_DEPTH", 1000))
+# Начальный список администраторов: переносится в таблицу admins, пока она пуста
+ADMIN_IDS = [int(id) for id in os.getenv("ADMIN_IDS", "").split(",") if id.strip()]
+# Как часто перечитывать администраторов из базы (с) - изменения из других процессов
+ADMIN_REFRESH_INTERVAL = int(os.getenv("ADMIN_REFRESH_INTERVAL", 10))
+# Как часто сверять занятия (/open_session) с базой (с) - открытые в других процессах
+SESSION_REFRESH_INTERVAL = int(os.getenv("SESSION_REFRESH_INTERVAL", 5))
+# Как часто воркеры вебхука (WEBHOOK_WORKERS > 1) перечитывают кэш пользователей (с)
+USER_CACHE_REFRESH_INTERVAL = int(os.getenv("USER_CACHE_REFRESH_INTERVAL", 30))
+
+# Хранилище FSM: размер кэша, время жизни состояний (с), период очистки (с)
+# и задержка сохранения изменений в базу (мс, 0 - сразу)
+FSM_CACHE_SIZE = int(os.getenv("FSM_CACHE_SIZE", 10000))
+FSM_CODE_TTL = int(os.getenv("FSM_CODE_TTL", CODE_INTERVAL * 2))
+FSM_REGISTRATION_TTL = int(os.getenv("FSM_REGISTRATION_TTL", 300))
+FSM_SWEEP_INTERVAL = int(os.getenv("FSM_SWEEP_INTERVAL", 60))
+# FSM_FLUSH_MS > 0 - отложенная запись пачками: быстрее, но при падении теряется
+# до FSM_FLUSH_MS мс изменений; 0 - каждое изменение сразу в базу
+FSM_FLUSH_MS = int(os.getenv("FSM_FLUSH_MS", 0))
+
+# Ограничение частоты сообщений: на пользователя - в минуту и запас,
+# на всех сразу - в секунду и запас
+THROTTLE_CODE_PER_MIN = float(os.getenv("THROTTLE_CODE_PER_MIN", 10))
+THROTTLE_CODE_BURST = int(os.getenv("THROTTLE_CODE_BURST", 3))
+THROTTLE_MESSAGE_PER_MIN = float(os.getenv("THROTTLE_MESSAGE_PER_MIN", 30))
+THROTTLE_MESSAGE_BURST = int(os.getenv("THROTTLE_MESSAGE_BURST", 10))
+THROTTLE_GLOBAL_PER_SEC = float(os.getenv("THROTTLE_GLOBAL_PER_SEC", 100))
+THROTTLE_GLOBAL_BURST = int(os.getenv("THROTTLE_GLOBAL_BURST", 1000))
+THROTTLE_MAX_USERS = int(os.getenv("THROTTLE_MAX_USERS", 10000))
+
+# Экран кода: tk - окно Tkinter, web - страница с Server-Sent Events
+DISPLAY_MODE = os.getenv("DISPLAY_MODE", "tk")
+DISPLAY_HOST = os.getenv("DISPLAY_HOST", "0.0.0.0")
+DISPLAY_PORT = int(os.getenv("DISPLAY_PORT", 8081))
+# Если задан, страница открывается только с ?token=
+DISPLAY_TOKEN = os.getenv("DISPLAY_TOKEN", "")
+
+# Метрики: сбор (1/0) и HTTP-эндпоинт /metrics (порт 0 - не запускать)
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", 0))
+
+# Логирование: общий уровень, формат (text или json) и уровни подсистем
+# в виде "db=WARNING,bot.middleware=DEBUG"
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+LOG_LEVELS = os.getenv("LOG_LEVELS", "aiogram.event=WARNING")
+
+# Режим вебхука (BOT_MODE=webhook)
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", 8080))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+# Публичный адрес для setWebhook; пустой - вебхук в Telegram не регистрируется
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_CONCURRENCY = int(os.getenv("WEBHOOK_CONCURRENCY", 100))
+WEBHOOK_MAX_PENDING = int(os.getenv("WEBHOOK_MAX_PENDING", 1000))
+# Процессов вебхука; что у них общее, а что своё - см. bot/webhook.py:main
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", 1))
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", 40))
 
 # Московский часовой пояс (UTC+3)
 MOSCOW_TZ = timezone(timedelta(hours=3))
\ No newline at end of file
@@ -0,0 +1,202 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class CachedUser:
+    """Снимок строки users, безопасный для использования вне сессии"""
+    id: int
+    telegram_id: int
+    full_name: str
+    group: str
+
+    def __repr__(self):
+        return f"<{self.full_name} - {self.group}>"
+
+
+def normalize_name(full_name: str) -> str:
+    """Приводит ФИО к виду для сравнения: регистр, лишние пробелы, ё/е"""
+    return " ".join(full_name.split()).casefold().replace("ё", "е")
+
+
+class AdminSnapshot:
+    """Неизменяемый набор telegram_id администраторов.
+
+    Проверка - поиск во frozenset без ввода-вывода. При изменениях набор не
+    правится на месте, а целиком заменяется новым (присваивание атомарно),
+    так что читатель всегда видит согласованный снимок.
+    """
+
+    def __init__(self, ids=()):
+        self.ids = frozenset(ids)
+
+    def __contains__(self, telegram_id: int) -> bool:
+        return telegram_id in self.ids
+
+    def __len__(self):
+        return len(self.ids)
+
+    def replace(self, ids):
+        self.ids = frozenset(ids)
+
+
+class UserCache:
+    """Ограниченный LRU-кэш пользователей по telegram_id с индексом по ФИО.
+
+    Пока кэш "полный" (прогрет из таблицы users целиком и ничего не было
+    вытеснено), промах считается достоверным ответом "такого пользователя нет"
+    и запрос к БД не нужен. Строки из импортированного списка группы ещё без
+    telegram_id хранятся отдельно по ФИО и не вытесняются.
+    """
+
+    def __init__(self, maxsize: int = 10000):
+        self.maxsize = maxsize
+        self._users = OrderedDict()
+        self._names = {}
+        # нормализованное ФИО -> CachedUser без telegram_id (не занятая строка списка)
+        self._roster = {}
+        self.complete = False
+        # Можно ли доверять промахам. При нескольких процессах пользователь мог
+        # зарегистрироваться в соседнем, поэтому промах надо проверять в БД.
+        self.authoritative = True
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._users)
+
+    def get(self, telegram_id: int):
+        """Возвращает (найден_ли_ответ, пользователь или None)"""
+        user = self._users.get(telegram_id)
+        if user is not None:
+            self._users.move_to_end(telegram_id)
+            self.hits += 1
+            return True, user
+        if self.complete and self.authoritative:
+            self.hits += 1
+            return True, None
+        self.misses += 1
+        return False, None
+
+    def has_name(self, full_name: str):
+        """True/False, если ответ известен по кэшу, иначе None"""
+        name = normalize_name(full_name)
+        if name in self._names or name in self._roster:
+            self.hits += 1
+            return True
+        if self.complete and self.authoritative:
+            self.hits += 1
+            return False
+        self.misses += 1
+        return None
+
+    def roster_entry(self, full_name: str):
+        """Возвращает (найден_ли_ответ, строка списка без telegram_id или None)"""
+        user = self._roster.get(normalize_name(full_name))
+        if user is not None or (self.complete and self.authoritative):
+            self.hits += 1
+            return True, user
+        self.misses += 1
+        return False, None
+
+    def put(self, user: CachedUser):
+        if user.telegram_id is None:
+            self._roster[normalize_name(user.full_name)] = user
+            return
+        # Студент занял свою строку списка
+        self._roster.pop(normalize_name(user.full_name), None)
+        self.remove(user.telegram_id)
+        self._users[user.telegram_id] = user
+        self._names[normalize_name(user.full_name)] = user.telegram_id
+        while len(self._users) > self.maxsize:
+            _, evicted = self._users.popitem(last=False)
+            self._names.pop(normalize_name(evicted.full_name), None)
+            self.evictions += 1
+            self.complete = False
+
+    def remove(self, telegram_id: int):
+        user = self._users.pop(telegram_id, None)
+        if user is not None:
+            self._names.pop(normalize_name(user.full_name), None)
+
+    def load(self, users):
+        """Прогревает кэш полным списком пользователей"""
+        self.clear()
+        for user in users:
+            self.put(user)
+        self.complete = len(self._users) + len(self._roster) == len(users)
+
+    def clear(self):
+        self._users.clear()
+        self._names.clear()
+        self._roster.clear()
+        self.complete = False
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._users),
+            "roster": len(self._roster),
+            "maxsize": self.maxsize,
+            "complete": self.complete,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+class HistoryCache:
+    """Посчитанная история посещаемости: по студенту и по группе.
+
+    История считается по дням до сегодняшнего, поэтому ключ включает
+    сегодняшний день и в полночь записи устаревают сами. Сегодняшние отметки
+    меняют только последние отметки студента - его запись сбрасывается при
+    отметке. ttl ограничивает устаревание, если отметка записана в соседнем
+    процессе.
+    """
+
+    def __init__(self, maxsize: int = 1000, ttl: float = 300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # ("user", telegram_id, день) или ("group", группа, день) -> (истекает, значение)
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key, value):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def on_mark(self, telegram_id: int, day: int):
+        """Сбрасывает запись студента, отметившегося в день day"""
+        self.invalidations += 1
+        self._entries.pop(("user", telegram_id, day), None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
@@ -0,0 +1,62 @@
+from sqlalchemy import event, make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from config.config import (
+    DB_JOURNAL_MODE, DB_SYNCHRONOUS, DB_BUSY_TIMEOUT, DB_CACHE_SIZE, DB_MMAP_SIZE,
+    DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT
+)
+
+# Профили движка SQLite: PRAGMA, выставляемые при каждом подключении
+SQLITE_PROFILES = {
+    # Настройки SQLite по умолчанию: rollback journal, synchronous=FULL,
+    # без busy_timeout, новое подключение на каждую сессию
+    "default": {},
+    # WAL (читатели не блокируют писателя), ожидание блокировки вместо ошибки,
+    # увеличенный кэш страниц и mmap, пул постоянных подключений
+    "production": {
+        "journal_mode": DB_JOURNAL_MODE,
+        "synchronous": DB_SYNCHRONOUS,
+        "busy_timeout": DB_BUSY_TIMEOUT,
+        "cache_size": DB_CACHE_SIZE,
+        "mmap_size": DB_MMAP_SIZE,
+    },
+}
+
+# PRAGMA, значения которых сообщает init_db
+REPORTED_PRAGMAS = ("journal_mode", "synchronous", "busy_timeout", "cache_size", "mmap_size")
+
+
+def make_engine(url: str, profile: str = "default", **kwargs):
+    """Создаёт асинхронный движок с указанным профилем настроек"""
+    if profile not in SQLITE_PROFILES:
+        raise ValueError(f"Неизвестный профиль БД: {profile}")
+    database = make_url(url).database
+    pragmas = SQLITE_PROFILES[profile] if url.startswith("sqlite") else {}
+    # Для in-memory базы SQLAlchemy сам держит одно общее подключение
+    if pragmas and database not in (None, "", ":memory:"):
+        kwargs.setdefault("poolclass", AsyncAdaptedQueuePool)
+        kwargs.setdefault("pool_size", DB_POOL_SIZE)
+        kwargs.setdefault("max_overflow", DB_MAX_OVERFLOW)
+        kwargs.setdefault("pool_timeout", DB_POOL_TIMEOUT)
+
+    engine = create_async_engine(url, echo=False, **kwargs)
+
+    if pragmas:
+        @event.listens_for(engine.sync_engine, "connect")
+        def set_sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+            cursor.close()
+
+    return engine
+
+
+async def read_pragmas(conn) -> dict:
+    """Возвращает фактические значения PRAGMA для подключения"""
+    settings = {}
+    for name in REPORTED_PRAGMAS:
+        result = await conn.exec_driver_sql(f"PRAGMA {name}")
+        settings[name] = result.scalar()
+    return settings
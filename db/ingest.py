@@ -0,0 +1,180 @@
+import asyncio
+import logging
+from datetime import datetime
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from config.config import MOSCOW_TZ
+from .models import User, Attendance, MarkResult, async_session, user_cache, history_cache, day_key
+
+logger = logging.getLogger(__name__)
+
+
+class AttendanceWriter:
+    """Отложенная пакетная запись отметок.
+
+    Обработчики кладут отметки в очередь и ждут результат, а единственная
+    фоновая задача собирает их в пачки (до batch_size строк или flush_interval
+    секунд) и записывает одной транзакцией с многострочным INSERT.
+    Результат каждой отметки отдаётся только после коммита пачки.
+    """
+
+    def __init__(self, batch_size: int = 100, flush_interval: float = 0.005, max_queue: int = 1000):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = asyncio.Queue(maxsize=max_queue)
+        self._task = None
+        self._closed = False
+        # _run завершился: отметки, попавшие в очередь позже, никто не запишет
+        self._finished = False
+        self.batches = 0
+        self.rows = 0
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Закрывает приём отметок и дожидается записи всех уже поставленных"""
+        if self._task is None:
+            return
+        self._closed = True
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    async def submit(self, telegram_id: int, room: str = None) -> MarkResult:
+        if self._closed or self._task is None:
+            raise RuntimeError("AttendanceWriter не запущен")
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((telegram_id, room, future))
+        # Пока ждали места в очереди, запись могла остановиться
+        if self._finished and not future.done():
+            future.set_result(MarkResult.ERROR)
+        return await future
+
+    async def _run(self):
+        batch = []
+        try:
+            await self._consume(batch)
+        finally:
+            # Остановка или отмена: отметки, которые уже не будут записаны,
+            # получают ERROR, чтобы обработчики не ждали их вечно
+            self._closed = True
+            self._finished = True
+            pending = [item for item in batch if item is not None]
+            while not self._queue.empty():
+                pending.append(self._queue.get_nowait())
+            failed = 0
+            for item in pending:
+                if item is not None and not item[2].done():
+                    item[2].set_result(MarkResult.ERROR)
+                    failed += 1
+            if failed:
+                logger.warning("Отметки не записаны из-за остановки: %s", failed, extra={"rows": failed, "outcome": "error"})
+
+    async def _consume(self, batch: list):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            batch.clear()
+            item = await self._queue.get()
+            if item is None:
+                break
+            batch.append(item)
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+
+    async def _flush(self, batch):
+        now = datetime.now(MOSCOW_TZ)
+        today = day_key(now)
+        results = {}
+        try:
+            async with async_session() as session:
+                async with session.begin():
+                    # telegram_id -> users.id: сначала из кэша, остальное одним запросом
+                    user_ids = {}
+                    unresolved = []
+                    for telegram_id, _, _ in batch:
+                        known, user = user_cache.get(telegram_id)
+                        # При нескольких процессах id из кэша мог устареть - проверяем в базе
+                        if user is not None and user_cache.authoritative:
+                            user_ids[telegram_id] = user.id
+                        elif not known or user is not None:
+                            unresolved.append(telegram_id)
+                    if unresolved:
+                        rows = await session.execute(
+                            select(User.telegram_id, User.id).where(User.telegram_id.in_(unresolved))
+                        )
+                        user_ids.update(rows.all())
+
+                    marked = set()
+                    if user_ids:
+                        rows = await session.execute(
+                            select(Attendance.user_id).where(
+                                Attendance.user_id.in_(user_ids.values()),
+                                Attendance.day == today
+                            )
+                        )
+                        marked.update(rows.scalars())
+
+                    values = []
+                    for telegram_id, room, _ in batch:
+                        if telegram_id in results:
+                            continue
+                        user_id = user_ids.get(telegram_id)
+                        if user_id is None:
+                            results[telegram_id] = MarkResult.UNKNOWN_USER
+                        elif user_id in marked:
+                            results[telegram_id] = MarkResult.ALREADY_MARKED
+                        else:
+                            marked.add(user_id)
+                            values.append({"date": now, "day": today, "user_id": user_id, "room": room})
+                            results[telegram_id] = MarkResult.INSERTED
+
+                    inserted = set()
+                    if values:
+                        # Между проверкой и вставкой отметку мог записать другой
+                        # процесс или AttendanceManager - верим только RETURNING
+                        result = await session.execute(
+                            sqlite_insert(Attendance).values(values).on_conflict_do_nothing()
+                            .returning(Attendance.user_id)
+                        )
+                        inserted.update(result.scalars())
+                    for telegram_id, result in results.items():
+                        if result is MarkResult.INSERTED and user_ids[telegram_id] not in inserted:
+                            results[telegram_id] = MarkResult.ALREADY_MARKED
+            self.batches += 1
+            self.rows += len(inserted)
+            logger.debug("Записана пачка отметок: %s из %s", len(inserted), len(batch), extra={"rows": len(inserted)})
+        except Exception:
+            logger.exception("Ошибка записи пачки отметок", extra={"rows": len(batch), "outcome": "error"})
+            results = {telegram_id: MarkResult.ERROR for telegram_id, _, _ in batch}
+
+        # Повторная отметка того же студента в одной пачке - уже не вставка
+        reported = set()
+        for telegram_id, _, future in batch:
+            result = results[telegram_id]
+            if result is MarkResult.INSERTED and telegram_id in reported:
+                result = MarkResult.ALREADY_MARKED
+            reported.add(telegram_id)
+            if result is MarkResult.INSERTED:
+                history_cache.on_mark(telegram_id, today)
+            if not future.done():
+                future.set_result(result)
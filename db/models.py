@@ -1,25 +1,48 @@
 import asyncio
+import logging
 from datetime import datetime, timezone
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from enum import Enum
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import declarative_base, sessionmaker, relationship
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, select
+from sqlalchemy import Column, Integer, String, Float, Text, DateTime, ForeignKey, Index, select, update, literal, inspect, text, bindparam
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 
-from config.config import DB_URL, MOSCOW_TZ
-# Создаём асинхронный движок для SQLite
-engine = create_async_engine(DB_URL, echo=False)
+from config.config import (
+    DB_URL, DB_PROFILE, MOSCOW_TZ, USER_CACHE_SIZE, HISTORY_CACHE_SIZE, HISTORY_CACHE_TTL, METRICS_ENABLED, ADMIN_IDS
+)
+from utils.metrics import metrics, instrument_engine
+from .cache import UserCache, CachedUser, AdminSnapshot, HistoryCache, normalize_name
+from .engine import make_engine, read_pragmas
+
+logger = logging.getLogger(__name__)
+
+# Создаём асинхронный движок для SQLite с профилем настроек из конфига
+engine = make_engine(DB_URL, DB_PROFILE)
+if METRICS_ENABLED:
+    instrument_engine(engine)
 
 Base = declarative_base()
 
 # Асинхронная сессия
 async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
+def _default_name_key(context):
+    return normalize_name(context.get_current_parameters()["full_name"])
+
 # Модель User
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        # Уникальность ФИО без учёта написания; индексом создаётся и в старых базах
+        Index("ux_users_name_key", "name_key", unique=True),
+    )
 
     id = Column(Integer, primary_key=True)
     telegram_id = Column(Integer, unique=True)
     full_name = Column(String, unique=True)
+    # ФИО для сравнения (normalize_name): "Пётр" и "петр" - один человек.
+    # Заполняется при вставке: ФИО после регистрации не меняется
+    name_key = Column(String, default=_default_name_key)
     group = Column(String)
 
     # Связь "один ко многим" — один пользователь может иметь много посещений
@@ -28,13 +51,35 @@ class User(Base):
     def __repr__(self):
         return f"<{self.full_name} - {self.group}>"
 
+def day_key(moment: datetime) -> int:
+    """Ключ дня по московскому календарю в виде числа ГГГГММДД"""
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(MOSCOW_TZ)
+    return moment.year * 10000 + moment.month * 100 + moment.day
+
+def today_key() -> int:
+    return day_key(datetime.now(MOSCOW_TZ))
+
+def _default_day(context):
+    moment = context.get_current_parameters().get("date")
+    return day_key(moment) if moment else today_key()
+
 # Модель Attendance
 class Attendance(Base):
     __tablename__ = "attendances"
+    __table_args__ = (
+        # Не больше одной отметки в день и быстрый поиск "отмечался ли сегодня"
+        Index("ux_attendances_user_day", "user_id", "day", unique=True),
+        Index("ix_attendances_day", "day"),
+        # Keyset-пагинация истории отметок (db/queries.py)
+        Index("ix_attendances_date_id", "date", "id"),
+    )
 
     id = Column(Integer, primary_key=True)
     date = Column(DateTime, default=lambda: datetime.now(MOSCOW_TZ))
+    day = Column(Integer, default=_default_day)  # ГГГГММДД по Москве, см. day_key
     user_id = Column(Integer, ForeignKey("users.id"))  # Ключ связи с таблицей users
+    room = Column(String)  # Аудитория занятия, по коду которого отметились
 
     # Обратная связь "многие к одному"
     user = relationship("User", back_populates="attendances")
@@ -42,112 +87,507 @@ class Attendance(Base):
     def __repr__(self):
         return f"<Attendance {self.user.full_name} at {self.date}>"
 
+# Модель DailyGroupStats - агрегаты отметок по (день, группа)
+class DailyGroupStats(Base):
+    __tablename__ = "daily_group_stats"
+    __table_args__ = (
+        # Учебные дни одной группы для /history
+        Index("ix_daily_group_stats_group_day", "group", "day"),
+    )
+
+    day = Column(Integer, primary_key=True)
+    group = Column(String, primary_key=True)  # "" для пользователей без группы
+    count = Column(Integer, nullable=False, default=0)
+    # Первый отметившийся в этой группе за день
+    first_user_id = Column(Integer)
+    first_full_name = Column(String)
+    first_date = Column(DateTime)
+
+    def __repr__(self):
+        return f"<DailyGroupStats {self.day} {self.group}: {self.count}>"
+
+# Модель Admin - администраторы бота
+class Admin(Base):
+    __tablename__ = "admins"
+
+    telegram_id = Column(Integer, primary_key=True)
+    added_at = Column(DateTime, default=lambda: datetime.now(MOSCOW_TZ))
+
+    def __repr__(self):
+        return f"<Admin {self.telegram_id}>"
+
+# Модель FsmRecord - состояния FSM aiogram (см. bot/storage.py)
+class FsmRecord(Base):
+    __tablename__ = "fsm_states"
+
+    key = Column(String, primary_key=True)  # Ключ из DefaultKeyBuilder
+    state = Column(String)
+    data = Column(Text, nullable=False, default="{}")  # JSON
+    expires_at = Column(Float, index=True)  # Unix-время, NULL - без срока
+
+    def __repr__(self):
+        return f"<FsmRecord {self.key}: {self.state}>"
+
+# Модель SessionRecord - занятия, открытые через /open_session
+class SessionRecord(Base):
+    __tablename__ = "attendance_sessions"
+    # AUTOINCREMENT: id закрытого занятия не достаётся новому (от id зависит код)
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    id = Column(Integer, primary_key=True)
+    room = Column(String, nullable=False)
+    interval = Column(Integer, nullable=False)
+    groups = Column(Text, nullable=False, default="")  # через запятую, "" - все группы
+    opened_at = Column(DateTime, default=lambda: datetime.now(MOSCOW_TZ))
+
+    def __repr__(self):
+        return f"<SessionRecord {self.id} {self.room}>"
+
+# Триггер обновляет агрегат в той же транзакции, что и вставка отметки,
+# поэтому его видят все пути записи: AttendanceManager, пакетная запись и т.д.
+# Удаление отметок триггер не учитывает - для этого есть пересборка.
+DAILY_STATS_TRIGGER = """
+CREATE TRIGGER IF NOT EXISTS trg_attendances_daily_stats AFTER INSERT ON attendances
+BEGIN
+    INSERT INTO daily_group_stats (day, "group", count, first_user_id, first_full_name, first_date)
+    SELECT NEW.day, COALESCE(users."group", ''), 1, users.id, users.full_name, NEW.date
+    FROM users WHERE users.id = NEW.user_id
+    ON CONFLICT (day, "group") DO UPDATE SET
+        count = count + 1,
+        first_user_id = CASE WHEN excluded.first_date < first_date THEN excluded.first_user_id ELSE first_user_id END,
+        first_full_name = CASE WHEN excluded.first_date < first_date THEN excluded.first_full_name ELSE first_full_name END,
+        first_date = MIN(excluded.first_date, first_date);
+END
+"""
+
+# Агрегаты, посчитанные заново по сырым отметкам
+DAILY_STATS_SQL = """
+SELECT day, "group", count, first_user_id, first_full_name, first_date FROM (
+    SELECT attendances.day AS day,
+           COALESCE(users."group", '') AS "group",
+           COUNT(*) OVER (PARTITION BY attendances.day, COALESCE(users."group", '')) AS count,
+           users.id AS first_user_id,
+           users.full_name AS first_full_name,
+           attendances.date AS first_date,
+           ROW_NUMBER() OVER (
+               PARTITION BY attendances.day, COALESCE(users."group", '')
+               ORDER BY attendances.date, attendances.id
+           ) AS position
+    FROM attendances JOIN users ON users.id = attendances.user_id
+    WHERE {where}
+) WHERE position = 1
+"""
+DAILY_STATS_FROM_ATTENDANCE = DAILY_STATS_SQL.format(where="1")
+# Те же агрегаты для одной группы за указанные дни
+DAILY_STATS_FOR_DAYS = text(
+    'INSERT INTO daily_group_stats (day, "group", count, first_user_id, first_full_name, first_date) '
+    + DAILY_STATS_SQL.format(where="attendances.day IN :days AND COALESCE(users.\"group\", '') = :group")
+).bindparams(bindparam("days", expanding=True))
+
+# Кэш зарегистрированных пользователей (общий для всех экземпляров UserManager)
+user_cache = UserCache(USER_CACHE_SIZE)
+metrics.add_stats("user_cache", user_cache.stats)
+history_cache = HistoryCache(HISTORY_CACHE_SIZE, HISTORY_CACHE_TTL)
+metrics.add_stats("history_cache", history_cache.stats)
+
+# Снимок администраторов для проверок без обращения к базе
+admin_roles = AdminSnapshot()
+
+def _cached(user: User) -> CachedUser:
+    return CachedUser(id=user.id, telegram_id=user.telegram_id, full_name=user.full_name, group=user.group)
+
 # Асинхронный менеджер для работы с пользователями
 class UserManager:
     async def post(self, telegram_id: int, full_name: str, group: str):
         async with async_session() as session:
             async with session.begin():
-                user = User(telegram_id=telegram_id, full_name=full_name, group=group)
-                session.add(user)
+                # Если ФИО есть в загруженном списке группы - занимаем эту строку
+                user = await session.scalar(
+                    select(User).where(User.name_key == normalize_name(full_name), User.telegram_id.is_(None))
+                )
+                if user is not None:
+                    user.telegram_id = telegram_id
+                    user.group = group
+                else:
+                    user = User(telegram_id=telegram_id, full_name=full_name, group=group)
+                    session.add(user)
                 try:
                     await session.commit()
-                    print(f"[OK] {user} - зарегистрирован(а)")
-                except Exception as e:
+                    user_cache.put(_cached(user))
+                    logger.info("Пользователь зарегистрирован: %s", user, extra={"user_id": telegram_id, "outcome": "registered"})
+                except Exception:
                     await session.rollback()
-                    print("[ERR]", e)
+                    logger.exception("Ошибка регистрации", extra={"user_id": telegram_id, "outcome": "error"})
 
     async def get(self, telegram_id: int):
+        known, user = user_cache.get(telegram_id)
+        if known:
+            return user
         async with async_session() as session:
             result = await session.execute(
                 select(User).filter_by(telegram_id=telegram_id)
             )
-            return result.scalars().first()
+            user = result.scalars().first()
+            if user is None:
+                return None
+            user = _cached(user)
+            user_cache.put(user)
+            return user
 
     async def check_tg_id(self, telegram_id: int):
+        return await self.get(telegram_id) is not None
+
+    async def check_full_name(self, full_name: str):
+        known = user_cache.has_name(full_name)
+        if known is not None:
+            return known
         async with async_session() as session:
             result = await session.execute(
-                select(User).filter_by(telegram_id=telegram_id)
+                select(User.id).filter_by(name_key=normalize_name(full_name))
             )
             return not(result.scalars().first() is None)
 
-    async def check_full_name(self, full_name: str):
+    async def get_roster_entry(self, full_name: str):
+        """Строка импортированного списка с этим ФИО, которую ещё никто не занял"""
+        known, user = user_cache.roster_entry(full_name)
+        if known:
+            return user
         async with async_session() as session:
             result = await session.execute(
-                select(User).filter_by(full_name=full_name)
+                select(User).where(User.name_key == normalize_name(full_name), User.telegram_id.is_(None))
             )
-            return not(result.scalars().first() is None)
+            user = result.scalars().first()
+            return _cached(user) if user is not None else None
 
     async def delete(self, telegram_id: int):
         async with async_session() as session:
             async with session.begin():
-                user = await self.get(telegram_id)
-                if not user:
-                    print("[ERR] Пользователя с таким tg_id не существует")
-                    return
                 try:
-                    await session.delete(user)
-                    await session.commit()
-                    print(f"[OK] Пользователь {user} удален")
-                except Exception as e:
+                    user = (await session.execute(
+                        select(User.id, User.group).where(User.telegram_id == telegram_id)
+                    )).first()
+                    user_cache.remove(telegram_id)
+                    if user is None:
+                        logger.warning("Пользователя с таким tg_id не существует", extra={"user_id": telegram_id})
+                        return
+                    # Отметки отвязываем, как это делал ORM: SQLite отдаёт id
+                    # удалённой последней строки следующему зарегистрированному,
+                    # и он получил бы эти отметки. Агрегаты его группы за эти дни
+                    # пересчитываются без них в той же транзакции.
+                    days = list(await session.scalars(
+                        select(Attendance.day).where(Attendance.user_id == user.id).distinct()
+                    ))
+                    await session.execute(update(Attendance).where(Attendance.user_id == user.id).values(user_id=None))
+                    await session.execute(User.__table__.delete().where(User.id == user.id))
+                    if days:
+                        await DailyStatsManager().rebuild_days(session, user.group or "", days)
+                    history_cache.clear()
+                    logger.info("Пользователь удалён", extra={"user_id": telegram_id, "outcome": "deleted"})
+                except Exception:
                     await session.rollback()
-                    print("[ERR]", e)
+                    logger.exception("Ошибка удаления пользователя", extra={"user_id": telegram_id})
+
+class AdminManager:
+    async def load(self) -> frozenset:
+        """Перечитывает администраторов из базы и заменяет снимок"""
+        async with async_session() as session:
+            result = await session.execute(select(Admin.telegram_id))
+            admin_roles.replace(result.scalars().all())
+        return admin_roles.ids
+
+    async def seed(self, telegram_ids) -> int:
+        """Заполняет пустую таблицу начальным списком (ADMIN_IDS из .env)"""
+        async with async_session() as session:
+            async with session.begin():
+                if await session.scalar(select(Admin.telegram_id).limit(1)) is not None:
+                    return 0
+                if telegram_ids:
+                    await session.execute(
+                        sqlite_insert(Admin).values([{"telegram_id": telegram_id} for telegram_id in set(telegram_ids)])
+                    )
+        return len(set(telegram_ids))
+
+    async def add(self, telegram_id: int) -> bool:
+        async with async_session() as session:
+            async with session.begin():
+                result = await session.execute(
+                    sqlite_insert(Admin).values(telegram_id=telegram_id).on_conflict_do_nothing()
+                )
+        await self.load()
+        if result.rowcount:
+            logger.info("Администратор добавлен", extra={"user_id": telegram_id})
+        return result.rowcount == 1
+
+    async def remove(self, telegram_id: int) -> bool:
+        async with async_session() as session:
+            async with session.begin():
+                result = await session.execute(Admin.__table__.delete().where(Admin.telegram_id == telegram_id))
+        await self.load()
+        if result.rowcount:
+            logger.info("Администратор удалён", extra={"user_id": telegram_id})
+        return result.rowcount == 1
+
+    async def refresh_forever(self, interval: float):
+        """Периодически перечитывает администраторов, изменённых другими процессами"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.load()
+            except Exception:
+                logger.exception("Ошибка обновления списка администраторов")
+
+# Занятия общие для всех процессов: открываются и закрываются в базе,
+# а реестр каждого процесса периодически сверяется с ней
+class SessionManager:
+    async def open(self, room: str, interval: int, groups) -> str:
+        async with async_session() as session:
+            async with session.begin():
+                record = SessionRecord(room=room, interval=interval, groups=",".join(groups))
+                session.add(record)
+        logger.info("Занятие %s открыто в аудитории %s", record.id, room, extra={"room": room})
+        return str(record.id)
+
+    async def close(self, session_id: str) -> bool:
+        if not session_id.isdigit():
+            return False
+        async with async_session() as session:
+            async with session.begin():
+                result = await session.execute(
+                    SessionRecord.__table__.delete().where(SessionRecord.id == int(session_id))
+                )
+        return result.rowcount == 1
+
+    async def load(self) -> list:
+        """Открытые занятия как (id, аудитория, интервал, группы) для SessionRegistry.sync"""
+        async with async_session() as session:
+            result = await session.execute(select(SessionRecord).order_by(SessionRecord.id))
+            return [
+                (str(record.id), record.room, record.interval, [group for group in record.groups.split(",") if group])
+                for record in result.scalars()
+            ]
+
+    async def refresh_forever(self, sessions, interval: float):
+        """Периодически подтягивает занятия, открытые и закрытые другими процессами"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                sessions.sync(await self.load())
+            except Exception:
+                logger.exception("Ошибка обновления списка занятий")
+
+class MarkResult(Enum):
+    """Результат попытки отметки посещения"""
+    INSERTED = "inserted"
+    ALREADY_MARKED = "already_marked"
+    UNKNOWN_USER = "unknown_user"
+    ERROR = "error"
+
+    def __bool__(self):
+        return self is MarkResult.INSERTED
 
 class AttendanceManager:
-    async def post(self, telegram_id: int):
+    async def post(self, telegram_id: int, room: str = None) -> MarkResult:
+        now = datetime.now(MOSCOW_TZ)
+        # Поиск пользователя и вставка - одним INSERT ... SELECT, а "не больше
+        # одной отметки в день" обеспечивает уникальный индекс (user_id, day):
+        # повторная отметка, в том числе параллельная, просто ничего не вставит.
+        # Для известного по кэшу студента его id подставляется сразу.
+        known, cached_user = user_cache.get(telegram_id)
+        # При нескольких процессах пользователя могли удалить в соседнем, и его
+        # id уже занят другим - тогда id берём из базы, а не из кэша
+        trusted_user = cached_user if user_cache.authoritative else None
+        if known and cached_user is None:
+            logger.warning("Отметка незарегистрированного пользователя", extra={"user_id": telegram_id, "outcome": "unknown_user"})
+            return MarkResult.UNKNOWN_USER
+        if trusted_user:
+            insert_mark = sqlite_insert(Attendance).values(
+                date=now, day=day_key(now), user_id=trusted_user.id, room=room
+            )
+        else:
+            insert_mark = sqlite_insert(Attendance).from_select(
+                ["date", "day", "user_id", "room"],
+                select(literal(now, DateTime), literal(day_key(now)), User.id, literal(room, String))
+                .where(User.telegram_id == telegram_id)
+            )
+        insert_mark = insert_mark.on_conflict_do_nothing()
         async with async_session() as session:
             async with session.begin():
                 try:
-                    user_manager = UserManager()
-                    user = await user_manager.get(telegram_id=telegram_id)
-                    if not user:
-                        print("[ERR] Пользователь не найден")
-                        return False
-                    
-                    # Проверяем, не отмечался ли уже сегодня
-                    today = datetime.now(MOSCOW_TZ).date()
-                    
-                    existing_attendance = await session.execute(
-                        select(Attendance).filter(
-                            Attendance.user_id == user.id,
-                            Attendance.date >= today
-                        )
-                    )
-                    
-                    if existing_attendance.scalars().first():
-                        print(f"[WARN] Пользователь {user.full_name} уже отмечался сегодня")
-                        return False
-                    
-                    # Создаем новую запись о посещении
-                    attendance = Attendance(user_id=user.id)
-                    session.add(attendance)
-                    await session.commit()
-                    print(f"[OK] {user.full_name} - Отмечен(а)")
-                    return True
-                    
-                except Exception as e:
+                    result = await session.execute(insert_mark)
+                    if result.rowcount == 1:
+                        logger.info("Отмечен(а)", extra={"user_id": telegram_id, "room": room, "outcome": "inserted"})
+                        history_cache.on_mark(telegram_id, day_key(now))
+                        return MarkResult.INSERTED
+
+                    # Вставки не было - выясняем причину в той же транзакции
+                    if trusted_user is None and await session.scalar(
+                        select(User.id).filter_by(telegram_id=telegram_id)
+                    ) is None:
+                        logger.warning("Отметка незарегистрированного пользователя", extra={"user_id": telegram_id, "outcome": "unknown_user"})
+                        return MarkResult.UNKNOWN_USER
+                    logger.info("Уже отмечался сегодня", extra={"user_id": telegram_id, "outcome": "already_marked"})
+                    return MarkResult.ALREADY_MARKED
+
+                except Exception:
                     await session.rollback()
-                    print("[ERR]", e)
-                    return False
+                    logger.exception("Ошибка отметки", extra={"user_id": telegram_id, "outcome": "error"})
+                    return MarkResult.ERROR
 
     async def is_marked_today(self, telegram_id: int):
+        user_manager = UserManager()
+        user = await user_manager.get(telegram_id=telegram_id)
+        if not user:
+            logger.warning("Пользователь не найден", extra={"user_id": telegram_id})
+            return False
         async with async_session() as session:
-            today = datetime.now(MOSCOW_TZ).date()
-            user_manager = UserManager()
-            user = await user_manager.get(telegram_id=telegram_id)
-            if not user:
-                print("[ERR] Пользователь не найден")
-                return False
             result = await session.execute(
-                select(Attendance).filter(
+                select(Attendance.id).filter(
                     Attendance.user_id == user.id,
-                    Attendance.date >= today
+                    Attendance.day == today_key()
                 )
             )
             return not(result.scalars().first() is None)
+class DailyStatsManager:
+    async def get_day(self, day: int):
+        async with async_session() as session:
+            result = await session.execute(
+                select(DailyGroupStats).filter_by(day=day).order_by(DailyGroupStats.group)
+            )
+            return result.scalars().all()
+
+    async def rebuild_days(self, session, group: str, days: list):
+        """Пересчитывает агрегаты группы за дни в переданной транзакции"""
+        await session.execute(
+            DailyGroupStats.__table__.delete()
+            .where(DailyGroupStats.group == group, DailyGroupStats.day.in_(days))
+        )
+        await session.execute(DAILY_STATS_FOR_DAYS, {"days": days, "group": group})
+
+    async def rebuild(self) -> dict:
+        """Пересчитывает агрегаты по сырым отметкам и сообщает о расхождениях"""
+        async with async_session() as session:
+            async with session.begin():
+                stored = {
+                    (row.day, row.group): (row.count, row.first_user_id)
+                    for row in (await session.execute(select(DailyGroupStats))).scalars()
+                }
+                fresh = {
+                    (row.day, row.group): (row.count, row.first_user_id)
+                    for row in (await session.execute(text(DAILY_STATS_FROM_ATTENDANCE))).all()
+                }
+                mismatched = sum(1 for key in stored.keys() | fresh.keys() if stored.get(key) != fresh.get(key))
+
+                await session.execute(DailyGroupStats.__table__.delete())
+                await session.execute(text(
+                    'INSERT INTO daily_group_stats (day, "group", count, first_user_id, first_full_name, first_date) '
+                    + DAILY_STATS_FROM_ATTENDANCE
+                ))
+        report = {"rows": len(fresh), "stored": len(stored), "mismatched": mismatched}
+        logger.info("Агрегаты посещаемости пересобраны: %s", report)
+        return report
+
 # Функция для создания таблиц
 async def init_db():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(_migrate_users)
+        await conn.run_sync(_migrate_attendances)
+        await conn.exec_driver_sql(DAILY_STATS_TRIGGER)
+        needs_rebuild = (
+            await conn.scalar(select(DailyGroupStats.day).limit(1)) is None
+            and await conn.scalar(select(Attendance.id).limit(1)) is not None
+        )
+        settings = await read_pragmas(conn)
+    logger.info("Профиль БД %s: %s", DB_PROFILE, ", ".join(f"{k}={v}" for k, v in settings.items()))
+    # База обновлена с версии без агрегатов - заполняем их по истории
+    if needs_rebuild:
+        await DailyStatsManager().rebuild()
+    await warm_user_cache()
+    admin_manager = AdminManager()
+    seeded = await admin_manager.seed(ADMIN_IDS)
+    if seeded:
+        logger.info("Администраторы перенесены из .env: %s", seeded)
+    await admin_manager.load()
+    return settings
+
+# Миграция баз, созданных до появления колонки users.name_key
+def _migrate_users(conn):
+    columns = {column["name"] for column in inspect(conn).get_columns("users")}
+    if "name_key" not in columns:
+        conn.exec_driver_sql("ALTER TABLE users ADD COLUMN name_key VARCHAR")
+    # casefold и ё/е SQLite не умеет - ключи считаются в Python
+    rows = conn.exec_driver_sql("SELECT id, full_name FROM users WHERE name_key IS NULL ORDER BY id").all()
+    if rows:
+        taken = {row[0] for row in conn.exec_driver_sql("SELECT name_key FROM users WHERE name_key IS NOT NULL")}
+        keys, clashes = [], []
+        for user_id, full_name in rows:
+            key = normalize_name(full_name or "")
+            if key in taken:
+                # Тот же человек зарегистрирован дважды в разном написании - решает администратор
+                clashes.append(user_id)
+                continue
+            taken.add(key)
+            keys.append({"user_id": user_id, "key": key})
+        if keys:
+            conn.execute(
+                User.__table__.update().where(User.id == bindparam("user_id")).values(name_key=bindparam("key")), keys
+            )
+            logger.info("Колонка users.name_key заполнена: %s", len(keys))
+        if clashes:
+            logger.warning("ФИО совпадают после нормализации, name_key не задан у id: %s", ", ".join(map(str, clashes)))
+    for index in User.__table__.indexes:
+        index.create(conn, checkfirst=True)
+
+# Миграция баз, созданных до появления колонок attendances.day и attendances.room
+def _migrate_attendances(conn):
+    columns = {column["name"] for column in inspect(conn).get_columns("attendances")}
+    if "room" not in columns:
+        conn.exec_driver_sql("ALTER TABLE attendances ADD COLUMN room VARCHAR")
+        logger.info("Колонка attendances.room добавлена")
+    if "day" not in columns:
+        conn.exec_driver_sql("ALTER TABLE attendances ADD COLUMN day INTEGER")
+        # date хранится как "ГГГГ-ММ-ДД ЧЧ:ММ:СС" по московскому времени
+        result = conn.exec_driver_sql(
+            "UPDATE attendances SET day = CAST(replace(substr(date, 1, 10), '-', '') AS INTEGER) "
+            "WHERE day IS NULL"
+        )
+        logger.info("Колонка attendances.day добавлена, заполнено строк: %s", result.rowcount)
+        # Уникальный индекс не создастся при дублях - оставляем первую отметку
+        # дня, а повторные переносим в attendances_duplicates, не теряя их
+        # Отметки удалённых пользователей (user_id IS NULL) индексу не мешают и дублями не считаются
+        duplicates = (
+            "SELECT id FROM attendances WHERE user_id IS NOT NULL AND id NOT IN "
+            "(SELECT MIN(id) FROM attendances WHERE user_id IS NOT NULL GROUP BY user_id, day)"
+        )
+        ids = [row[0] for row in conn.exec_driver_sql(duplicates)]
+        if ids:
+            conn.exec_driver_sql("CREATE TABLE IF NOT EXISTS attendances_duplicates AS SELECT * FROM attendances WHERE 0")
+            conn.exec_driver_sql(f"INSERT INTO attendances_duplicates SELECT * FROM attendances WHERE id IN ({duplicates})")
+            conn.exec_driver_sql(f"DELETE FROM attendances WHERE id IN ({duplicates})")
+            logger.warning(
+                "Повторные отметки за день перенесены в attendances_duplicates: %s, id: %s",
+                len(ids), ", ".join(map(str, ids))
+            )
+    for index in (*Attendance.__table__.indexes, *DailyGroupStats.__table__.indexes):
+        index.create(conn, checkfirst=True)
+
+# Загрузка всех пользователей в кэш при старте
+async def warm_user_cache():
+    async with async_session() as session:
+        result = await session.execute(select(User))
+        user_cache.load([_cached(user) for user in result.scalars()])
+    logger.info("Кэш пользователей прогрет: %s", user_cache.stats())
+
+async def refresh_user_cache_forever(interval: float):
+    """Перечитывает кэш пользователей: регистрации и удаления из других процессов"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            async with async_session() as session:
+                result = await session.execute(select(User))
+                user_cache.load([_cached(user) for user in result.scalars()])
+        except Exception:
+            logger.exception("Ошибка обновления кэша пользователей")
 
 # Запуск создания таблиц
 if __name__ == "__main__":
@@ -0,0 +1,256 @@
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from sqlalchemy import func, select, text, tuple_
+
+from .models import User, Attendance, async_session, history_cache, today_key
+
+
+async def users_version() -> tuple:
+    """Версия таблицы users для кэша отчётов.
+
+    Строки добавляются (регистрация, импорт списка), удаляются (/reset_user)
+    и получают telegram_id при регистрации по списку - каждое из этих
+    изменений меняет число строк, максимальный id или сумму telegram_id.
+    """
+    async with async_session() as session:
+        return tuple((await session.execute(
+            select(func.count(), func.max(User.id), func.total(User.telegram_id))
+        )).one())
+
+
+async def attendance_version() -> tuple:
+    """Версия данных выгрузки посещений: отметки только добавляются, плюс users"""
+    async with async_session() as session:
+        last_mark = await session.scalar(select(func.max(Attendance.id)))
+    return (last_mark, *await users_version())
+
+
+async def broadcast_recipients(groups=None) -> list:
+    """telegram_id зарегистрированных студентов указанных групп (None - всех)"""
+    query = select(User.telegram_id).where(User.telegram_id.is_not(None))
+    if groups:
+        query = query.where(User.group.in_(groups))
+    async with async_session() as session:
+        return list(await session.scalars(query.order_by(User.id)))
+
+
+@dataclass(frozen=True)
+class AttendanceFilter:
+    """Фильтры истории отметок; None - без ограничения"""
+    date_from: date = None
+    date_to: date = None
+    group: str = None
+    # telegram_id числом или часть ФИО
+    student: str = None
+
+    def to_dict(self) -> dict:
+        return {
+            "date_from": self.date_from.isoformat() if self.date_from else None,
+            "date_to": self.date_to.isoformat() if self.date_to else None,
+            "group": self.group,
+            "student": self.student,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "AttendanceFilter":
+        return cls(
+            date_from=date.fromisoformat(data["date_from"]) if data.get("date_from") else None,
+            date_to=date.fromisoformat(data["date_to"]) if data.get("date_to") else None,
+            group=data.get("group"),
+            student=data.get("student"),
+        )
+
+
+@dataclass(frozen=True)
+class AttendanceRow:
+    id: int
+    date: datetime
+    full_name: str
+    group: str
+    room: str
+
+    @property
+    def cursor(self) -> tuple:
+        return self.date, self.id
+
+
+@dataclass(frozen=True)
+class AttendancePage:
+    rows: list
+    # Есть ли отметки новее первой и старше последней строки страницы
+    has_newer: bool
+    has_older: bool
+
+
+def _filtered(query, filters: AttendanceFilter):
+    # Границы дат - по самому столбцу date, чтобы диапазон шёл по индексу (date, id)
+    if filters.date_from:
+        query = query.where(Attendance.date >= datetime.combine(filters.date_from, time.min))
+    if filters.date_to:
+        query = query.where(Attendance.date < datetime.combine(filters.date_to + timedelta(days=1), time.min))
+    if filters.group:
+        query = query.where(User.group == filters.group)
+    if filters.student:
+        if filters.student.isdigit():
+            query = query.where(User.telegram_id == int(filters.student))
+        else:
+            query = query.where(User.full_name.contains(filters.student, autoescape=True))
+    return query
+
+
+async def fetch_attendance_page(filters: AttendanceFilter, after: tuple = None, before: tuple = None,
+                                limit: int = 20) -> AttendancePage:
+    """Страница отметок от новых к старым с keyset-пагинацией по (date, id).
+
+    after - курсор последней строки предыдущей страницы (листаем к старым),
+    before - курсор первой строки (листаем к новым). Вместо OFFSET запрос
+    продолжает обход индекса с курсора, поэтому глубина не влияет на цену
+    страницы. Берётся limit + 1 строк, чтобы узнать, есть ли продолжение.
+    """
+    key = tuple_(Attendance.date, Attendance.id)
+    query = _filtered(
+        select(Attendance.id, Attendance.date, User.full_name, User.group, Attendance.room)
+        .join(User, User.id == Attendance.user_id),
+        filters
+    )
+    if before is not None:
+        query = query.where(key > tuple_(*before)).order_by(Attendance.date, Attendance.id)
+    else:
+        if after is not None:
+            query = query.where(key < tuple_(*after))
+        query = query.order_by(Attendance.date.desc(), Attendance.id.desc())
+
+    async with async_session() as session:
+        result = await session.execute(query.limit(limit + 1))
+        rows = [AttendanceRow(*row) for row in result]
+
+    more = len(rows) > limit
+    rows = rows[:limit]
+    if before is not None:
+        rows.reverse()
+        return AttendancePage(rows, has_newer=more, has_older=True)
+    return AttendancePage(rows, has_newer=after is not None, has_older=more)
+
+
+# Посещаемость студентов группы по её учебным дням (дни из daily_group_stats).
+# Учебный день - день до сегодняшнего, когда в группе кто-то отметился:
+# сегодняшнее занятие ещё идёт и не считается ни посещением, ни пропуском,
+# одинаково для студента и для итога группы (get_group_history).
+# Серии - "острова" подряд идущих посещений: разность номеров строки по всем
+# дням и по дням с тем же attended постоянна внутри острова; у текущей серии
+# (последний учебный день посещён) она равна нулю.
+HISTORY_SQL = """
+WITH members AS (
+    SELECT id, full_name, telegram_id FROM users WHERE {members}
+),
+grid AS (
+    SELECT members.id AS user_id, stats.day, attendances.id IS NOT NULL AS attended
+    FROM members
+    JOIN daily_group_stats AS stats ON stats."group" = :group
+    LEFT JOIN attendances ON attendances.user_id = members.id AND attendances.day = stats.day
+    WHERE stats.day < :today
+),
+runs AS (
+    SELECT user_id, attended,
+           ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY day DESC)
+           - ROW_NUMBER() OVER (PARTITION BY user_id, attended ORDER BY day DESC) AS run
+    FROM grid
+),
+streaks AS (
+    SELECT user_id, run, COUNT(*) AS length FROM runs WHERE attended GROUP BY user_id, run
+),
+class_days AS (
+    SELECT user_id, COUNT(*) AS days FROM grid GROUP BY user_id
+)
+SELECT members.id, members.full_name, members.telegram_id,
+       COALESCE(class_days.days, 0) AS class_days,
+       COALESCE(SUM(streaks.length), 0) AS attended,
+       COALESCE(MAX(CASE WHEN streaks.run = 0 THEN streaks.length END), 0) AS streak,
+       COALESCE(MAX(streaks.length), 0) AS best_streak
+FROM members
+LEFT JOIN class_days ON class_days.user_id = members.id
+LEFT JOIN streaks ON streaks.user_id = members.id
+GROUP BY members.id
+ORDER BY attended DESC, members.full_name
+"""
+
+STUDENT_HISTORY_SQL = text(HISTORY_SQL.format(members="id = :user_id"))
+GROUP_HISTORY_SQL = text(HISTORY_SQL.format(members="COALESCE(\"group\", '') = :group"))
+
+
+@dataclass(frozen=True)
+class StudentHistory:
+    full_name: str
+    telegram_id: int
+    class_days: int
+    attended: int
+    streak: int
+    best_streak: int
+    # Даты последних отметок, от новых к старым
+    recent: tuple = ()
+
+    @property
+    def rate(self) -> float:
+        return self.attended / self.class_days if self.class_days else 0.0
+
+
+@dataclass(frozen=True)
+class GroupHistory:
+    group: str
+    class_days: int
+    students: tuple
+
+    @property
+    def rate(self) -> float:
+        """Средняя посещаемость по студентам, у которых были учебные дни"""
+        rates = [student.rate for student in self.students if student.class_days]
+        return sum(rates) / len(rates) if rates else 0.0
+
+
+async def get_student_history(user, recent: int = 10) -> StudentHistory:
+    """История студента (CachedUser): процент, серии и последние отметки"""
+    today = today_key()
+    key = ("user", user.telegram_id, today)
+    history = history_cache.get(key)
+    if history is not None:
+        return history
+
+    async with async_session() as session:
+        row = (await session.execute(
+            STUDENT_HISTORY_SQL, {"user_id": user.id, "group": user.group or "", "today": today}
+        )).one()
+        dates = await session.scalars(
+            select(Attendance.date).where(Attendance.user_id == user.id)
+            .order_by(Attendance.day.desc()).limit(recent)
+        )
+        history = StudentHistory(
+            full_name=row.full_name, telegram_id=row.telegram_id, class_days=row.class_days,
+            attended=row.attended, streak=row.streak, best_streak=row.best_streak, recent=tuple(dates)
+        )
+    history_cache.put(key, history)
+    return history
+
+
+async def get_group_history(group: str) -> GroupHistory:
+    """История всех студентов группы одним запросом"""
+    today = today_key()
+    key = ("group", group, today)
+    history = history_cache.get(key)
+    if history is not None:
+        return history
+
+    async with async_session() as session:
+        result = await session.execute(GROUP_HISTORY_SQL, {"group": group, "today": today})
+        students = tuple(
+            StudentHistory(
+                full_name=row.full_name, telegram_id=row.telegram_id, class_days=row.class_days,
+                attended=row.attended, streak=row.streak, best_streak=row.best_streak
+            )
+            for row in result
+        )
+        class_days = await session.scalar(text(
+            'SELECT COUNT(*) FROM daily_group_stats WHERE "group" = :group AND day < :today'
+        ), {"group": group, "today": today})
+    history = GroupHistory(group=group, class_days=class_days, students=students)
+    history_cache.put(key, history)
+    return history
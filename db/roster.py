@@ -0,0 +1,262 @@
+import csv
+import io
+import logging
+import time
+from dataclasses import dataclass
+from sqlalchemy import Column, Integer, MetaData, String, Table, insert, literal, select, union_all
+from sqlalchemy.exc import IntegrityError
+
+from config.config import ROSTER_BATCH_SIZE, ROSTER_MAX_ROWS
+from .cache import normalize_name
+from .models import User, engine, warm_user_cache
+
+logger = logging.getLogger(__name__)
+
+INSERTED = "inserted"
+DUPLICATE = "duplicate"
+INVALID = "invalid"
+
+# Названия столбцов в заголовке (в том числе из выгрузки "Пользователи")
+HEADERS = {
+    "full_name": ("фио", "full_name", "name"),
+    "group": ("группа", "group"),
+    "telegram_id": ("тг_айди", "telegram_id", "tg_id", "id"),
+}
+
+# Строки списка на время проверки: временная таблица живёт в одном подключении
+_import_metadata = MetaData()
+roster_rows = Table(
+    "roster_import", _import_metadata,
+    Column("row", Integer, primary_key=True),
+    Column("name_key", String),
+    Column("telegram_id", Integer),
+    prefixes=["TEMPORARY"],
+)
+
+
+class RosterError(Exception):
+    pass
+
+
+@dataclass
+class RosterRow:
+    """Строка загруженного списка и результат её импорта"""
+    row: int
+    full_name: str
+    group: str
+    telegram_id: int | None = None
+    status: str = ""
+    reason: str = ""
+
+
+def _read_csv(content: bytes):
+    try:
+        text = content.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        # CSV из Excel в русской Windows
+        text = content.decode("cp1251")
+    try:
+        dialect = csv.Sniffer().sniff(text[:4096], delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+    return list(csv.reader(io.StringIO(text), dialect))
+
+
+def _read_xlsx(content: bytes):
+    # openpyxl нужен только импорту, не грузим его при старте бота
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(io.BytesIO(content), read_only=True, data_only=True)
+    try:
+        return [list(values) for values in workbook.active.iter_rows(values_only=True)]
+    finally:
+        workbook.close()
+
+
+def _columns(header) -> dict | None:
+    """Номера столбцов по заголовку или None, если первая строка - данные"""
+    names = [str(cell).strip().casefold() if cell is not None else "" for cell in header]
+    found = {}
+    for field, aliases in HEADERS.items():
+        for index, name in enumerate(names):
+            if name in aliases:
+                found[field] = index
+                break
+    return found if "full_name" in found else None
+
+
+def _cell(values, index):
+    if index is None or index >= len(values) or values[index] is None:
+        return ""
+    value = values[index]
+    # Excel хранит числа как float: 123456789.0
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def read_roster(content: bytes, filename: str) -> list:
+    """Разбирает CSV/XLSX со столбцами ФИО, группа и (необязательно) telegram_id.
+
+    Первая строка считается заголовком, если в ней есть столбец ФИО, иначе
+    столбцы берутся по порядку. Выполняется в потоке: файл может быть большим.
+    """
+    records = _read_xlsx(content) if filename.lower().endswith(".xlsx") else _read_csv(content)
+    if not records:
+        raise RosterError("Файл пустой")
+
+    columns = _columns(records[0])
+    first_row = 2 if columns else 1
+    if columns is None:
+        columns = {"full_name": 0, "group": 1, "telegram_id": 2}
+    else:
+        records = records[1:]
+    if len(records) > ROSTER_MAX_ROWS:
+        raise RosterError(f"Слишком много строк: {len(records)}, допускается {ROSTER_MAX_ROWS}")
+
+    rows = []
+    for number, values in enumerate(records, start=first_row):
+        if not any(value not in (None, "") for value in values):
+            continue
+        rows.append(RosterRow(
+            row=number,
+            full_name=" ".join(_cell(values, columns.get("full_name")).split()),
+            group=_cell(values, columns.get("group")),
+            telegram_id=_cell(values, columns.get("telegram_id")) or None,
+        ))
+    return rows
+
+
+def validate_roster(rows: list) -> list:
+    """Проверяет строки без БД: пустые поля, telegram_id и повторы внутри файла.
+
+    Возвращает строки, которые ещё предстоит сверить с базой.
+    """
+    seen_names = {}
+    seen_ids = {}
+    valid = []
+    for row in rows:
+        if not row.full_name:
+            row.status, row.reason = INVALID, "нет ФИО"
+            continue
+        if not row.group:
+            row.status, row.reason = INVALID, "нет группы"
+            continue
+        if row.telegram_id is not None:
+            try:
+                row.telegram_id = int(row.telegram_id)
+            except ValueError:
+                row.status, row.reason = INVALID, "telegram_id не число"
+                continue
+
+        name = normalize_name(row.full_name)
+        if name in seen_names:
+            row.status, row.reason = DUPLICATE, f"повтор ФИО в файле (строка {seen_names[name]})"
+            continue
+        if row.telegram_id is not None and row.telegram_id in seen_ids:
+            row.status, row.reason = DUPLICATE, f"повтор telegram_id в файле (строка {seen_ids[row.telegram_id]})"
+            continue
+        seen_names[name] = row.row
+        if row.telegram_id is not None:
+            seen_ids[row.telegram_id] = row.row
+        valid.append(row)
+    return valid
+
+
+async def _find_existing(rows: list) -> dict:
+    """Одним запросом находит строки, которые нарушат уникальность users.
+
+    Строки кладутся во временную таблицу и соединяются с users по name_key
+    (ФИО после normalize_name, как при регистрации) и по telegram_id - оба
+    столбца под уникальным индексом, - вместо запроса check_full_name на
+    каждую строку. Возвращает {номер строки: столбец}.
+    """
+    users = User.__table__
+    async with engine.connect() as conn:
+        await conn.run_sync(roster_rows.create)
+        try:
+            await conn.execute(insert(roster_rows), [
+                {"row": row.row, "name_key": normalize_name(row.full_name), "telegram_id": row.telegram_id}
+                for row in rows
+            ])
+            by_name = select(roster_rows.c.row, literal("full_name")).join(
+                users, users.c.name_key == roster_rows.c.name_key
+            )
+            by_id = select(roster_rows.c.row, literal("telegram_id")).join(
+                users, users.c.telegram_id == roster_rows.c.telegram_id
+            )
+            result = await conn.execute(union_all(by_name, by_id))
+            existing = {}
+            for number, column in result:
+                existing.setdefault(number, column)
+        finally:
+            await conn.run_sync(roster_rows.drop)
+            await conn.commit()
+    return existing
+
+
+async def _insert_batch(batch: list):
+    values = [{"telegram_id": row.telegram_id, "full_name": row.full_name, "group": row.group} for row in batch]
+    try:
+        async with engine.begin() as conn:
+            await conn.execute(insert(User), values)
+        for row in batch:
+            row.status = INSERTED
+        return
+    except IntegrityError:
+        # Кто-то успел зарегистрироваться между проверкой и вставкой:
+        # повторяем пакет построчно, чтобы отметить именно эти строки
+        pass
+    for row, value in zip(batch, values):
+        try:
+            async with engine.begin() as conn:
+                await conn.execute(insert(User), [value])
+            row.status = INSERTED
+        except IntegrityError:
+            row.status, row.reason = DUPLICATE, "уже есть в базе"
+
+
+async def import_roster(rows: list, batch_size: int = ROSTER_BATCH_SIZE) -> dict:
+    """Импортирует список группы: проверка, пакетная вставка, обновление кэша.
+
+    Статус и причина проставляются в каждую строку rows (для отчёта).
+    """
+    started = time.perf_counter()
+    valid = validate_roster(rows)
+    if valid:
+        existing = await _find_existing(valid)
+        fresh = []
+        for row in valid:
+            column = existing.get(row.row)
+            if column == "full_name":
+                row.status, row.reason = DUPLICATE, "ФИО уже есть в базе"
+            elif column == "telegram_id":
+                row.status, row.reason = DUPLICATE, "telegram_id уже есть в базе"
+            else:
+                fresh.append(row)
+
+        for start in range(0, len(fresh), batch_size):
+            await _insert_batch(fresh[start:start + batch_size])
+        if fresh:
+            # Новые ФИО должны сразу находиться при регистрации
+            await warm_user_cache()
+
+    summary = {status: 0 for status in (INSERTED, DUPLICATE, INVALID)}
+    for row in rows:
+        summary[row.status] += 1
+    summary["seconds"] = time.perf_counter() - started
+    logger.info("Импорт списка: %s", summary, extra={"rows": len(rows)})
+    return summary
+
+
+def report_csv(rows: list) -> bytes:
+    """Построчный отчёт импорта; utf-8-sig, чтобы Excel открыл кириллицу"""
+    output = io.StringIO()
+    writer = csv.writer(output, delimiter=";")
+    writer.writerow(["Строка", "ФИО", "Группа", "ТГ_АЙДИ", "Результат", "Причина"])
+    for row in rows:
+        writer.writerow([
+            row.row, row.full_name, row.group,
+            row.telegram_id if row.telegram_id is not None else "", row.status, row.reason,
+        ])
+    return output.getvalue().encode("utf-8-sig")
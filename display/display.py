@@ -1,6 +1,5 @@
+import math
 import tkinter as tk
-from threading import Thread
-import time
 
 def display_code(generator):
     root = tk.Tk()
@@ -46,14 +45,14 @@ def display_code(generator):
     timer_label.pack()
 
     def update_display():
-        while True:
-            code = generator.get_current_code()  # Получить текущий код
-            remaining_time = generator.get_time_remaining()
-            code_label.config(text=f"{code:04d}")  # Форматировать код до 4 цифр
-            timer_label.config(text=f"Time left: {remaining_time}s")
-            root.update()
-            time.sleep(1)  # Обновлять каждую секунду
+        code = generator.get_current_code()  # Получить текущий код (при истечении генерирует новый)
+        remaining = generator.seconds_until_change()
+        code_label.config(text=f"{code:04d}")  # Форматировать код до 4 цифр
+        timer_label.config(text=f"Time left: {int(remaining)}s")
+        # Следующее обновление - ровно когда сменится число на таймере или сам код
+        delay = remaining - math.floor(remaining) if remaining >= 1 else remaining
+        root.after(int(delay * 1000) + 5, update_display)
 
-    # Запустить цикл обновления в отдельном потоке
-    Thread(target=update_display, daemon=True).start()
-    root.mainloop()
\ No newline at end of file
+    # Все обновления выполняет главный цикл Tk, отдельный поток не нужен
+    update_display()
+    root.mainloop()
@@ -0,0 +1,193 @@
+import asyncio
+import json
+import logging
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+# Браузер считает секунды сам по expires_in, сервер пишет только при смене кода
+PAGE = """<!DOCTYPE html>
+<html lang="ru">
+<head>
+<meta charset="utf-8">
+<title>Код посещения</title>
+<style>
+  body { margin: 0; height: 100vh; display: flex; flex-direction: column;
+         align-items: center; justify-content: center; background: white; font-family: Arial, sans-serif; }
+  #room { font-size: 4vw; color: #555; }
+  #code { font-size: 30vw; line-height: 1; }
+  #timer { font-size: 6vw; color: red; }
+</style>
+</head>
+<body>
+<div id="room"></div>
+<div id="code">----</div>
+<div id="timer"></div>
+<script>
+  let expiresAt = 0;
+  const source = new EventSource("events" + location.search);
+  source.addEventListener("code", (event) => {
+    const data = JSON.parse(event.data);
+    document.getElementById("room").textContent = data.room;
+    document.getElementById("code").textContent = String(data.code).padStart(4, "0");
+    expiresAt = performance.now() + data.expires_in * 1000;
+  });
+  source.addEventListener("closed", () => {
+    document.getElementById("code").textContent = "----";
+    document.getElementById("timer").textContent = "Занятие закрыто";
+    expiresAt = 0;
+    source.close();
+  });
+  setInterval(() => {
+    if (expiresAt) {
+      const left = Math.max(0, Math.floor((expiresAt - performance.now()) / 1000));
+      document.getElementById("timer").textContent = "Time left: " + left + "s";
+    }
+  }, 200);
+</script>
+</body>
+</html>
+"""
+
+
+class CodeChannel:
+    """Рассылка кода одного занятия всем подключённым экранам.
+
+    Пока есть подписчики, одна задача просыпается ровно к смене кода и
+    кладёт новое событие в очередь каждого экрана. В очереди хранится только
+    последнее событие: медленный клиент пропускает устаревшие коды.
+    """
+
+    def __init__(self, sessions, session_id: str):
+        self.sessions = sessions
+        self.session_id = session_id
+        self.subscribers = set()
+        self.last_event = None
+        self._task = None
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=1)
+        if self.last_event is not None:
+            queue.put_nowait(self.last_event)
+        self.subscribers.add(queue)
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self.subscribers.discard(queue)
+        if not self.subscribers and self._task is not None:
+            self._task.cancel()
+            self._task = None
+            self.last_event = None
+
+    def _publish(self, event: str):
+        self.last_event = event
+        for queue in self.subscribers:
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+    async def _run(self):
+        while True:
+            session = self.sessions.get(self.session_id)
+            if session is None:
+                self._publish("event: closed\ndata: {}\n\n")
+                return
+            code = session.generator.get_current_code()
+            remaining = session.generator.seconds_until_change()
+            payload = {"room": session.room, "code": code, "expires_in": round(remaining, 3)}
+            self._publish(f"event: code\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n")
+            # Небольшой запас, чтобы проснуться уже после смены шага
+            await asyncio.sleep(remaining + 0.005)
+
+
+class DisplayServer:
+    """HTTP-экран кода: страница для проектора и поток Server-Sent Events.
+
+    GET /?session=<id> - страница, GET /events?session=<id> - поток событий.
+    Без session показывается первое занятие (основной экран). Если задан
+    token, его нужно передать в ?token=, иначе код увидит любой в сети.
+    """
+
+    HEARTBEAT = 15
+
+    def __init__(self, sessions, token: str = ""):
+        self.sessions = sessions
+        self.token = token
+        self.channels = {}
+        self.connections = 0
+        self._runner = None
+
+    def _check(self, request: web.Request):
+        if self.token and request.query.get("token") != self.token:
+            raise web.HTTPUnauthorized()
+
+    def _session_id(self, request: web.Request):
+        session_id = request.query.get("session")
+        if session_id is None:
+            session = next(iter(self.sessions), None)
+            session_id = session.id if session else None
+        if session_id is None or self.sessions.get(session_id) is None:
+            raise web.HTTPNotFound(text="Занятие не найдено")
+        return session_id
+
+    async def handle_page(self, request: web.Request) -> web.Response:
+        self._check(request)
+        self._session_id(request)
+        return web.Response(text=PAGE, content_type="text/html")
+
+    async def handle_events(self, request: web.Request) -> web.StreamResponse:
+        self._check(request)
+        session_id = self._session_id(request)
+        channel = self.channels.get(session_id)
+        if channel is None:
+            channel = self.channels[session_id] = CodeChannel(self.sessions, session_id)
+
+        response = web.StreamResponse(headers={
+            "Content-Type": "text/event-stream",
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        })
+        await response.prepare(request)
+        queue = channel.subscribe()
+        self.connections += 1
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), self.HEARTBEAT)
+                except asyncio.TimeoutError:
+                    # Комментарий держит соединение через прокси
+                    event = ": ping\n\n"
+                await response.write(event.encode())
+                if event.startswith("event: closed"):
+                    break
+        except ConnectionResetError:
+            pass
+        finally:
+            self.connections -= 1
+            channel.unsubscribe(queue)
+            if not channel.subscribers:
+                self.channels.pop(session_id, None)
+        return response
+
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/", self.handle_page)
+        app.router.add_get("/events", self.handle_events)
+        return app
+
+    async def start(self, host: str, port: int):
+        self._runner = web.AppRunner(self.create_app(), shutdown_timeout=1)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        logger.info("Экран кода доступен на http://%s:%s/", host, port)
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def stats(self) -> dict:
+        return {"connections": self.connections, "channels": len(self.channels)}
@@ -1,33 +1,122 @@
+import hashlib
+import hmac
+import os
 import random
+import threading
+import time
 from datetime import datetime, timedelta
 
 
 class CodeGenerator:
+    """Случайный код, который сменяется по истечении срока.
+
+    Код и срок меняются вместе под блокировкой: get_current_code вызывают и
+    поток окна (Tk), и поток бота (SessionRegistry.resolve -> valid_codes),
+    и без неё оба могли сгенерировать код и увидеть разные значения.
+    """
+
     def __init__(self, validity_seconds=20):
         self.validity_seconds = validity_seconds
         self.current_code = None
         self.code_expires = None
+        self._lock = threading.Lock()
         self.generate_new_code()
 
     def generate_new_code(self):
         """Генерирует новый случайный код"""
+        with self._lock:
+            self._generate()
+
+    def _generate(self):
         self.current_code = random.randint(1000, 9999)
         self.code_expires = datetime.now() + timedelta(seconds=self.validity_seconds)
 
     def get_current_code(self):
         """Возвращает текущий код, если он еще действителен"""
-        if datetime.now() > self.code_expires:
-            self.generate_new_code()
-        return self.current_code
+        with self._lock:
+            if datetime.now() > self.code_expires:
+                self._generate()
+            return self.current_code
 
     def is_code_valid(self, code_to_check):
         """Проверяет, совпадает ли код и не истек ли срок"""
-        return (code_to_check == self.current_code and datetime.now() <= self.code_expires)
+        with self._lock:
+            return (code_to_check == self.current_code and datetime.now() <= self.code_expires)
 
     def get_time_remaining(self):
         """Возвращает оставшееся время в секундах"""
-        if self.code_expires:
-            remaining = (self.code_expires - datetime.now()).total_seconds()
+        with self._lock:
+            code_expires = self.code_expires
+        if code_expires:
+            remaining = (code_expires - datetime.now()).total_seconds()
             return max(0, int(remaining))
         return 0
 
+    def valid_codes(self):
+        """Коды, которые принимаются сейчас"""
+        return {self.get_current_code()}
+
+    def seconds_until_change(self):
+        """Точное время до смены кода в секундах"""
+        with self._lock:
+            code_expires = self.code_expires
+        return max(0.0, (code_expires - datetime.now()).total_seconds())
+
+
+class TotpCodeGenerator:
+    """Код вычисляется из секрета и номера временного шага (как TOTP).
+
+    Изменяемого состояния нет: любой поток или процесс с тем же секретом
+    получает тот же код для того же шага. Время берётся с монотонных часов,
+    привязанных к системному времени один раз при создании, поэтому перевод
+    часов во время работы не сдвигает шаги.
+    """
+
+    def __init__(self, validity_seconds=20, secret=None, grace_steps=0):
+        self.validity_seconds = validity_seconds
+        self.grace_steps = grace_steps
+        if secret is None:
+            secret = os.urandom(32)
+        self.secret = secret.encode() if isinstance(secret, str) else secret
+        self._epoch = time.time() - time.monotonic()
+
+    def _now(self):
+        return self._epoch + time.monotonic()
+
+    def _step(self, now=None):
+        return int((self._now() if now is None else now) // self.validity_seconds)
+
+    def code_for_step(self, step):
+        """Четырёхзначный код (1000-9999) для номера шага"""
+        digest = hmac.new(self.secret, step.to_bytes(8, "big"), hashlib.sha256).digest()
+        offset = digest[-1] & 0x0F
+        value = int.from_bytes(digest[offset:offset + 4], "big") & 0x7FFFFFFF
+        return 1000 + value % 9000
+
+    def get_current_code(self):
+        """Возвращает код текущего шага"""
+        return self.code_for_step(self._step())
+
+    def valid_codes(self):
+        """Коды, которые принимаются сейчас: текущий и grace_steps предыдущих"""
+        step = self._step()
+        return {self.code_for_step(step - i) for i in range(self.grace_steps + 1)}
+
+    def is_code_valid(self, code_to_check):
+        """Проверяет код текущего шага и (опционально) предыдущих"""
+        step = self._step()
+        valid = False
+        for i in range(self.grace_steps + 1):
+            # Сравнение за постоянное время, без раннего выхода
+            valid |= hmac.compare_digest(str(self.code_for_step(step - i)), str(code_to_check))
+        return valid
+
+    def get_time_remaining(self):
+        """Возвращает оставшееся время в секундах"""
+        return int(self.seconds_until_change())
+
+    def seconds_until_change(self):
+        """Точное время до смены кода в секундах"""
+        now = self._now()
+        return (self._step(now) + 1) * self.validity_seconds - now
+
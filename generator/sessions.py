@@ -0,0 +1,143 @@
+import hashlib
+import hmac
+import heapq
+import itertools
+import os
+import time
+
+from .code_generator import TotpCodeGenerator
+
+
+class AttendanceSession:
+    """Занятие в аудитории со своим меняющимся кодом"""
+
+    def __init__(self, session_id: str, room: str, groups, generator):
+        self.id = session_id
+        self.room = room
+        # Пустое множество - занятие открыто для любой группы
+        self.groups = frozenset(groups)
+        self.generator = generator
+        self.opened_at = time.time()
+
+    def accepts(self, group) -> bool:
+        return not self.groups or group in self.groups
+
+    def __repr__(self):
+        return f"<AttendanceSession {self.id} {self.room}>"
+
+
+class SessionRegistry:
+    """Реестр одновременных занятий с поиском занятия по коду за O(1).
+
+    Индекс код -> занятия обновляется лениво: в куче лежат моменты смены кода
+    каждого занятия, и при поиске пересчитываются только те занятия, чей код
+    уже сменился.
+
+    Занятия из open() хранятся в базе (SessionManager) и приходят в каждый
+    процесс через sync(): их id выдаёт база, а секрет выводится из общего,
+    так что коды совпадают во всех воркерах. Занятия из add() - локальные
+    (экран этого процесса), их id - "0", "-1", ... и с базой не пересекаются.
+    """
+
+    def __init__(self, secret=None, grace_steps: int = 0):
+        if secret is None:
+            secret = os.urandom(32)
+        self.secret = secret.encode() if isinstance(secret, str) else secret
+        self.grace_steps = grace_steps
+        self._local_ids = itertools.count(0, -1)
+        self._sessions = {}
+        # id занятий, пришедших из базы
+        self._shared = set()
+        self._index = {}
+        self._codes = {}
+        self._refresh_heap = []
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def __iter__(self):
+        return iter(list(self._sessions.values()))
+
+    def get(self, session_id: str):
+        return self._sessions.get(session_id)
+
+    def add(self, room: str, generator, groups=()) -> AttendanceSession:
+        """Регистрирует локальное занятие с уже созданным генератором"""
+        return self._register(str(next(self._local_ids)), room, groups, generator)
+
+    def open(self, session_id: str, room: str, interval: int, groups=()) -> AttendanceSession:
+        """Открывает занятие с id из базы и собственным TOTP-кодом"""
+        session_id = str(session_id)
+        existing = self._sessions.get(session_id)
+        if existing is not None:
+            return existing
+        # Секрет занятия выводится из общего, чтобы все процессы считали одинаково
+        secret = hmac.new(self.secret, f"session:{session_id}".encode(), hashlib.sha256).digest()
+        generator = TotpCodeGenerator(interval, secret=secret, grace_steps=self.grace_steps)
+        self._shared.add(session_id)
+        return self._register(session_id, room, groups, generator)
+
+    def sync(self, records):
+        """Приводит занятия из базы к списку (id, аудитория, интервал, группы)"""
+        current = set()
+        for session_id, room, interval, groups in records:
+            current.add(str(session_id))
+            self.open(session_id, room, interval, groups)
+        for session_id in self._shared - current:
+            self.close(session_id)
+
+    def _register(self, session_id: str, room: str, groups, generator) -> AttendanceSession:
+        session = AttendanceSession(session_id, room, groups, generator)
+        self._sessions[session.id] = session
+        self._reindex(session, time.monotonic())
+        return session
+
+    def is_local(self, session_id: str) -> bool:
+        """Занятие экрана этого процесса (add), а не открытое через базу"""
+        return session_id in self._sessions and session_id not in self._shared
+
+    def close(self, session_id: str) -> bool:
+        session = self._sessions.pop(session_id, None)
+        if session is None:
+            return False
+        self._shared.discard(session_id)
+        self._unindex(session_id)
+        return True
+
+    def resolve(self, code: int, group=None):
+        """Находит занятие по введённому коду с учётом группы студента"""
+        self._refresh(time.monotonic())
+        candidates = [
+            self._sessions[session_id] for session_id in self._index.get(code, ())
+            if self._sessions[session_id].generator.is_code_valid(code)
+        ]
+        candidates = [session for session in candidates if session.accepts(group)]
+        if not candidates:
+            return None
+        # При совпадении кодов приоритет у занятия, где группа указана явно
+        candidates.sort(key=lambda session: (group not in session.groups, -session.opened_at))
+        return candidates[0]
+
+    def _unindex(self, session_id: str):
+        for code in self._codes.pop(session_id, ()):
+            session_ids = self._index.get(code)
+            if session_ids is not None:
+                session_ids.discard(session_id)
+                if not session_ids:
+                    del self._index[code]
+
+    def _reindex(self, session: AttendanceSession, now: float):
+        self._unindex(session.id)
+        codes = session.generator.valid_codes()
+        self._codes[session.id] = codes
+        for code in codes:
+            self._index.setdefault(code, set()).add(session.id)
+        refresh_at = now + max(session.generator.seconds_until_change(), 0.001)
+        heapq.heappush(self._refresh_heap, (refresh_at, session.id))
+
+    def _refresh(self, now: float):
+        while self._refresh_heap and self._refresh_heap[0][0] <= now:
+            _, session_id = heapq.heappop(self._refresh_heap)
+            session = self._sessions.get(session_id)
+            if session is not None:
+                self._reindex(session, now)
@@ -1,15 +1,51 @@
+# Первым: отсчёт времени старта начинается с импорта этого модуля
+from utils.startup import startup
 import asyncio
 from threading import Thread
-from generator.code_generator import CodeGenerator
-from config.config import CODE_INTERVAL
-from bot.bot import main as bot_main
-from display.display import display_code
+from generator.code_generator import CodeGenerator, TotpCodeGenerator
+from config.config import (
+    CODE_INTERVAL, CODE_MODE, CODE_SECRET, CODE_GRACE_STEPS, BOT_MODE,
+    DISPLAY_MODE, DISPLAY_HOST, DISPLAY_PORT, DISPLAY_TOKEN, METRICS_ENABLED, METRICS_HOST, METRICS_PORT,
+    LOG_LEVEL, LOG_FORMAT, LOG_LEVELS
+)
+from bot.bot import main as bot_main, create_sessions
+from bot.webhook import main as webhook_main
 from db.models import init_db
+from utils.log import setup_logging
+from utils.metrics import metrics, start_metrics_server
 
+startup.mark("imports")
 
-async def start_bot(generator):
+
+async def start_bot(generator, sessions=None):
     await init_db()
-    await bot_main(generator)
+    startup.mark("init_db")
+    metrics.add_stats("startup", startup.stats)
+    metrics_runner = None
+    if METRICS_ENABLED and METRICS_PORT:
+        metrics_runner = await start_metrics_server(METRICS_HOST, METRICS_PORT)
+    try:
+        if BOT_MODE == "webhook":
+            await webhook_main(generator, sessions)
+        else:
+            await bot_main(generator, sessions)
+    finally:
+        if metrics_runner:
+            await metrics_runner.cleanup()
+
+
+async def start_headless(generator):
+    # Бот и веб-экран в одном цикле событий, реестр занятий общий
+    from display.web import DisplayServer
+
+    sessions = create_sessions(generator)
+    display = DisplayServer(sessions, DISPLAY_TOKEN)
+    metrics.add_stats("display", display.stats)
+    await display.start(DISPLAY_HOST, DISPLAY_PORT)
+    try:
+        await start_bot(generator, sessions)
+    finally:
+        await display.stop()
 
 
 def start_bot_thread(generator):
@@ -17,13 +53,24 @@ def start_bot_thread(generator):
 
 
 def main():
+    setup_logging(LOG_LEVEL, LOG_FORMAT, LOG_LEVELS)
+
     # создаём генератор
-    generator = CodeGenerator(CODE_INTERVAL)
+    if CODE_MODE == "totp":
+        generator = TotpCodeGenerator(CODE_INTERVAL, secret=CODE_SECRET, grace_steps=CODE_GRACE_STEPS)
+    else:
+        generator = CodeGenerator(CODE_INTERVAL)
+
+    if DISPLAY_MODE == "web":
+        # без окна: код показывают браузеры по HTTP
+        asyncio.run(start_headless(generator))
+        return
 
     # запускаем бота в отдельном потоке
     Thread(target=start_bot_thread, args=(generator,), daemon=True).start()
 
-    # запускаем Tkinter в главном потоке
+    # запускаем Tkinter в главном потоке (импорт здесь: в web-режиме Tk может не быть)
+    from display.display import display_code
     display_code(generator)
 
 
@@ -0,0 +1,34 @@
+import logging
+from db.models import AdminManager, admin_roles
+
+logger = logging.getLogger(__name__)
+
+def is_admin(telegram_id: int) -> bool:
+    # Проверка по снимку в памяти - без обращения к базе
+    return telegram_id in admin_roles
+
+def get_admin_ids() -> list:
+    return sorted(admin_roles.ids)
+
+async def add_admin(telegram_id: int) -> bool:
+    try:
+        return await AdminManager().add(telegram_id)
+    except Exception:
+        logger.exception("Ошибка при добавлении администратора", extra={"user_id": telegram_id})
+        return False
+
+async def remove_admin(telegram_id: int) -> bool:
+    try:
+        return await AdminManager().remove(telegram_id)
+    except Exception:
+        logger.exception("Ошибка при удалении администратора", extra={"user_id": telegram_id})
+        return False
+
+
+async def reload_admin_ids():
+    try:
+        await AdminManager().load()
+        return True
+    except Exception:
+        logger.exception("Ошибка при перезагрузке администраторов")
+        return False
@@ -0,0 +1,4 @@
+# Общие подписи без зависимостей: их импортируют и лёгкие модули (/stats),
+# и векторные агрегаты экспорта
+
+NO_GROUP = "Без группы"
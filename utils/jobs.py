@@ -0,0 +1,218 @@
+import asyncio
+import importlib
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from config.config import (
+    DB_URL, DB_PROFILE, EXPORT_EXECUTOR, EXPORT_WORKERS, EXPORT_QUEUE_DEPTH, REPORT_CACHE_SIZE, REPORT_CACHE_TTL
+)
+from db.engine import make_engine
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+def resolve_export(export_func):
+    """Функция экспорта или её путь вида "utils.utils:export_users_to_excel"."""
+    if isinstance(export_func, str):
+        module_name, _, name = export_func.partition(":")
+        return getattr(importlib.import_module(module_name), name)
+    return export_func
+
+
+def _run_export(export_func, output_file: str):
+    """Выполняет асинхронный экспорт в рабочем потоке/процессе.
+
+    У задачи свой цикл событий и свой движок БД: подключения основного
+    движка привязаны к циклу бота и здесь использоваться не могут.
+    export_func можно передать путём: тогда pandas/openpyxl импортируются
+    здесь при первом отчёте, а не при старте бота и не в цикле событий.
+    """
+    export_func = resolve_export(export_func)
+    async def run():
+        engine = make_engine(DB_URL, DB_PROFILE)
+        try:
+            async with sessionmaker(engine, class_=AsyncSession)() as session:
+                return await export_func(session, output_file)
+        finally:
+            await engine.dispose()
+
+    started = time.perf_counter()
+    path = asyncio.run(run())
+    return path, time.perf_counter() - started
+
+
+class ReportJob:
+    def __init__(self, key, filename: str):
+        self.key = key
+        self.directory = tempfile.mkdtemp(prefix="report_")
+        self.output_file = os.path.join(self.directory, filename)
+        self.future = None
+        self.refs = 0
+        self.submitted = time.perf_counter()
+
+    async def wait(self) -> str:
+        # shield: отмена одного ожидающего не отменяет общую задачу
+        path, _ = await asyncio.shield(self.future)
+        return path
+
+
+class ReportJobs:
+    """Очередь задач построения отчётов вне цикла событий бота.
+
+    Одинаковые запросы (по ключу), пришедшие пока отчёт строится или
+    отправляется, получают тот же файл. Файл удаляется, когда его
+    отпустил последний ожидающий.
+    """
+
+    def __init__(self, executor: str = "thread", max_workers: int = 2, max_pending: int = 8):
+        self.executor_kind = executor
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor = None
+        self._jobs = {}
+        self.completed = 0
+        self.failed = 0
+        self.merged = 0
+        self.durations = deque(maxlen=100)
+
+    def _get_executor(self):
+        if self._executor is None:
+            if self.executor_kind == "process":
+                # spawn: fork из процесса с потоками (Tk, бот) небезопасен
+                self._executor = ProcessPoolExecutor(
+                    self.max_workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            else:
+                self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix="report")
+        return self._executor
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(1 for job in self._jobs.values() if not job.future.done())
+
+    def submit(self, key, export_func, filename: str) -> ReportJob:
+        job = self._jobs.get(key)
+        if job is not None:
+            self.merged += 1
+        else:
+            if self.queue_depth >= self.max_pending:
+                raise JobQueueFull(f"В очереди уже {self.queue_depth} отчётов")
+            job = ReportJob(key, filename)
+            loop = asyncio.get_running_loop()
+            job.future = loop.run_in_executor(self._get_executor(), _run_export, export_func, job.output_file)
+            job.future.add_done_callback(self._on_done)
+            self._jobs[key] = job
+        job.refs += 1
+        return job
+
+    def _on_done(self, future):
+        if future.cancelled() or future.exception() is not None:
+            self.failed += 1
+            return
+        _, seconds = future.result()
+        self.completed += 1
+        self.durations.append(seconds)
+
+    def release(self, job: ReportJob):
+        job.refs -= 1
+        if job.refs > 0:
+            return
+        if self._jobs.get(job.key) is job:
+            del self._jobs[job.key]
+        shutil.rmtree(job.directory, ignore_errors=True)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        durations = list(self.durations)
+        return {
+            "queue_depth": self.queue_depth,
+            "max_pending": self.max_pending,
+            "workers": self.max_workers,
+            "completed": self.completed,
+            "failed": self.failed,
+            "merged": self.merged,
+            "last_duration": durations[-1] if durations else None,
+            "avg_duration": sum(durations) / len(durations) if durations else None,
+            "max_duration": max(durations) if durations else None,
+        }
+
+
+class ReportCache:
+    """Уже отправленные отчёты: Telegram file_id по ключу и версии данных.
+
+    Пока версия данных та же, отчёт отправляется повторно по file_id - без
+    построения и без загрузки файла. Запись с другой версией устарела и
+    удаляется при обращении. Вытеснение - по числу записей (давно не
+    использованные первыми) и по возрасту.
+    """
+
+    def __init__(self, maxsize: int = 32, ttl: float = 86400):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # ключ -> (версия, file_id, время создания)
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.expired = 0
+        self.evicted = 0
+
+    def get(self, key, version):
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] != version:
+            del self._entries[key]
+            self.stale += 1
+            entry = None
+        elif entry is not None and time.monotonic() - entry[2] > self.ttl:
+            del self._entries[key]
+            self.expired += 1
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key, version, file_id: str):
+        if self.maxsize <= 0:
+            return
+        self._entries[key] = (version, file_id, time.monotonic())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evicted += 1
+
+    def discard(self, key):
+        self._entries.pop(key, None)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "expired": self.expired,
+            "evicted": self.evicted,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+# Общая очередь отчётов для обработчиков бота
+report_jobs = ReportJobs(EXPORT_EXECUTOR, EXPORT_WORKERS, EXPORT_QUEUE_DEPTH)
+report_cache = ReportCache(REPORT_CACHE_SIZE, REPORT_CACHE_TTL)
@@ -0,0 +1,118 @@
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+from datetime import datetime, timezone
+
+# Поля из extra=..., которые попадают в структурированный вывод
+CONTEXT_FIELDS = ("user_id", "handler", "latency_ms", "outcome", "room", "rows", "error")
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна запись - одна строка JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for field in CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Читаемый вывод: время, уровень, модуль, сообщение и поля контекста"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)-5s %(name)s: %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        record.message = record.getMessage()
+        record.asctime = self.formatTime(record, self.datefmt)
+        line = self.formatMessage(record)
+        context = " ".join(
+            f"{field}={getattr(record, field)}" for field in CONTEXT_FIELDS
+            if getattr(record, field, None) is not None
+        )
+        if context:
+            line = f"{line} [{context}]"
+        # Трассировка - после полей контекста
+        exc_text = self.formatException(record.exc_info) if record.exc_info else record.exc_text
+        return f"{line}\n{exc_text}" if exc_text else line
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Как QueueHandler, но не склеивает трассировку с сообщением:
+    исключение передаётся отдельно в exc_text"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _plain.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+_plain = logging.Formatter()
+
+
+def parse_levels(spec: str) -> dict:
+    """Разбирает строку вида "db=WARNING,bot.handlers=DEBUG" в словарь уровней"""
+    levels = {}
+    for item in spec.split(","):
+        if "=" in item:
+            name, level = item.split("=", 1)
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def setup_logging(level: str = "INFO", fmt: str = "text", levels: str = "", stream=None):
+    """Настраивает логирование через очередь.
+
+    Обработчики в цикле событий только кладут запись в очередь; запись в
+    stdout (или медленный journald) выполняет отдельный поток QueueListener.
+    levels задаёт уровни подсистем по именам логгеров (db, bot.handlers...).
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_QueueHandler(log_queue))
+    root.setLevel(level.upper())
+    for name, subsystem_level in parse_levels(levels).items():
+        logging.getLogger(name).setLevel(subsystem_level)
+
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    # Дописываем очередь при выходе
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,200 @@
+import bisect
+import logging
+import time
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм в секундах: от 1 мс до 10 с
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+class Counter:
+    """Счётчик с метками; значения хранятся по кортежу значений меток"""
+
+    type = "counter"
+
+    def __init__(self, name: str, help_text: str, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.values = {}
+
+    def inc(self, *label_values, amount: float = 1):
+        self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def render(self):
+        for label_values, value in sorted(self.values.items()):
+            yield f"{self.name}{_format_labels(self.labels, label_values)} {value}"
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами.
+
+    observe() - поиск корзины bisect'ом и три сложения, без аллокаций,
+    поэтому её можно вызывать на каждый запрос к БД.
+    """
+
+    type = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # кортеж меток -> [счётчики по корзинам (+Inf последней), сумма, количество]
+        self.values = {}
+
+    def observe(self, value: float, *label_values):
+        series = self.values.get(label_values)
+        if series is None:
+            series = self.values[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def count(self, *label_values) -> int:
+        series = self.values.get(label_values)
+        return series[2] if series else 0
+
+    def total(self, *label_values) -> float:
+        series = self.values.get(label_values)
+        return series[1] if series else 0.0
+
+    def quantile(self, q: float, *label_values):
+        """Оценка квантиля по корзинам (линейно внутри корзины), как histogram_quantile"""
+        series = self.values.get(label_values)
+        if not series or not series[2]:
+            return None
+        rank = q * series[2]
+        cumulative = 0
+        lower = 0.0
+        for upper, count in zip(self.buckets + (float("inf"),), series[0]):
+            if cumulative + count >= rank:
+                if upper == float("inf"):
+                    return self.buckets[-1]
+                return lower + (upper - lower) * ((rank - cumulative) / count if count else 0)
+            cumulative += count
+            lower = upper
+        return self.buckets[-1]
+
+    def render(self):
+        for label_values, (counts, total, count) in sorted(self.values.items()):
+            cumulative = 0
+            for upper, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if upper == float("inf") else repr(upper)
+                labels = _format_labels(self.labels + ("le",), label_values + (le,))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labels, label_values)
+            yield f"{self.name}_sum{labels} {total}"
+            yield f"{self.name}_count{labels} {count}"
+
+
+class MetricsRegistry:
+    """Набор метрик процесса и вывод в текстовом формате Prometheus.
+
+    Кроме собственных счётчиков и гистограмм, add_stats() подключает уже
+    существующие stats() компонентов (кэш, очередь отчётов, ограничение
+    частоты): их числовые поля выводятся как gauge при каждом запросе.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._stats = {}
+
+    def counter(self, name: str, help_text: str, labels=()) -> Counter:
+        if name not in self._metrics:
+            self._metrics[name] = Counter(name, help_text, labels)
+        return self._metrics[name]
+
+    def histogram(self, name: str, help_text: str, labels=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        if name not in self._metrics:
+            self._metrics[name] = Histogram(name, help_text, labels, buckets)
+        return self._metrics[name]
+
+    def get(self, name: str):
+        return self._metrics.get(name)
+
+    def add_stats(self, prefix: str, stats_func):
+        """Подключает функцию stats() -> dict; повторная регистрация заменяет старую"""
+        self._stats[prefix] = stats_func
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.render())
+        for prefix, stats_func in self._stats.items():
+            try:
+                stats = stats_func()
+            except Exception:
+                logger.exception("Ошибка сбора метрик %s", prefix)
+                continue
+            for key, value in stats.items():
+                if isinstance(value, bool):
+                    value = int(value)
+                if isinstance(value, (int, float)):
+                    lines.append(f"# TYPE {prefix}_{key} gauge")
+                    lines.append(f"{prefix}_{key} {value}")
+        return "\n".join(lines) + "\n"
+
+
+# Метрики процесса (используются, если METRICS_ENABLED)
+metrics = MetricsRegistry()
+
+
+def instrument_engine(engine, registry: MetricsRegistry = metrics):
+    """Считает запросы и их длительность через события SQLAlchemy"""
+    from sqlalchemy import event
+
+    queries = registry.histogram(
+        "db_query_seconds", "Длительность запросов к БД", labels=("statement",)
+    )
+    errors = registry.counter("db_query_errors_total", "Ошибки запросов к БД", labels=("statement",))
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    def statement_kind(statement: str) -> str:
+        return statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_started"].pop()
+        queries.observe(time.perf_counter() - started, statement_kind(statement))
+
+    @event.listens_for(sync_engine, "handle_error")
+    def handle_error(context):
+        started = context.connection.info.get("query_started") if context.connection is not None else None
+        if started:
+            started.pop()
+        errors.inc(statement_kind(context.statement or ""))
+
+
+async def start_metrics_server(host: str, port: int, registry: MetricsRegistry = metrics) -> web.AppRunner:
+    """HTTP-эндпоинт /metrics для Prometheus"""
+    async def handle(request: web.Request) -> web.Response:
+        return web.Response(text=registry.render(), content_type="text/plain", charset="utf-8")
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info("Метрики доступны на http://%s:%s/metrics", host, port)
+    return runner
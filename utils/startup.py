@@ -0,0 +1,42 @@
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class StartupTimer:
+    """Этапы холодного старта: время от импорта этого модуля до каждой отметки.
+
+    main.py импортирует модуль первым, поэтому отсчёт идёт почти от запуска
+    процесса (без старта самого интерпретатора).
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        # этап -> секунды от старта, в порядке отметок
+        self.stages = {}
+
+    def mark(self, stage: str):
+        # Повторная отметка (переподключение, второй опрос) не перезаписывает первую
+        if stage not in self.stages:
+            self.stages[stage] = time.perf_counter() - self.started
+
+    def durations(self) -> dict:
+        """Длительность каждого этапа отдельно"""
+        result = {}
+        previous = 0.0
+        for stage, elapsed in self.stages.items():
+            result[stage] = elapsed - previous
+            previous = elapsed
+        return result
+
+    def report(self):
+        parts = ", ".join(f"{stage} {seconds:.2f} с" for stage, seconds in self.durations().items())
+        total = max(self.stages.values(), default=0.0)
+        logger.info("Старт: %s (всего %.2f с)", parts, total)
+
+    def stats(self) -> dict:
+        return {f"{stage}_seconds": round(elapsed, 3) for stage, elapsed in self.stages.items()}
+
+
+startup = StartupTimer()
@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+
+# Векторные агрегаты посещаемости. Все функции принимают столбцы
+# (списки, numpy-массивы или Series одинаковой длины), а не строки.
+
+from .constants import NO_GROUP
+
+
+def columns(rows, count: int):
+    """Раскладывает строки результата запроса на count numpy-столбцов"""
+    if not rows:
+        return [np.empty(0, dtype=object) for _ in range(count)]
+    return [np.asarray(column, dtype=object) for column in zip(*rows)]
+
+
+def fill_groups(groups, empty: str = NO_GROUP) -> np.ndarray:
+    """Заменяет пустые и отсутствующие группы на подпись"""
+    groups = pd.Series(groups, dtype=object)
+    return groups.where(groups.notna() & (groups != ""), empty).to_numpy()
+
+
+def group_counts(groups) -> pd.Series:
+    """Число отметок по группам, отсортировано по группе"""
+    return pd.Series(groups, dtype=object).value_counts(sort=False).sort_index()
+
+
+def day_group_counts(days, groups) -> pd.Series:
+    """Число отметок по (день, группа) с MultiIndex, отсортировано"""
+    frame = pd.DataFrame({"day": days, "group": pd.Series(groups, dtype=object)})
+    return frame.groupby(["day", "group"], sort=True).size()
+
+
+def segments(days):
+    """Границы подряд идущих одинаковых дней в отсортированном столбце"""
+    days = np.asarray(days)
+    if len(days) == 0:
+        return []
+    starts = np.concatenate(([0], np.flatnonzero(days[1:] != days[:-1]) + 1))
+    ends = np.append(starts[1:], len(days))
+    return list(zip(starts.tolist(), ends.tolist()))
@@ -0,0 +1,57 @@
+import logging
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from db.models import DailyGroupStats, today_key
+from .constants import NO_GROUP
+
+# Без pandas: сводка /stats нужна сразу, а тяжёлый стек экспорта - только отчётам
+
+logger = logging.getLogger(__name__)
+
+async def get_attendance_stats(session: AsyncSession) -> dict:
+    try:
+        # Готовые агрегаты за сегодня: одна строка на группу, а не на отметку
+        today_result = await session.execute(
+            select(DailyGroupStats).filter_by(day=today_key()).order_by(DailyGroupStats.group)
+        )
+        today_groups = today_result.scalars().all()
+        
+        if not today_groups:
+            return {
+                "total_today": 0,
+                "group_stats_today": {},
+                "fastest_student": None,
+                "fastest_time": None,
+                "message": "Сегодня еще никто не отметился"
+            }
+        
+        # Общее количество посещений за день
+        total_today = sum(row.count for row in today_groups)
+        
+        # Статистика по группам за день
+        group_stats_today = {
+            (row.group if row.group else NO_GROUP): row.count for row in today_groups
+        }
+        
+        # Находим того, кто отметился быстрее всех (самое раннее время)
+        fastest = min(today_groups, key=lambda row: row.first_date)
+        fastest_student = fastest.first_full_name
+        fastest_time = fastest.first_date.strftime("%H:%M:%S")
+        
+        return {
+            "total_today": total_today,
+            "group_stats_today": group_stats_today,
+            "fastest_student": fastest_student,
+            "fastest_time": fastest_time,
+            "message": f"Сегодня отметилось {total_today} человек"
+        }
+        
+    except Exception:
+        logger.exception("Ошибка при получении статистики")
+        return {
+            "total_today": 0,
+            "group_stats_today": {},
+            "fastest_student": None,
+            "fastest_time": None,
+            "message": "Ошибка при получении статистики"
+        }
@@ -1,66 +1,49 @@
+import logging
+import numpy as np
 import pandas as pd
-import os
 from datetime import datetime
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from db.models import User, Attendance
-from config.config import ADMIN_IDS, MOSCOW_TZ
-from dotenv import load_dotenv, set_key
+from config.config import MOSCOW_TZ, EXPORT_CHUNK_SIZE
+from dotenv import load_dotenv
 import openpyxl
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, Side
+from . import stats
+# Лёгкие функции живут отдельно, здесь - для совместимости импортов
+from .admins import is_admin, get_admin_ids, add_admin, remove_admin, reload_admin_ids
+from .summary import get_attendance_stats
+
+logger = logging.getLogger(__name__)
 
 # Загружаем .env файл
 load_dotenv()
 
-def is_admin(telegram_id: int) -> bool:
-    return telegram_id in ADMIN_IDS
-
-def get_admin_ids() -> list:
-    return ADMIN_IDS.copy()
-
-def add_admin(telegram_id: int) -> bool:
-    try:
-        if telegram_id in ADMIN_IDS:
-            return False
-        
-        # Обновляем .env файл
-        current_admins = ",".join(map(str, ADMIN_IDS + [telegram_id]))
-        set_key(".env", "ADMIN_IDS", current_admins)
-        
-        ADMIN_IDS.append(telegram_id)
-        
-        return True
-    except Exception as e:
-        print(f"[ERR] Ошибка при добавлении администратора: {e}")
-        return False
-
-def remove_admin(telegram_id: int) -> bool:
-    try:
-        if telegram_id not in ADMIN_IDS:
-            return False
-        
-        # Обновляем .env файл
-        updated_admins = [admin_id for admin_id in ADMIN_IDS if admin_id != telegram_id]
-        current_admins = ",".join(map(str, updated_admins))
-        set_key(".env", "ADMIN_IDS", current_admins)
-        
-
-        ADMIN_IDS = updated_admins
-        
-        return True
-    except Exception as e:
-        print(f"[ERR] Ошибка при удалении администратора: {e}")
-        return False
-
-
-def reload_admin_ids():
-    try:
-        from config.config import ADMIN_IDS as new_admin_ids
-        global ADMIN_IDS
-        ADMIN_IDS = new_admin_ids
-        return True
-    except Exception as e:
-        print(f"[ERR] Ошибка при перезагрузке администраторов: {e}")
-        return False
+# Оформление заголовка как у DataFrame.to_excel
+HEADER_FONT = Font(bold=True)
+HEADER_BORDER = Border(left=Side(style="thin"), right=Side(style="thin"), top=Side(style="thin"), bottom=Side(style="thin"))
+HEADER_ALIGNMENT = Alignment(horizontal="center", vertical="top")
+
+def _header_row(ws, columns):
+    row = []
+    for column in columns:
+        cell = WriteOnlyCell(ws, value=column)
+        cell.font = HEADER_FONT
+        cell.border = HEADER_BORDER
+        cell.alignment = HEADER_ALIGNMENT
+        row.append(cell)
+    return row
+
+def _day_summary_rows(date, day_groups):
+    """Блок статистики за день, который идёт после строк этого дня"""
+    rows = [[None, None, None], [None, f"СТАТИСТИКА ЗА {date}:", None]]
+    for group, count in day_groups.sort_index().items():
+        rows.append([None, f"  Группа {group}:", f"{int(count)} чел."])
+    rows.append([None, f"  Всего посещений:", f"{int(day_groups.sum())} чел."])
+    # Разрыв между днями
+    rows += [[None, None, None], [None, "─" * 50, None], [None, None, None]]
+    return rows
 
 async def export_attendance_to_excel(session: AsyncSession, output_file: str = None) -> str:
     try:
@@ -69,92 +52,62 @@ async def export_attendance_to_excel(session: AsyncSession, output_file: str = N
             timestamp = datetime.now(MOSCOW_TZ).strftime("%d-%m-%Y")
             output_file = f"attendance_{timestamp}.xlsx"
 
-        # Получаем данные
-        query = select(Attendance, User).join(User, Attendance.user_id == User.id)
-        result = await session.execute(query)
-        data = result.all()
-        if not data:
-            # Если данных нет, создаем пустой df
-            df = pd.DataFrame(columns=["Дата", "ФИО", "Группа"])
-        else:
-            # Создаем df из результатов
-            df = pd.DataFrame(
-                [
-                    {
-                        "Дата": a.date.strftime("%d-%m-%Y") if a.date else "",
-                        "ФИО": u.full_name if u.full_name else "",
-                        "Группа": u.group if u.group else ""
-                    }
-                    for a, u in data
-                ],
-                columns=["Дата", "ФИО", "Группа"]
-            )
-        
-        # Сортируем по дате и группе
-        df = df.sort_values(by=["Дата", "Группа", "ФИО"])
-        
-        # Группируем данные по дням с разрывами и статистикой
-        final_data = []
-        
-        if not df.empty:
-            # Группируем по датам
-            grouped_by_date = df.groupby("Дата")
-            
-            for date, day_data in grouped_by_date:
-                # Добавляем данные за день
-                for _, row in day_data.iterrows():
-                    final_data.append({
-                        "Дата": row["Дата"],
-                        "ФИО": row["ФИО"],
-                        "Группа": row["Группа"]
-                    })
-                
-                # Добавляем статистику за день
-                day_stats = day_data.groupby("Группа").size().reset_index(name="Количество")
-                total_day_visits = len(day_data)
-                unique_students_day = day_data["ФИО"].nunique()
-                
-                # Пустая строка для разделения
-                final_data.append({"Дата": "", "ФИО": "", "Группа": ""})
-                
-                # Статистика по группам за день
-                final_data.append({"Дата": "", "ФИО": f"СТАТИСТИКА ЗА {date}:", "Группа": ""})
-                for _, stat_row in day_stats.iterrows():
-                    final_data.append({
-                        "Дата": "",
-                        "ФИО": f"  Группа {stat_row['Группа']}:",
-                        "Группа": f"{stat_row['Количество']} чел."
-                    })
-                
-                # Общая статистика за день
-                final_data.append({"Дата": "", "ФИО": f"  Всего посещений:", "Группа": f"{total_day_visits} чел."})
-                
-                # Разрыв между днями
-                final_data.append({"Дата": "", "ФИО": "", "Группа": ""})
-                final_data.append({"Дата": "", "ФИО": "─" * 50, "Группа": ""})
-                final_data.append({"Дата": "", "ФИО": "", "Группа": ""})
-            
+        # Книга в режиме write-only: строки сразу уходят во временный файл
+        wb = openpyxl.Workbook(write_only=True)
+        ws = wb.create_sheet("Sheet1")
+        ws.append(_header_row(ws, ["Дата", "ФИО", "Группа"]))
+
+        # Строки приходят потоком пачками, уже отсортированными по дню, группе
+        # и ФИО. Агрегаты по каждой пачке считаются векторно, а в памяти
+        # держатся только счётчики незаконченного дня и итоги по группам.
+        query = (
+            select(Attendance.date, Attendance.day, User.full_name, User.group)
+            .join(User, Attendance.user_id == User.id)
+            .order_by(Attendance.day, User.group, User.full_name)
+            .execution_options(yield_per=EXPORT_CHUNK_SIZE)
+        )
+        result = await session.stream(query)
+
+        current_day = current_date = None
+        day_groups = pd.Series(dtype="int64")
+        overall_groups = pd.Series(dtype="int64")
+        async for rows in result.partitions():
+            dates, days, names, groups = stats.columns(rows, 4)
+            groups = stats.fill_groups(groups, "")
+            names = np.where(pd.isna(names) | (names == ""), "", names)
+            counts = stats.day_group_counts(days, groups)
+            overall_groups = overall_groups.add(stats.group_counts(groups), fill_value=0)
+
+            for start, end in stats.segments(days):
+                day = days[start]
+                if day != current_day:
+                    if current_day is not None:
+                        for row in _day_summary_rows(current_date, day_groups):
+                            ws.append(row)
+                    current_day = day
+                    current_date = dates[start].strftime("%d-%m-%Y") if dates[start] else ""
+                    day_groups = pd.Series(dtype="int64")
+
+                for full_name, group in zip(names[start:end], groups[start:end]):
+                    ws.append([current_date, full_name, group])
+                day_groups = day_groups.add(counts.loc[day], fill_value=0)
+
+        if current_day is not None:
+            for row in _day_summary_rows(current_date, day_groups):
+                ws.append(row)
+
             # Статистика по группам за весь период
-            overall_group_stats = df.groupby("Группа").size().reset_index(name="Количество")
-            final_data.append({"Дата": "", "ФИО": "ОБЩАЯ СТАТИСТИКА ПО ГРУППАМ (ВСЕГО):", "Группа": ""})
-            for _, row in overall_group_stats.iterrows():
-                final_data.append({
-                    "Дата": "",
-                    "ФИО": f"  Группа {row['Группа']}:",
-                    "Группа": f"{row['Количество']} посещений"
-                })
-        
-        # Создаем финальный DataFrame
-        df = pd.DataFrame(final_data, columns=["Дата", "ФИО", "Группа"])
-        
-        # Сохраняем в Excel (используем встроенный движок xlwt для .xls)
-        df.to_excel(output_file, index=False,engine='openpyxl')
-        
+            ws.append([None, "ОБЩАЯ СТАТИСТИКА ПО ГРУППАМ (ВСЕГО):", None])
+            for group, count in overall_groups.sort_index().items():
+                ws.append([None, f"  Группа {group}:", f"{int(count)} посещений"])
+
+        wb.save(output_file)
+
         return output_file
         
-    except Exception as e:
-        print(f"[ERR] Ошибка при экспорте в Excel: {e}")
-        raise e
+    except Exception:
+        logger.exception("Ошибка при экспорте в Excel")
+        raise
 
 async def export_users_to_excel(session: AsyncSession, output_file: str = None) -> str:
     try:
@@ -192,61 +145,6 @@ async def export_users_to_excel(session: AsyncSession, output_file: str = None)
 
         return output_file
 
-    except Exception as e:
-        print(f"[ERR] Ошибка при экспорте в Excel: {e}")
-        raise e
-
-async def get_attendance_stats(session: AsyncSession) -> dict:
-    try:
-        # Получаем текущую дату в московском времени
-        today = datetime.now(MOSCOW_TZ).date()
-        
-        # Запрос посещений за сегодня
-        today_query = select(Attendance, User).join(User, Attendance.user_id == User.id).where(
-            Attendance.date >= today
-        )
-        today_result = await session.execute(today_query)
-        today_data = today_result.all()
-        
-        if not today_data:
-            return {
-                "total_today": 0,
-                "group_stats_today": {},
-                "fastest_student": None,
-                "fastest_time": None,
-                "message": "Сегодня еще никто не отметился"
-            }
-        
-        # Общее количество посещений за день
-        total_today = len(today_data)
-        
-        # Статистика по группам за день
-        group_stats_today = {}
-        for attendance, user in today_data:
-            group = user.group if user.group else "Без группы"
-            if group not in group_stats_today:
-                group_stats_today[group] = 0
-            group_stats_today[group] += 1
-        
-        # Находим того, кто отметился быстрее всех (самое раннее время)
-        fastest_attendance = min(today_data, key=lambda x: x[0].date)
-        fastest_student = fastest_attendance[1].full_name
-        fastest_time = fastest_attendance[0].date.strftime("%H:%M:%S")
-        
-        return {
-            "total_today": total_today,
-            "group_stats_today": group_stats_today,
-            "fastest_student": fastest_student,
-            "fastest_time": fastest_time,
-            "message": f"Сегодня отметилось {total_today} человек"
-        }
-        
-    except Exception as e:
-        print(f"[ERR] Ошибка при получении статистики: {e}")
-        return {
-            "total_today": 0,
-            "group_stats_today": {},
-            "fastest_student": None,
-            "fastest_time": None,
-            "message": "Ошибка при получении статистики"
-        }
\ No newline at end of file
+    except Exception:
+        logger.exception("Ошибка при экспорте в Excel")
+        raise